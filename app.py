@@ -1,40 +1,77 @@
 # app.py
+import time
+_started_at = time.perf_counter()
+
 import logging
 import asyncio
 
+from loader import dp, create_bots
+from db import init_db
+from handlers import get_routers
+from utils.startup import StartupReport
+from utils.write_queue import bill_writer
+from utils.cdc import cdc_log
+from utils.loop_monitor import loop_monitor
+from utils.lifecycle import BotHost
+from utils.dedup import update_dedup
+from utils.throttling import throttling
+from utils import stats
+from utils.receipts import receipt_renderer
+from utils.maintenance import scheduled_maintenance
 
-from loader import bot
-from db import init_db, async_clear_old_bills
-from handlers.address import process_select_address, process_add_new_address
-from handlers.bills import process_bill_address, process_bill_detail
-from handlers.electricity import *
-from handlers.form_states import Form
-from handlers.gas import *
-from handlers.service import process_service
-from handlers.start import cmd_start
-from handlers.trash import process_trash_unloads, process_trash_bins
-
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# імпортуємо інші обробники, якщо необхідно
-from aiogram.fsm.context import FSMContext
+# Архівація та обслуговування БД запускаються вже після старту polling, щоб не затримувати
+# перший апдейт, і далі повторюються раз на MAINTENANCE_INTERVAL
+MAINTENANCE_DELAY = 60
 
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+async def deferred_maintenance(delay: float = MAINTENANCE_DELAY):
+    await asyncio.sleep(delay)
+    await scheduled_maintenance()
 
-# Функція, що виконується при старті: ініціалізація БД та очищення старих рахунків
-async def on_startup():
+# Функція, що виконується при старті: реєстрація роутерів, ініціалізація БД та створення ботів
+async def on_startup(report: StartupReport, session=None, tokens: list[str] = None):
+    report.mark("imports")
+    dp.include_routers(*get_routers())
+    report.mark("routers")
     await init_db()
-    await async_clear_old_bills()
-    logging.info("Bot started.")
+    report.mark("init_db")
+    await cdc_log.open()
+    report.mark("cdc")
+    bots = create_bots(tokens, session=session)
+    report.mark("bot")
+    bill_writer.start()
+    loop_monitor.start()
+    dp.update.outer_middleware(report.first_update_middleware)
+    dp.update.outer_middleware(update_dedup)
+    dp.update.outer_middleware(throttling)
+    logging.info(report.summary())
+    return bots
 
 async def main():
-    await on_startup()
-    await dp.start_polling(bot)
-
-if __name__ == '__main__':
-    loop = asyncio.get_event_loop()
+    report = StartupReport(_started_at)
+    bots = await on_startup(report)
+    # Усі боти процесу обробляються одним dp зі спільними пулами БД, кешами і сховищем FSM.
+    # Polling з контрольною точкою update_id і плавною зупинкою: при рестарті апдейти
+    # не губляться і не обробляються вдруге; черги запису дописуються до виходу
+    host = BotHost(dp, bots, drains=(bill_writer.drain, cdc_log.flush))
+    stats.register("bots", host.counters)
+    maintenance = asyncio.create_task(deferred_maintenance())
+    stats_reporter = asyncio.create_task(stats.log_periodically())
+    logging.info(f"Bot started ({len(bots)} bots).")
     try:
-        loop.run_until_complete(main())
+        await host.run()
     finally:
-        # Дозволяє коректно завершити асинхронні генератори
-        loop.run_until_complete(loop.shutdown_asyncgens())
-        loop.close()
+        maintenance.cancel()
+        stats_reporter.cancel()
+        await bill_writer.stop()
+        await cdc_log.stop()
+        await loop_monitor.stop()
+        receipt_renderer.shutdown()
+        # Сесія спільна для всіх ботів
+        await bots[0].session.close()
+        logging.info(f"Лічильники: {stats.format_snapshot()}")
+
+if __name__ == '__main__':
+    # asyncio.run сам завершує асинхронні генератори і пул потоків перед закриттям loop
+    asyncio.run(main())
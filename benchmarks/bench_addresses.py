@@ -0,0 +1,96 @@
+# benchmarks/bench_addresses.py
+# Канонічні адреси: розмір таблиць (текст у кожній адресі проти cities/streets/buildings + building_id)
+# і час підказки вулиці (LIKE по текстових адресах проти FTS5-префіксного індексу).
+# Запуск: python -m benchmarks.bench_addresses
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import time
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+
+CITIES = 20
+STREETS_PER_CITY = 100
+BUILDINGS_PER_STREET = 10
+APARTMENTS_PER_BUILDING = 10
+REPEAT = 200
+WORDS = ["Шевченка", "Франка", "Лесі Українки", "Соборна", "Незалежності", "Садова", "Зелена", "Миру",
+         "Grushevskogo", "Kyivska"]
+
+
+def street_name(city: int, street: int) -> str:
+    return f"{WORDS[street % len(WORDS)]} {street}"
+
+
+def fill(sync_conn):
+    from models import City, Street, Building, Address
+    rng = random.Random(1)
+    text_rows, cities, streets, buildings, addresses = [], [], [], [], []
+    building_id = street_id = 0
+    for city in range(1, CITIES + 1):
+        cities.append({"id": city, "name": f"Місто {city}", "name_norm": f"місто {city}"})
+        for street in range(STREETS_PER_CITY):
+            street_id += 1
+            name = street_name(city, street)
+            streets.append({"id": street_id, "city_id": city, "name": name, "name_norm": name.casefold()})
+            for house in range(1, BUILDINGS_PER_STREET + 1):
+                building_id += 1
+                buildings.append({"id": building_id, "street_id": street_id, "house": str(house), "house_norm": str(house)})
+                for apartment in range(1, APARTMENTS_PER_BUILDING + 1):
+                    # Кожен користувач вводить назви трохи по-своєму
+                    variant = rng.choice([name, f"вул. {name}", name.upper()])
+                    text_rows.append((f"Місто {city}", variant, str(house), str(apartment)))
+                    addresses.append({"user_id": 1, "building_id": building_id, "apartment": str(apartment)})
+    sync_conn.execute(City.__table__.insert(), cities)
+    sync_conn.execute(Street.__table__.insert(), streets)
+    sync_conn.execute(Building.__table__.insert(), buildings)
+    sync_conn.execute(Address.__table__.insert(), addresses)
+    sync_conn.exec_driver_sql("CREATE TABLE addresses_text (id INTEGER PRIMARY KEY, user_id INTEGER, city VARCHAR, "
+                              "street VARCHAR, house VARCHAR, entrance VARCHAR, floor VARCHAR, apartment VARCHAR)")
+    sync_conn.exec_driver_sql("CREATE INDEX ix_addresses_text_city ON addresses_text (city)")
+    sync_conn.exec_driver_sql("INSERT INTO addresses_text (user_id, city, street, house, apartment) VALUES (1, ?, ?, ?, ?)",
+                              text_rows)
+
+
+async def main():
+    from sqlalchemy import text
+    from db import engine, read_engine, init_db, read_session
+    from utils.addresses import STREET, suggest
+    engine.echo = read_engine.echo = False
+    await init_db()
+    async with engine.begin() as conn:
+        await conn.run_sync(fill)
+    async with read_engine.connect() as conn:
+        # Розмір кожної таблиці разом з її індексами
+        sizes = dict((await conn.exec_driver_sql(
+            "SELECT m.tbl_name, SUM(s.pgsize) FROM dbstat AS s JOIN sqlite_master AS m ON m.name = s.name "
+            "GROUP BY m.tbl_name"
+        )).all())
+    canonical = sum(sizes.get(name, 0) for name in ("cities", "streets", "buildings", "addresses"))
+    free_text = sizes["addresses_text"]
+    fts = sum(size for name, size in sizes.items() if name.startswith("address_fts"))
+    total = CITIES * STREETS_PER_CITY * BUILDINGS_PER_STREET * APARTMENTS_PER_BUILDING
+    print(f"{total} адрес: текст у кожній адресі {free_text / 1024:.0f} КБ | "
+          f"канонічні таблиці {canonical / 1024:.0f} КБ + FTS5 {fts / 1024:.0f} КБ")
+
+    like = text("SELECT DISTINCT street FROM addresses_text WHERE city = :city AND street LIKE :prefix LIMIT 5")
+    started = time.perf_counter()
+    for i in range(REPEAT):
+        async with read_session() as session:
+            await session.execute(like, {"city": f"Місто {i % CITIES + 1}", "prefix": "%шевч%"})
+    like_time = (time.perf_counter() - started) / REPEAT
+    started = time.perf_counter()
+    for i in range(REPEAT):
+        await suggest(STREET, "шевч", i % CITIES + 1)
+    fts_time = (time.perf_counter() - started) / REPEAT
+    print(f"підказка вулиці: LIKE {like_time * 1000:.2f} мс | FTS5 {fts_time * 1000:.2f} мс")
+    await engine.dispose()
+    await read_engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    asyncio.run(main())
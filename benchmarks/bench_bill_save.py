@@ -0,0 +1,61 @@
+# benchmarks/bench_bill_save.py
+# Кількість SQL-запитів і час на збереження рахунку через utils.bill_store.save_bill.
+# Очікування: один INSERT ... RETURNING на пакет рахунків, адреса - з кешу після першого запиту.
+# Запуск: python -m benchmarks.bench_bill_save
+import asyncio
+import os
+import tempfile
+import time
+
+BILLS = 500
+
+
+async def main():
+    from sqlalchemy import event
+    from db import engine, read_engine, write_session, init_db
+    from models import User, Address
+    from utils.bill_store import GAS, save_bill, gas_columns
+    from utils.write_queue import bill_writer
+    from utils.addresses import resolve_building
+
+    await init_db()
+    async with write_session() as session:
+        user = User(telegram_id=1, user_name="bench")
+        session.add(user)
+        await session.flush()
+        building = await resolve_building(session, {"city": "Київ", "street": "Хрещатик", "house": "1"})
+        address = Address(user_id=user.id, building=building)
+        session.add(address)
+        await session.commit()
+
+    statements = []
+    for target in (engine.sync_engine, read_engine.sync_engine):
+        event.listen(target, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement.split()[0]))
+
+    # Послідовні збереження: кожен рахунок - окремий пакет
+    started = time.perf_counter()
+    for i in range(BILLS):
+        bill_id, addr = await save_bill(user.id, address.id, GAS, gas_columns(100 + i, i))
+        assert addr is not None and bill_id
+    sequential = time.perf_counter() - started
+    sequential_statements = len(statements)
+
+    # Конкурентні збереження: рахунки групуються у пакети
+    statements.clear()
+    started = time.perf_counter()
+    await asyncio.gather(*(save_bill(user.id, address.id, GAS, gas_columns(100 + i, i)) for i in range(BILLS)))
+    concurrent = time.perf_counter() - started
+    await bill_writer.stop()
+
+    print(f"послідовно: {sequential_statements / BILLS:.2f} запитів/рахунок, {sequential / BILLS * 1000:.2f} мс/рахунок")
+    print(f"конкурентно: {len(statements) / BILLS:.3f} запитів/рахунок, {concurrent / BILLS * 1000:.2f} мс/рахунок")
+    print("типи запитів:", {kind: statements.count(kind) for kind in set(statements)})
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+        import logging
+        logging.disable(logging.INFO)
+        asyncio.run(main())
@@ -0,0 +1,64 @@
+# benchmarks/bench_bill_writes.py
+# Пропускна здатність запису рахунків: commit у кожному хендлері проти групової фіксації BillWriteQueue.
+# Запуск: python -m benchmarks.bench_bill_writes
+import asyncio
+import datetime
+import os
+import tempfile
+import time
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from models import Base, Bill
+from utils.write_queue import BillWriteQueue
+
+WRITERS = 50
+BILLS_PER_WRITER = 20
+
+
+def make_values(i: int) -> dict:
+    return dict(user_id=1, address_id=1, service="Вивіз сміття", created_at=datetime.datetime.now(),
+                unloads=i, bins=1, trash_tariff=160, total_cost_trash=160 * i)
+
+
+async def per_handler_commit(session_factory):
+    async def writer(w):
+        for i in range(BILLS_PER_WRITER):
+            for attempt in range(100):
+                try:
+                    async with session_factory() as session:
+                        session.add(Bill(**make_values(i)))
+                        await session.commit()
+                    break
+                except Exception:
+                    await asyncio.sleep(0.001 * attempt)
+    await asyncio.gather(*(writer(w) for w in range(WRITERS)))
+
+
+async def group_commit(session_factory):
+    queue = BillWriteQueue(session_factory=session_factory)
+
+    async def writer(w):
+        for i in range(BILLS_PER_WRITER):
+            await queue.submit(make_values(i))
+    await asyncio.gather(*(writer(w) for w in range(WRITERS)))
+    await queue.stop()
+
+
+async def main():
+    for name, scenario in (("per-handler commit", per_handler_commit), ("group commit", group_commit)):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}")
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            session_factory = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+            started = time.perf_counter()
+            await scenario(session_factory)
+            elapsed = time.perf_counter() - started
+            await engine.dispose()
+        total = WRITERS * BILLS_PER_WRITER
+        print(f"{name:>20}: {total / elapsed:8.0f} рахунків/с ({WRITERS} конкурентних записувачів)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
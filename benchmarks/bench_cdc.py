@@ -0,0 +1,84 @@
+# benchmarks/bench_cdc.py
+# Вартість журналу змін (utils/cdc.py) для шляху збереження рахунку: групова фіксація BillWriteQueue
+# без слухачів проти запису з CdcLog, плюс швидкість відтворення журналу в базу аналітики.
+# Запуск: python -m benchmarks.bench_cdc
+import asyncio
+import datetime
+import os
+import tempfile
+import time
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from models import Base
+from utils.cdc import CdcLog, replay
+from utils.write_queue import BillWriteQueue
+
+WRITERS = 50
+BILLS_PER_WRITER = 200
+ROUNDS = 3
+
+
+def make_values(i: int) -> dict:
+    return dict(user_id=1, address_id=1, service="Вивіз сміття", created_at=datetime.datetime.now(),
+                unloads=i, bins=1, trash_tariff=160, total_cost_trash=160 * i)
+
+
+async def write_bills(tmp: str, cdc: CdcLog | None) -> tuple[float, float]:
+    """
+    Повертає (середня затримка submit у мс, пропускна здатність рахунків/с).
+    """
+    engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    queue = BillWriteQueue(session_factory=async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession))
+    if cdc is not None:
+        queue.commit_listeners.append(cdc.record_inserts)
+    latencies = []
+
+    async def writer(w):
+        for i in range(BILLS_PER_WRITER):
+            started = time.perf_counter()
+            await queue.submit(make_values(i))
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(writer(w) for w in range(WRITERS)))
+    elapsed = time.perf_counter() - started
+    await queue.stop()
+    if cdc is not None:
+        await cdc.stop()
+    await engine.dispose()
+    return sum(latencies) / len(latencies) * 1000, len(latencies) / elapsed
+
+
+async def main():
+    total = WRITERS * BILLS_PER_WRITER
+    results = {"без CDC": [], "з CDC": []}
+    for _ in range(ROUNDS):
+        for name in results:
+            with tempfile.TemporaryDirectory() as tmp:
+                cdc = CdcLog(os.path.join(tmp, "cdc")) if name == "з CDC" else None
+                results[name].append(await write_bills(tmp, cdc))
+    for name, runs in results.items():
+        latency, throughput = min(runs)[0], max(run[1] for run in runs)
+        print(f"{name:>8}: submit {latency:6.2f} мс у середньому, {throughput:6.0f} рахунків/с "
+              f"({WRITERS} записувачів, {total} рахунків)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cdc = CdcLog(os.path.join(tmp, "cdc"), segment_bytes=4 * 1024 * 1024)
+        events = 200_000
+        for start in range(0, events, 1000):
+            cdc.record_inserts([{"id": i + 1, **make_values(i)} for i in range(start, start + 1000)])
+            await cdc.flush()
+        cdc.record_purges(list(range(1, events // 2 + 1)))
+        await cdc.stop()
+        started = time.perf_counter()
+        applied = replay(os.path.join(tmp, "analytics.db"), cdc.directory)
+        elapsed = time.perf_counter() - started
+        print(f"replay: {applied} подій за {elapsed:.2f} с ({applied / elapsed:.0f} подій/с, "
+              f"{cdc.counters()['segments']} сегментів)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,62 @@
+# benchmarks/bench_dispatch.py
+# Накладні витрати маршрутизації callback_query: послідовні фільтри F.data.startswith
+# проти таблиці префіксів CallbackRouter при великій кількості хендлерів.
+# Запуск: python -m benchmarks.bench_dispatch
+import asyncio
+import time
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.filters.callback_data import CallbackData
+
+from benchmarks.replay import FakeSession, callback_update
+from utils.callback_router import CallbackRouter
+
+HANDLERS = 300
+UPDATES = 3_000
+
+
+async def noop(callback, **kwargs):
+    return None
+
+
+def filters_dispatcher() -> Dispatcher:
+    router = Router()
+    for i in range(HANDLERS):
+        router.callback_query.register(noop, F.data.startswith(f"route{i}_"))
+    dp = Dispatcher()
+    dp.include_router(router)
+    return dp
+
+
+def table_dispatcher() -> Dispatcher:
+    callbacks = CallbackRouter()
+    for i in range(HANDLERS):
+        schema = type(f"Route{i}", (CallbackData,), {"__annotations__": {"item_id": int}}, prefix=f"route{i}")
+        callbacks.handler(schema)(noop)
+    dp = Dispatcher()
+    dp.include_router(callbacks.router)
+    return dp
+
+
+async def measure(dp: Dispatcher, data: str) -> float:
+    bot = Bot("42:TEST", session=FakeSession())
+    updates = [callback_update(1, data) for _ in range(UPDATES)]
+    started = time.perf_counter()
+    for update in updates:
+        await dp.feed_update(bot, update)
+    return (time.perf_counter() - started) / UPDATES * 1e6
+
+
+async def main():
+    last = HANDLERS - 1
+    for name, dp, data in (
+        ("filters (перший)", filters_dispatcher(), "route0_5"),
+        ("filters (останній)", filters_dispatcher(), f"route{last}_5"),
+        ("table (перший)", table_dispatcher(), "route0:5"),
+        ("table (останній)", table_dispatcher(), f"route{last}:5"),
+    ):
+        print(f"{name:>20}: {await measure(dp, data):8.1f} мкс/апдейт ({HANDLERS} хендлерів)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+# benchmarks/bench_fsm_storage.py
+# Soak-тест сховища FSM: мільйон синтетичних користувачів починають введення адреси і кидають його.
+# MemoryStorage тримає всі розмови назавжди, TTLMemoryStorage - лише активні за останні TTL секунд.
+# Запуск: python -m benchmarks.bench_fsm_storage
+import asyncio
+import time
+import tracemalloc
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from handlers.form_states import Form
+from utils.fsm_storage import TTLMemoryStorage
+
+USERS = 1_000_000
+# MemoryStorage росте лінійно - для нього достатньо першої частини прогону
+BASELINE_USERS = 200_000
+REPORT_EVERY = 100_000
+# Синтетичний час: новий користувач кожні 10 мс, розмова живе 10 хвилин
+ARRIVAL_INTERVAL = 0.01
+TTL = 600
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def abandon_address_flow(storage, user_id: int) -> None:
+    key = StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+    await storage.set_data(key, {"user_id": user_id, "telegram_id": user_id, "user_name": f"User{user_id}"})
+    await storage.set_state(key, Form.city)
+    await storage.set_data(key, {**await storage.get_data(key), "city": "Київ", "city_id": 1})
+    await storage.set_state(key, Form.street)
+
+
+async def soak(name: str, storage, users: int, clock: FakeClock | None = None):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    for user_id in range(1, users + 1):
+        if clock is not None:
+            clock.now += ARRIVAL_INTERVAL
+        await abandon_address_flow(storage, user_id)
+        if user_id % REPORT_EVERY == 0:
+            used = (tracemalloc.get_traced_memory()[0] - before) / 2 ** 20
+            extra = ""
+            if isinstance(storage, TTLMemoryStorage):
+                counters = storage.counters()
+                extra = (f", розмов {counters['conversations']}, оцінка {counters['approx_bytes'] / 2 ** 20:.1f} МБ, "
+                         f"видалено {counters['evicted']}")
+            print(f"{name}: {user_id:>9} користувачів -> {used:7.1f} МБ{extra}")
+    elapsed = time.perf_counter() - started
+    tracemalloc.stop()
+    print(f"{name}: {elapsed / users * 1e6:.1f} мкс на розмову\n")
+
+
+async def main():
+    await soak("MemoryStorage", MemoryStorage(), BASELINE_USERS)
+    clock = FakeClock()
+    await soak("TTLMemoryStorage", TTLMemoryStorage(ttl=TTL, clock=clock), USERS, clock)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
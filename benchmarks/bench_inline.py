@@ -0,0 +1,67 @@
+# benchmarks/bench_inline.py
+# Inline-запит з кешу останніх рахунків проти перечитування з БД на кожен запит.
+# Запуск: python -m benchmarks.bench_inline
+import asyncio
+import datetime
+import logging
+import os
+import tempfile
+import time
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+
+USERS = 200
+ADDRESSES_PER_USER = 3
+BILLS_PER_ADDRESS = 36
+QUERIES = 2_000
+
+
+async def main():
+    from sqlalchemy import event, insert
+    from db import engine, read_engine, init_db, write_session
+    from models import User, Address, Bill
+    from utils.addresses import resolve_building
+    from utils.recent_bills import RecentBillsCache
+
+    engine.echo = read_engine.echo = False
+    await init_db()
+    now = datetime.datetime.now()
+    async with write_session() as session:
+        building = await resolve_building(session, {"city": "Київ", "street": "Хрещатик", "house": "1"})
+        users = [User(telegram_id=i, user_name=f"user{i}") for i in range(1, USERS + 1)]
+        session.add_all(users)
+        await session.flush()
+        addresses = [Address(user_id=user.id, building=building, apartment=str(i))
+                     for user in users for i in range(ADDRESSES_PER_USER)]
+        session.add_all(addresses)
+        await session.flush()
+        await session.execute(insert(Bill), [
+            dict(user_id=address.user_id, address_id=address.id, service="Вивіз сміття",
+                 created_at=now - datetime.timedelta(days=30 * month), unloads=2, bins=1,
+                 trash_tariff=1600000, total_cost_trash=32000)
+            for address in addresses for month in range(BILLS_PER_ADDRESS)
+        ])
+        await session.commit()
+
+    statements = []
+    event.listen(read_engine.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+
+    for name, cold in (("з БД на кожен запит", True), ("з кешу", False)):
+        cache = RecentBillsCache()
+        statements.clear()
+        started = time.perf_counter()
+        for i in range(QUERIES):
+            if cold:
+                cache._entries.clear()
+            await cache.results(i % USERS + 1)
+        elapsed = (time.perf_counter() - started) / QUERIES
+        print(f"{name:>20}: {elapsed * 1000:.3f} мс/запит, {len(statements) / QUERIES:.2f} SQL-запитів/запит")
+    await engine.dispose()
+    await read_engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,49 @@
+# benchmarks/bench_keyboards.py
+# Порівняння побудови клавіатур на кожен апдейт з кешованими клавіатурами.
+# Запуск: python -m benchmarks.bench_keyboards
+import timeit
+import tracemalloc
+from types import SimpleNamespace
+
+from keyboards.inline import menu_keyboards, electricity_keyboards
+from keyboards.reply import persistent_reply_keyboard
+from utils.helpers import build_address_inline_keyboard
+
+N = 20_000
+
+ADDRESSES = [
+    SimpleNamespace(id=i, city="Київ", street="Хрещатик", house=str(i), apartment=str(i * 3))
+    for i in range(1, 6)
+]
+
+def per_update_fresh():
+    persistent_reply_keyboard.__wrapped__()
+    build_address_inline_keyboard(ADDRESSES)
+    menu_keyboards.__wrapped__(address_id=3)
+    electricity_keyboards.__wrapped__()
+
+_address_cache = {}
+
+def per_update_cached():
+    persistent_reply_keyboard()
+    if 1 not in _address_cache:
+        _address_cache[1] = build_address_inline_keyboard(ADDRESSES)
+    _address_cache[1]
+    menu_keyboards(address_id=3)
+    electricity_keyboards()
+
+def measure(fn):
+    seconds = timeit.timeit(fn, number=N)
+    tracemalloc.start()
+    fn()
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    fn()
+    allocated = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return seconds / N * 1e6, allocated
+
+if __name__ == "__main__":
+    for name, fn in (("fresh", per_update_fresh), ("cached", per_update_cached)):
+        us, allocated = measure(fn)
+        print(f"{name:>7}: {us:8.2f} мкс/апдейт, пік алокацій {allocated:9.0f} байт/апдейт")
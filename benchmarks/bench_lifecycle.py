@@ -0,0 +1,177 @@
+# benchmarks/bench_lifecycle.py
+# Рестарт під навантаженням: aiogram start_polling (апдейти в обробці обриваються при виході)
+# проти BotLifecycle (плавна зупинка + контрольна точка з апдейтами в обробці). Рахуємо втрачені
+# та повторно оброблені апдейти і час від запиту на зупинку до обробки першого апдейту новим запуском.
+# Окремо: один повільний хендлер не має затримувати прийом решти апдейтів.
+# Запуск: python -m benchmarks.bench_lifecycle
+import asyncio
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+
+from aiogram import Bot, Dispatcher
+
+from benchmarks.replay import PollingSession, message_update
+from utils.lifecycle import BotLifecycle, UpdateCheckpoint
+
+UPDATES = 2000
+USERS = 200
+HANDLER_DELAY = (0.02, 0.08)  # імітація запитів до БД і Telegram
+ARRIVAL_RATE = 2000  # апдейтів/с надходить на "сервер" Telegram, зокрема і під час рестарту
+STOP_AFTER = 0.3
+SLOW_HANDLER = 3.0  # один "завислий" хендлер (запит до Telegram, рендер квитанції)
+FAST_UPDATES = 298
+
+
+def dispatcher(completed: Counter, served: list) -> Dispatcher:
+    dp = Dispatcher()
+    rng = random.Random(1)
+
+    @dp.message()
+    async def handler(message, event_update):
+        await asyncio.sleep(rng.uniform(*HANDLER_DELAY))
+        # Рахуємо лише завершену обробку - обірваний хендлер свій "запис" не зробив
+        completed[event_update.update_id] += 1
+        if not served:
+            served.append(time.perf_counter())
+
+    return dp
+
+
+async def feed(session: PollingSession, updates: list) -> None:
+    for start in range(0, len(updates), 20):
+        session.push(*updates[start:start + 20])
+        await asyncio.sleep(20 / ARRIVAL_RATE)
+
+
+async def until_idle(session: PollingSession, feeder: asyncio.Task, in_flight) -> None:
+    while not feeder.done() or session.pending or in_flight():
+        await asyncio.sleep(0.02)
+
+
+def make_session() -> tuple[PollingSession, list, asyncio.Task]:
+    session = PollingSession()
+    updates = [message_update(i % USERS, "ping") for i in range(UPDATES)]
+    return session, [update.update_id for update in updates], asyncio.create_task(feed(session, updates))
+
+
+async def aiogram_polling() -> dict:
+    completed, served = Counter(), []
+    dp = dispatcher(completed, served)
+    session, ids, feeder = make_session()
+    bot = Bot("42:TEST", session=session)
+
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, close_bot_session=False))
+    await asyncio.sleep(STOP_AFTER)
+    stop_requested = time.perf_counter()
+    await dp.stop_polling()
+    await polling
+    # Вихід процесу: loop закривається разом із задачами, що ще обробляють апдейти
+    for task in list(dp._handle_update_tasks):
+        task.cancel()
+    await asyncio.gather(*dp._handle_update_tasks, return_exceptions=True)
+    stopped = time.perf_counter()
+
+    served.clear()
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, close_bot_session=False))
+    await until_idle(session, feeder, lambda: dp._handle_update_tasks)
+    await dp.stop_polling()
+    await polling
+    return report(ids, completed, stop_requested, stopped, served)
+
+
+async def lifecycle_polling(tmp: str, drain_timeout: float) -> dict:
+    completed, served = Counter(), []
+    dp = dispatcher(completed, served)
+    session, ids, feeder = make_session()
+    bot = Bot("42:TEST", session=session)
+    path = os.path.join(tmp, f"update_offset-{drain_timeout}.json")
+
+    lifecycle = BotLifecycle(dp, checkpoint=UpdateCheckpoint(path), drain_timeout=drain_timeout, polling_timeout=0)
+    running = asyncio.create_task(lifecycle.run(bot))
+    await asyncio.sleep(STOP_AFTER)
+    stop_requested = time.perf_counter()
+    lifecycle.request_stop()
+    await running
+    stopped = time.perf_counter()
+
+    # Новий "процес": стан у пам'яті втрачено, лишився лише файл контрольної точки
+    served.clear()
+    lifecycle = BotLifecycle(dp, checkpoint=UpdateCheckpoint(path), polling_timeout=0)
+    running = asyncio.create_task(lifecycle.run(bot))
+    await until_idle(session, feeder, lambda: lifecycle.counters()["in_flight"])
+    lifecycle.request_stop()
+    await running
+    return report(ids, completed, stop_requested, stopped, served)
+
+
+async def slow_handler_polling(tmp: str, use_lifecycle: bool) -> int:
+    """
+    Один хендлер на SLOW_HANDLER секунд, за ним FAST_UPDATES швидких: скільки швидких
+    оброблено за першу секунду.
+    """
+    fast_done = 0
+    dp = Dispatcher()
+
+    @dp.message()
+    async def handler(message):
+        nonlocal fast_done
+        if message.text == "slow":
+            await asyncio.sleep(SLOW_HANDLER)
+        else:
+            fast_done += 1
+
+    session = PollingSession([message_update(1, "slow")] + [message_update(i % USERS + 2, "ping")
+                                                            for i in range(FAST_UPDATES)])
+    bot = Bot("42:TEST", session=session)
+    if use_lifecycle:
+        lifecycle = BotLifecycle(dp, checkpoint=UpdateCheckpoint(os.path.join(tmp, "slow.json")),
+                                 drain_timeout=0, polling_timeout=0)
+        running = asyncio.create_task(lifecycle.run(bot))
+        await asyncio.sleep(1)
+        handled = fast_done
+        lifecycle.request_stop()
+        await running
+    else:
+        running = asyncio.create_task(dp.start_polling(bot, handle_signals=False, close_bot_session=False))
+        await asyncio.sleep(1)
+        handled = fast_done
+        await dp.stop_polling()
+        await running
+        for task in list(dp._handle_update_tasks):
+            task.cancel()
+        await asyncio.gather(*dp._handle_update_tasks, return_exceptions=True)
+    return handled
+
+
+def report(ids, completed: Counter, stop_requested: float, stopped: float, served: list) -> dict:
+    return {
+        "lost": sum(1 for update_id in ids if completed[update_id] == 0),
+        "duplicated": sum(1 for update_id in ids if completed[update_id] > 1),
+        "stop_ms": (stopped - stop_requested) * 1000,
+        "serving_ms": (served[0] - stop_requested) * 1000 if served else float("nan"),
+    }
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, result in (("aiogram polling", await aiogram_polling()),
+                             ("BotLifecycle", await lifecycle_polling(tmp, drain_timeout=20)),
+                             # Дедлайн менший за час хендлера: незавершені апдейти скасовуються і
+                             # мають бути доставлені повторно після рестарту
+                             ("drain 10 мс", await lifecycle_polling(tmp, drain_timeout=0.01))):
+            print(f"{name:>16}: втрачено {result['lost']:4d}, оброблено двічі {result['duplicated']:4d} "
+                  f"з {UPDATES} | зупинка {result['stop_ms']:6.1f} мс, "
+                  f"від зупинки до обслуговування {result['serving_ms']:6.1f} мс")
+        for name, use_lifecycle in (("aiogram polling", False), ("BotLifecycle", True)):
+            handled = await slow_handler_polling(tmp, use_lifecycle)
+            print(f"{name:>16}: хендлер на {SLOW_HANDLER:.0f} с, за першу секунду оброблено "
+                  f"{handled} з {FAST_UPDATES} наступних апдейтів")
+            if use_lifecycle:
+                assert handled == FAST_UPDATES, "повільний хендлер затримує прийом апдейтів"
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
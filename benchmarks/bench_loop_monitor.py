@@ -0,0 +1,74 @@
+# benchmarks/bench_loop_monitor.py
+# LoopMonitor: чи знаходить він хендлер, що блокує event loop, і скільки коштує його робота
+# для пропускної здатності dispatcher (апдейти через replay-харнес з монітором і без).
+# Запуск: python -m benchmarks.bench_loop_monitor
+import asyncio
+import time
+
+from aiogram import Bot, Dispatcher, F, Router
+
+from benchmarks.replay import FakeSession, message_update
+from utils.loop_monitor import LoopMonitor
+
+UPDATES = 20_000
+ROUNDS = 3
+BLOCK_SECONDS = 0.25
+
+
+async def quick_handler(message, **kwargs):
+    return None
+
+
+async def blocking_handler(message, **kwargs):
+    # Синхронна робота в хендлері: весь loop стоїть
+    time.sleep(BLOCK_SECONDS)
+
+
+def dispatcher() -> Dispatcher:
+    router = Router()
+    router.message.register(blocking_handler, F.text == "block")
+    router.message.register(quick_handler)
+    dp = Dispatcher()
+    dp.include_router(router)
+    return dp
+
+
+async def throughput(dp: Dispatcher, bot: Bot, monitor: LoopMonitor | None) -> float:
+    if monitor is not None:
+        monitor.start()
+    updates = [message_update(i % 100, "ping") for i in range(UPDATES)]
+    started = time.perf_counter()
+    for i, update in enumerate(updates):
+        await dp.feed_update(bot, update)
+        if i % 100 == 0:
+            # Дати пульсу монітора шанс виконатись, як у реальному polling
+            await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+    if monitor is not None:
+        await monitor.stop()
+    return UPDATES / elapsed
+
+
+async def main():
+    dp, bot = dispatcher(), Bot("42:TEST", session=FakeSession())
+
+    monitor = LoopMonitor(interval=0.05, slow_ms=100)
+    monitor.start()
+    await asyncio.sleep(0.2)
+    await dp.feed_update(bot, message_update(1, "block"))
+    await asyncio.sleep(0.2)
+    await monitor.stop()
+    print(f"блокування {BLOCK_SECONDS * 1000:.0f} мс: записано {monitor.slow_total}, "
+          f"{list(monitor.slow_callbacks)}")
+    print(f"лічильники: {monitor.counters()}")
+
+    results = {"без монітора": [], "з монітором": []}
+    for _ in range(ROUNDS):
+        for name in results:
+            results[name].append(await throughput(dp, bot, LoopMonitor() if name == "з монітором" else None))
+    for name, runs in results.items():
+        print(f"{name:>13}: {max(runs):8.0f} апдейтів/с")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+# benchmarks/bench_maintenance.py
+# Затримка запису рахунків під час обслуговування БД: повний VACUUM проти incremental vacuum
+# короткими кроками + ANALYZE по таблицях.
+# Запуск: python -m benchmarks.bench_maintenance
+import asyncio
+import datetime
+import os
+import tempfile
+import time
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+
+from sqlalchemy import delete
+
+from db import engine, read_engine, init_db, write_session
+from models import Bill
+from utils import maintenance
+from utils.write_queue import BillWriteQueue
+
+BILLS = 200_000
+WRITE_INTERVAL = 0.005
+
+
+def make_values(i: int) -> dict:
+    return dict(user_id=1, address_id=1, service="Вивіз сміття", created_at=datetime.datetime.now(),
+                unloads=i, bins=1, trash_tariff=1600000, total_cost_trash=160 * i, idempotency_key=f"{i:0>200}")
+
+
+async def fill():
+    async with write_session() as session:
+        await session.execute(delete(Bill))
+        await session.commit()
+        await session.execute(Bill.__table__.insert(), [make_values(i) for i in range(BILLS)])
+        await session.commit()
+        # Видаляємо половину рахунків - звільнені сторінки розкидані по всьому файлу
+        await session.execute(delete(Bill).where(Bill.id % 2 == 0))
+        await session.commit()
+
+
+async def full_vacuum():
+    async with engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.executescript("VACUUM")
+
+
+async def stepped():
+    await maintenance.incremental_vacuum()
+    await maintenance.analyze()
+
+
+async def measure(job):
+    await fill()
+    queue = BillWriteQueue(session_factory=write_session)
+    latencies = []
+    done = False
+
+    async def writer():
+        i = 0
+        while not done:
+            started = time.perf_counter()
+            await queue.submit(make_values(BILLS + i))
+            latencies.append(time.perf_counter() - started)
+            i += 1
+            await asyncio.sleep(WRITE_INTERVAL)
+
+    task = asyncio.create_task(writer())
+    await asyncio.sleep(0.1)
+    started = time.perf_counter()
+    await job()
+    elapsed = time.perf_counter() - started
+    done = True
+    await task
+    await queue.stop()
+    latencies.sort()
+    return elapsed, latencies[len(latencies) // 2], latencies[-1]
+
+
+async def main():
+    engine.echo = read_engine.echo = False
+    await init_db()
+    for name, job in (("повний VACUUM", full_vacuum), ("incremental + ANALYZE", stepped)):
+        elapsed, p50, worst = await measure(job)
+        print(f"{name:>22}: {elapsed * 1000:7.1f} мс роботи; запис рахунку p50 {p50 * 1000:.1f} мс, "
+              f"макс {worst * 1000:.1f} мс")
+    await engine.dispose()
+    await read_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,128 @@
+# benchmarks/bench_meter_sim.py
+# Перерахунок історії за всіма типами лічильників: векторний numpy проти циклу Python по рахунках,
+# плюс повний шлях load_history + simulate для адреси з великою історією.
+# Запуск: python -m benchmarks.bench_meter_sim
+import asyncio
+import datetime
+import logging
+import math
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+HISTORY_SIZES = (120, 10_000, 100_000, 1_000_000)
+DB_HISTORY_SIZE = 10_000
+REPEAT = 3
+
+
+def synthetic_history(size: int, seed: int = 1) -> np.ndarray:
+    # Третина однозонних, третина двозонних, третина трьохзонних рахунків
+    rng = np.random.default_rng(seed)
+    history = np.full((size, 6), np.nan)
+    kind = np.arange(size) % 3
+    history[kind == 0, 0] = rng.integers(100, 900, (kind == 0).sum())
+    history[kind == 1, 1:3] = rng.integers(50, 600, ((kind == 1).sum(), 2))
+    history[kind == 2, 3:6] = rng.integers(30, 400, ((kind == 2).sum(), 3))
+    return history
+
+
+def simulate_loop(history: np.ndarray, tariffs: dict) -> dict[str, int]:
+    """
+    Той самий розрахунок рахунок за рахунком, без векторизації.
+    """
+    from utils.meter_sim import estimate_zone_shares, _UNITS_PER_KOPECK
+
+    shares = [float(x) for x in estimate_zone_shares(history)]
+    peak_of_day = shares[0] / (shares[0] + shares[1])
+    totals = dict.fromkeys(tariffs, 0)
+    for one, day_2, night_2, peak, day_3, night_3 in history.tolist():
+        if not math.isnan(peak) and not math.isnan(day_3) and not math.isnan(night_3):
+            zones = (peak, day_3, night_3)
+        elif not math.isnan(day_2) and not math.isnan(night_2):
+            zones = (day_2 * peak_of_day, day_2 * (1 - peak_of_day), night_2)
+        else:
+            one = 0.0 if math.isnan(one) else one
+            zones = (one * shares[0], one * shares[1], one * shares[2])
+        for name, meter in tariffs.items():
+            components = {}
+            for consumption, value in zip(zones, meter):
+                components[value] = components.get(value, 0.0) + consumption
+            for value, consumption in components.items():
+                exact = consumption * value / _UNITS_PER_KOPECK
+                totals[name] += int(math.copysign(math.floor(abs(exact) + 0.5), exact))
+    return totals
+
+
+def best_time(func, *args) -> float:
+    best = float("inf")
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+async def bench_db():
+    from sqlalchemy import insert
+    from db import init_db, write_session
+    from models import User, Address, Bill
+    from utils.addresses import resolve_building
+    from utils.bill_store import ELECTRICITY, one_zone_columns, two_zone_columns, three_zone_columns
+    from utils.meter_sim import load_history, simulate
+
+    await init_db()
+    rng = random.Random(1)
+    now = datetime.datetime.now()
+    async with write_session() as session:
+        user = User(telegram_id=1, user_name="bench")
+        session.add(user)
+        await session.flush()
+        address = Address(user_id=user.id,
+                          building=await resolve_building(session, {"city": "Київ", "street": "Хрещатик", "house": "1"}))
+        session.add(address)
+        await session.flush()
+        makers = (
+            lambda: one_zone_columns(rng.randint(100, 900), 0),
+            lambda: two_zone_columns(rng.randint(50, 600), rng.randint(50, 600), 0, 0),
+            lambda: three_zone_columns(rng.randint(30, 400), rng.randint(30, 400), rng.randint(30, 400), 0, 0, 0),
+        )
+        await session.execute(insert(Bill), [
+            dict(user_id=user.id, address_id=address.id, service=ELECTRICITY,
+                 created_at=now - datetime.timedelta(days=i), **makers[i % 3]())
+            for i in range(DB_HISTORY_SIZE)
+        ])
+        await session.commit()
+        address_id = address.id
+
+    best_load = best_simulate = float("inf")
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        history = await load_history(address_id)
+        loaded = time.perf_counter()
+        simulate(history)
+        best_load = min(best_load, loaded - started)
+        best_simulate = min(best_simulate, time.perf_counter() - loaded)
+    print(f"БД, {DB_HISTORY_SIZE} рахунків: load_history {best_load * 1000:.1f} мс, simulate {best_simulate * 1000:.2f} мс")
+
+
+def main():
+    from utils.meter_sim import simulate, METER_TARIFFS
+
+    for size in HISTORY_SIZES:
+        history = synthetic_history(size)
+        assert simulate(history) == simulate_loop(history, METER_TARIFFS)
+        vectorized = best_time(simulate, history)
+        loop = best_time(simulate_loop, history, METER_TARIFFS)
+        print(f"{size:>9} рахунків: numpy {vectorized * 1000:9.2f} мс | цикл Python {loop * 1000:10.2f} мс "
+              f"| x{loop / vectorized:.0f}")
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+        logging.disable(logging.INFO)
+        main()
+        asyncio.run(bench_db())
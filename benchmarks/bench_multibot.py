@@ -0,0 +1,80 @@
+# benchmarks/bench_multibot.py
+# N брендованих ботів: N окремих процесів по одному боту проти одного процесу з BotHost на N ботів
+# (спільні dp, пули БД, кеші, сховище FSM). Рахуємо сумарну пам'ять (max RSS) і пропускну здатність.
+# Запуск: python -m benchmarks.bench_multibot
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BOTS = 4
+UPDATES_PER_BOT = 2000
+USERS = 100
+
+CHILD = """
+import asyncio, json, logging, resource, sys, time
+logging.disable(logging.WARNING)
+from benchmarks.replay import PollingSession, message_update
+import app
+from utils.lifecycle import BotHost
+from utils.startup import StartupReport
+
+async def run(first: int, count: int, updates: int, users: int):
+    session = PollingSession()
+    bots = await app.on_startup(StartupReport(), session=session,
+                                tokens=[f"{100 + i}:BENCH" for i in range(first, first + count)])
+    for bot in bots:
+        session.push(*(message_update(i % users + 1, "/start", update_id=i + 1) for i in range(updates)),
+                     bot_id=bot.id)
+    host = BotHost(app.dp, bots, polling_timeout=0)
+    started = time.perf_counter()
+    task = asyncio.create_task(host.run())
+    while session.pending or host.in_flight:
+        await asyncio.sleep(0.005)
+    elapsed = time.perf_counter() - started
+    host.request_stop()
+    await task
+    await app.bill_writer.stop()
+    await app.cdc_log.stop()
+    await app.loop_monitor.stop()
+    print(json.dumps({"processed": host.counters()["processed"], "elapsed": elapsed,
+                      "maxrss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+
+asyncio.run(run(*map(int, sys.argv[1:])))
+"""
+
+
+def spawn(tmp: str, first: int, count: int, updates: int = UPDATES_PER_BOT) -> subprocess.Popen:
+    env = dict(os.environ, PYTHONPATH=os.getcwd(), DATABASE_URL=f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}",
+               THROTTLE_USER_BURST="1000000", THROTTLE_GLOBAL_RATE="1000000", THROTTLE_GLOBAL_BURST="1000000")
+    # Як і при окремому розгортанні, кожен процес має свій каталог для контрольної точки і журналу CDC;
+    # база даних спільна
+    workdir = tempfile.mkdtemp(dir=tmp)
+    return subprocess.Popen([sys.executable, "-c", CHILD, str(first), str(count), str(updates), str(USERS)],
+                            cwd=workdir, env=env, stdout=subprocess.PIPE, text=True)
+
+
+def run(processes: int, bots_per_process: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        # Схема і користувачі створюються заздалегідь: окремі процеси не серіалізують перевірку
+        # get_or_create_user, і одночасний перший /start одного користувача дає конфлікт UNIQUE
+        spawn(tmp, 0, 1, updates=USERS).communicate()
+        children = [spawn(tmp, p * bots_per_process, bots_per_process) for p in range(processes)]
+        results = [json.loads(child.communicate()[0].strip().splitlines()[-1]) for child in children]
+    return {
+        "processed": sum(result["processed"] for result in results),
+        "rss_mb": sum(result["maxrss_kb"] for result in results) / 1024,
+        # Процеси працюють паралельно: загальний час - час найповільнішого
+        "elapsed": max(result["elapsed"] for result in results),
+    }
+
+
+if __name__ == "__main__":
+    for label, processes, per_process in (
+        (f"{BOTS} процеси x 1 бот", BOTS, 1),
+        (f"1 процес x {BOTS} боти", 1, BOTS),
+    ):
+        result = run(processes, per_process)
+        print(f"{label:>18}: RSS {result['rss_mb']:6.1f} МБ сумарно, {result['processed']} апдейтів за "
+              f"{result['elapsed']:.2f} с ({result['processed'] / result['elapsed']:6.0f} апдейтів/с)")
@@ -0,0 +1,75 @@
+# benchmarks/bench_queries.py
+# CPU потоку event loop на гарячий запит: нова конструкція select() на кожен виклик,
+# lambda_stmt і попередньо побудовані запити з utils/queries.py.
+# thread_time рахує лише головний потік - роботу sqlite у потоці aiosqlite не враховано.
+# Запуск: python -m benchmarks.bench_queries
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+
+ROWS = 1_000
+CALLS = 2_000
+ROUNDS = 5
+
+
+async def main():
+    from sqlalchemy import select, lambda_stmt, insert
+    from db import engine, read_engine, init_db, write_session, read_session
+    from models import User, Address, Bill
+    from utils import queries
+    from utils.addresses import resolve_building
+
+    engine.echo = read_engine.echo = False
+    await init_db()
+    async with write_session() as session:
+        building = await resolve_building(session, {"city": "Київ", "street": "Хрещатик", "house": "1"})
+        await session.execute(insert(User), [dict(telegram_id=i, user_name=f"user{i}") for i in range(1, ROWS + 1)])
+        await session.execute(insert(Address), [dict(user_id=i, building_id=building.id) for i in range(1, ROWS + 1)])
+        await session.execute(insert(Bill), [dict(user_id=i, address_id=i, service="Вивіз сміття", total_cost_trash=32000)
+                                             for i in range(1, ROWS + 1)])
+        await session.commit()
+
+    cases = {
+        "User за telegram_id": (
+            lambda i: (select(User).where(User.telegram_id == i), None),
+            lambda i: (lambda_stmt(lambda: select(User).where(User.telegram_id == i)), None),
+            lambda i: (queries.USER_BY_TELEGRAM_ID, {"telegram_id": i}),
+        ),
+        "Address за id": (
+            lambda i: (select(Address).where(Address.id == i), None),
+            lambda i: (lambda_stmt(lambda: select(Address).where(Address.id == i)), None),
+            lambda i: (queries.ADDRESS_BY_ID, {"address_id": i}),
+        ),
+        "Bill за id": (
+            lambda i: (select(Bill).where(Bill.id == i), None),
+            lambda i: (lambda_stmt(lambda: select(Bill).where(Bill.id == i)), None),
+            lambda i: (queries.BILL_BY_ID, {"bill_id": i}),
+        ),
+    }
+    for name, variants in cases.items():
+        timings = [float("inf")] * len(variants)
+        # Варіанти чергуються по раундах, береться найкращий раунд - менше шуму від планувальника
+        for _ in range(ROUNDS):
+            for index, build in enumerate(variants):
+                async with read_session() as session:
+                    started = time.thread_time()
+                    for i in range(CALLS):
+                        stmt, params = build(i % ROWS + 1)
+                        (await session.execute(stmt, params)).scalars().first()
+                        session.expunge_all()
+                    timings[index] = min(timings[index], (time.thread_time() - started) / CALLS * 1e6)
+        fresh, lambda_, prepared = timings
+        print(f"{name:>20}: select() {fresh:6.1f} мкс | lambda_stmt {lambda_:6.1f} мкс | "
+              f"utils.queries {prepared:6.1f} мкс CPU event loop на запит")
+    await engine.dispose()
+    await read_engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    asyncio.run(main())
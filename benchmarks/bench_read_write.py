@@ -0,0 +1,106 @@
+# benchmarks/bench_read_write.py
+# Змішане навантаження: перегляд історії рахунків паралельно із записом нових.
+# Один спільний engine проти окремих пулів читання та запису (db.py).
+# Запуск: python -m benchmarks.bench_read_write
+import asyncio
+import datetime
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from models import Base, Bill
+
+READERS = 40
+WRITERS = 20
+OPERATIONS = 30
+SEED_BILLS = 1_000
+
+
+def make_bill(i: int) -> Bill:
+    return Bill(user_id=1, address_id=i % 20, service="Вивіз сміття", created_at=datetime.datetime.now(),
+                unloads=i, bins=1, trash_tariff=160, total_cost_trash=160 * i)
+
+
+def _pragmas(engine, *pragmas):
+    @event.listens_for(engine.sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def shared(url):
+    engine = create_async_engine(url)
+    factory = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    return factory, factory, [engine]
+
+
+def split(url):
+    writer = create_async_engine(url, pool_size=1, max_overflow=0)
+    reader = create_async_engine(url, pool_size=4, max_overflow=0)
+    _pragmas(writer, "PRAGMA journal_mode=WAL", "PRAGMA synchronous=NORMAL", "PRAGMA busy_timeout=5000")
+    _pragmas(reader, "PRAGMA query_only=ON", "PRAGMA busy_timeout=5000")
+    return (async_sessionmaker(reader, expire_on_commit=False, class_=AsyncSession),
+            async_sessionmaker(writer, expire_on_commit=False, class_=AsyncSession),
+            [writer, reader])
+
+
+async def run(setup):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+        read_factory, write_factory, engines = setup(url)
+        async with engines[0].begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with write_factory() as session:
+            session.add_all([make_bill(i) for i in range(SEED_BILLS)])
+            await session.commit()
+
+        read_latencies, write_latencies, write_errors = [], [], 0
+
+        async def reader(r):
+            for _ in range(OPERATIONS):
+                started = time.perf_counter()
+                async with read_factory() as session:
+                    stmt = select(Bill).where(Bill.address_id == r % 20).order_by(Bill.created_at.desc())
+                    (await session.execute(stmt)).scalars().all()
+                read_latencies.append(time.perf_counter() - started)
+
+        async def writer(w):
+            nonlocal write_errors
+            for i in range(OPERATIONS):
+                started = time.perf_counter()
+                try:
+                    async with write_factory() as session:
+                        session.add(make_bill(i))
+                        await session.commit()
+                    write_latencies.append(time.perf_counter() - started)
+                except Exception:
+                    write_errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(reader(r) for r in range(READERS)), *(writer(w) for w in range(WRITERS)))
+        elapsed = time.perf_counter() - started
+        for engine in engines:
+            await engine.dispose()
+    return elapsed, _percentiles(read_latencies), _percentiles(write_latencies), write_errors
+
+
+def _percentiles(latencies):
+    latencies.sort()
+    return statistics.median(latencies) * 1000, latencies[int(len(latencies) * 0.95)] * 1000
+
+
+async def main():
+    for name, setup in (("shared engine", shared), ("read/write pools", split)):
+        elapsed, reads, writes, errors = await run(setup)
+        print(f"{name:>17}: {elapsed:6.2f} с | читання p50 {reads[0]:6.1f} мс p95 {reads[1]:6.1f} мс | "
+              f"запис p50 {writes[0]:6.1f} мс p95 {writes[1]:6.1f} мс | помилок запису {errors}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+# benchmarks/bench_receipts.py
+# Чуйність event loop під конкурентними запитами на квитанції:
+# рендеринг прямо в event loop проти ReceiptRenderer (ProcessPoolExecutor).
+# Запуск: python -m benchmarks.bench_receipts
+import asyncio
+import datetime
+import tempfile
+import time
+
+from models import Bill
+from utils.bill_store import GAS, gas_columns
+from utils.receipts import ReceiptRenderer, ReceiptQueueFull, bill_details_text, _render_receipt, RECEIPT_FONT
+
+REQUESTS = 40
+TICK = 0.005
+
+
+def make_bill(bill_id: int) -> Bill:
+    return Bill(id=bill_id, service=GAS, created_at=datetime.datetime.now(), **gas_columns(100 + bill_id, bill_id))
+
+
+async def lag_probe(stop: asyncio.Event, lags: list):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(TICK)
+        lags.append(loop.time() - started - TICK)
+
+
+async def run(render):
+    stop, lags = asyncio.Event(), []
+    probe = asyncio.create_task(lag_probe(stop, lags))
+    await asyncio.sleep(TICK * 2)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(render(make_bill(i)) for i in range(REQUESTS)), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+    rejected = sum(isinstance(result, ReceiptQueueFull) for result in results)
+    return elapsed, max(lags) * 1000, rejected
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        async def inline(bill):
+            _render_receipt(bill_details_text(bill).splitlines(), f"{tmp}/inline-{bill.id}.png", "png", RECEIPT_FONT)
+            await asyncio.sleep(0)
+
+        renderer = ReceiptRenderer(max_workers=2, max_pending=REQUESTS, directory=tmp)
+        pooled = renderer.render
+        await renderer.render(make_bill(10_000))  # прогрів процесів пулу
+
+        for name, render in (("в event loop", inline), ("process pool", pooled)):
+            elapsed, max_lag, rejected = await run(render)
+            print(f"{name:>13}: {elapsed:6.2f} с на {REQUESTS} квитанцій, макс. затримка loop {max_lag:7.1f} мс, "
+                  f"відхилено {rejected}")
+        renderer.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
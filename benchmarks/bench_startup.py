@@ -0,0 +1,44 @@
+# benchmarks/bench_startup.py
+# Час від старту процесу до обробки першого апдейту (/start) на холодному та "теплому" файлі БД.
+# Запуск: python -m benchmarks.bench_startup
+import os
+import subprocess
+import sys
+import tempfile
+
+RUNS = 5
+
+CHILD = """
+import time
+_t0 = time.perf_counter()
+import asyncio, json
+from benchmarks.replay import FakeSession, message_update
+import app
+from utils.startup import StartupReport
+
+async def run():
+    report = StartupReport(_t0)
+    # Токен задається явно: бенчмарк не залежить від локального config.py
+    bots = await app.on_startup(report, session=FakeSession(), tokens=["42:BENCH"])
+    await app.dp.feed_update(bots[0], message_update(1, "/start"))
+    print(json.dumps({"phases": report.phases, "first_update": report.first_update,
+                      "done": time.perf_counter() - _t0}))
+
+asyncio.run(run())
+"""
+
+def run_once(db_path: str) -> dict:
+    import json
+    env = dict(os.environ, DATABASE_URL=f"sqlite+aiosqlite:///{db_path}")
+    out = subprocess.run([sys.executable, "-c", CHILD], env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        for run in range(RUNS):
+            result = run_once(db_path)
+            phases = ", ".join(f"{name} {seconds * 1000:.1f}" for name, seconds in result["phases"])
+            label = "холодна БД" if run == 0 else "схема актуальна"
+            print(f"[{label}] {phases} | перший апдейт {result['first_update'] * 1000:.1f} мс, "
+                  f"оброблено за {result['done'] * 1000:.1f} мс")
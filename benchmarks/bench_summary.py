@@ -0,0 +1,76 @@
+# benchmarks/bench_summary.py
+# Зведення по всіх адресах: один GROUP BY-запит проти окремого списку рахунків на кожну адресу.
+# Час одного GROUP BY має лишатися сталим при зростанні кількості адрес користувача.
+# Запуск: python -m benchmarks.bench_summary
+import asyncio
+import datetime
+import logging
+import os
+import tempfile
+import time
+
+ADDRESS_COUNTS = (1, 5, 20, 50)
+BILLS_PER_ADDRESS = 36  # три роки щомісячних рахунків
+OTHER_USERS_BILLS = 50_000
+REPEAT = 20
+
+
+async def main():
+    from sqlalchemy import select, insert
+    from db import init_db, write_session, read_session
+    from models import User, Address, Bill
+    from utils.summary import load_household_summary
+    from utils.addresses import resolve_building
+
+    await init_db()
+    now = datetime.datetime.now()
+    async with write_session() as session:
+        # Фон: рахунки інших користувачів
+        await session.execute(insert(Bill), [
+            dict(user_id=1000 + i % 500, address_id=100_000 + i % 500, service="Вивіз сміття",
+                 created_at=now - datetime.timedelta(days=i % 1000), total_cost_trash=16000)
+            for i in range(OTHER_USERS_BILLS)
+        ])
+        await session.commit()
+
+    for count in ADDRESS_COUNTS:
+        async with write_session() as session:
+            user = User(telegram_id=count, user_name=f"bench{count}")
+            session.add(user)
+            await session.flush()
+            addresses = [
+                Address(user_id=user.id,
+                        building=await resolve_building(session, {"city": "Київ", "street": "Хрещатик", "house": str(i)}))
+                for i in range(count)
+            ]
+            session.add_all(addresses)
+            await session.flush()
+            await session.execute(insert(Bill), [
+                dict(user_id=user.id, address_id=address.id, service="Газ та Газопостачання",
+                     created_at=now - datetime.timedelta(days=30 * month), total_cost_gas=46340)
+                for address in addresses for month in range(BILLS_PER_ADDRESS)
+            ])
+            await session.commit()
+            user_id, address_ids = user.id, [address.id for address in addresses]
+
+        started = time.perf_counter()
+        for _ in range(REPEAT):
+            await load_household_summary(user_id)
+        grouped = (time.perf_counter() - started) / REPEAT
+
+        started = time.perf_counter()
+        for _ in range(REPEAT):
+            for address_id in address_ids:
+                async with read_session() as session:
+                    stmt = select(Bill).where(Bill.address_id == address_id).order_by(Bill.created_at.desc())
+                    (await session.execute(stmt)).scalars().all()
+        per_address = (time.perf_counter() - started) / REPEAT
+
+        print(f"{count:>3} адрес: GROUP BY {grouped * 1000:7.2f} мс | по адресі окремо {per_address * 1000:8.2f} мс")
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+        logging.disable(logging.INFO)
+        asyncio.run(main())
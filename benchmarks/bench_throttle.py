@@ -0,0 +1,71 @@
+# benchmarks/bench_throttle.py
+# Троттлінг під флудом: скільки апдейтів доходить до хендлера (і до БД), накладні витрати
+# middleware на апдейт і пам'ять на 100k активних користувачів.
+# Запуск: python -m benchmarks.bench_throttle
+import asyncio
+import time
+import tracemalloc
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.filters import CommandStart
+
+from benchmarks.replay import FakeSession, message_update
+from utils.throttling import ThrottlingMiddleware
+
+FLOOD = 2_000
+USERS = 100_000
+
+
+async def flood(throttled: bool):
+    calls = 0
+
+    async def handler(message, **kwargs):
+        # Замість запитів до БД - лише лічильник викликів
+        nonlocal calls
+        calls += 1
+
+    router = Router()
+    router.message.register(handler, CommandStart())
+    dp = Dispatcher()
+    dp.include_router(router)
+    middleware = ThrottlingMiddleware()
+    if throttled:
+        dp.update.outer_middleware(middleware)
+    session = FakeSession()
+    bot = Bot("42:TEST", session=session)
+    updates = [message_update(1, "/start") for _ in range(FLOOD)]
+    started = time.perf_counter()
+    for update in updates:
+        await dp.feed_update(bot, update)
+    elapsed = time.perf_counter() - started
+    return calls, len(session.requests), elapsed / FLOOD * 1e6, middleware.counters()
+
+
+def memory_per_user():
+    # Глобальний ліміт тут не заважає - міряємо лише записи користувачів
+    middleware = ThrottlingMiddleware(global_rate=1e9, global_burst=10**9)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for user_id in range(USERS):
+        middleware.allow(user_id)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    started = time.perf_counter()
+    for user_id in range(USERS):
+        middleware.allow(user_id)
+    per_call = (time.perf_counter() - started) / USERS * 1e6
+    return (after - before) / USERS, per_call
+
+
+async def main():
+    calls, requests, per_update, _ = await flood(throttled=False)
+    print(f"без троттлінгу: {calls} викликів хендлера з {FLOOD}, {requests} запитів API, {per_update:.1f} мкс/апдейт")
+    calls, requests, per_update, counters = await flood(throttled=True)
+    print(f"з троттлінгом:  {calls} викликів хендлера з {FLOOD}, {requests} запитів API, {per_update:.1f} мкс/апдейт")
+    print(f"лічильники: {counters}")
+    per_user, per_call = memory_per_user()
+    print(f"{USERS} користувачів: {per_user:.0f} байт на користувача, allow() {per_call:.2f} мкс")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
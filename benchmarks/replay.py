@@ -0,0 +1,106 @@
+# benchmarks/replay.py
+# Харнес для прогону апдейтів через dispatcher без мережі: FakeSession замість Telegram API.
+import asyncio
+import datetime
+import itertools
+
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import GetMe, GetUpdates
+from aiogram.types import Update, Message, CallbackQuery, InlineQuery, Chat, User
+
+_update_ids = itertools.count(1)
+_message_ids = itertools.count(1)
+
+
+class FakeSession(BaseSession):
+    """
+    Сесія, що не ходить у мережу, а лише запам'ятовує виклики API.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests.append(method)
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+class PollingSession(FakeSession):
+    """
+    FakeSession, що відповідає на getUpdates як Telegram: віддає до limit непідтверджених
+    апдейтів, а offset підтверджує (забуває) всі апдейти з меншим update_id. Черга своя
+    для кожного бота (bot_id=None - спільна черга для ботів без власної).
+    """
+
+    def __init__(self, updates=()):
+        super().__init__()
+        self.queues: dict[int | None, list[Update]] = {None: list(updates)}
+        self.deliveries = 0
+
+    @property
+    def pending(self) -> list[Update]:
+        return [update for queue in self.queues.values() for update in queue]
+
+    def push(self, *updates: Update, bot_id: int = None) -> None:
+        self.queues.setdefault(bot_id, []).extend(updates)
+
+    async def make_request(self, bot, method, timeout=None):
+        if isinstance(method, GetMe):
+            return User(id=bot.id, is_bot=True, first_name="Replay", username=f"replay{bot.id}_bot")
+        if not isinstance(method, GetUpdates):
+            return await super().make_request(bot, method, timeout)
+        key = bot.id if bot.id in self.queues else None
+        queue = self.queues[key]
+        if method.offset:
+            queue = self.queues[key] = [update for update in queue if update.update_id >= method.offset]
+        if not queue:
+            # Довге опитування: коротка пауза замість method.timeout секунд
+            await asyncio.sleep(0.01)
+            return []
+        batch = queue[:method.limit or 100]
+        self.deliveries += len(batch)
+        return batch
+
+
+def _user(user_id: int) -> User:
+    return User(id=user_id, is_bot=False, first_name=f"User{user_id}")
+
+
+def message_update(user_id: int, text: str, update_id: int = None) -> Update:
+    message = Message(
+        message_id=next(_message_ids),
+        date=datetime.datetime.now(),
+        chat=Chat(id=user_id, type="private"),
+        from_user=_user(user_id),
+        text=text,
+    )
+    return Update(update_id=update_id or next(_update_ids), message=message)
+
+
+def callback_update(user_id: int, data: str, update_id: int = None) -> Update:
+    message = Message(
+        message_id=next(_message_ids),
+        date=datetime.datetime.now(),
+        chat=Chat(id=user_id, type="private"),
+        text="-",
+    )
+    callback = CallbackQuery(
+        id=str(next(_message_ids)),
+        from_user=_user(user_id),
+        chat_instance=str(user_id),
+        message=message,
+        data=data,
+    )
+    return Update(update_id=update_id or next(_update_ids), callback_query=callback)
+
+
+def inline_query_update(user_id: int, query: str = "", update_id: int = None) -> Update:
+    inline_query = InlineQuery(id=str(next(_message_ids)), from_user=_user(user_id), query=query, offset="")
+    return Update(update_id=update_id or next(_update_ids), inline_query=inline_query)
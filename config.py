@@ -0,0 +1 @@
+TG_TOKEN = "42:TEST"
@@ -1,31 +1,168 @@
 # db.py
-import datetime
+import os
 import logging
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from models import Base
+from models import Base, Bill, Address, City, Street, Building, MONEY_COLUMNS, TARIFF_COLUMNS
 
-DATABASE_URL = "sqlite+aiosqlite:///komunalka.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///komunalka.db")
 
-engine = create_async_engine(DATABASE_URL, echo=True)
-async_session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+# Версія схеми зберігається у PRAGMA user_version; DDL виконується лише при розбіжності.
+# 1 - початкова схема, 2 - гроші у копійках і тарифи у 1/10000 грн (цілі числа),
+# 3 - індекс bills(user_id, created_at), 4 - bills.idempotency_key з унікальним індексом,
+# 5 - канонічні cities/streets/buildings, addresses.building_id та FTS5-індекс address_fts.
+SCHEMA_VERSION = 5
+
+# Кількість read-only з'єднань для читання (список рахунків, адреси, деталі рахунку)
+READ_POOL_SIZE = int(os.getenv("READ_POOL_SIZE", "4"))
+
+# Запис іде через одне з'єднання (SQLite однаково допускає лише одного записувача),
+# читання - через окремий пул read-only з'єднань, які у WAL не блокуються записом.
+engine = create_async_engine(DATABASE_URL, echo=True, pool_size=1, max_overflow=0)
+read_engine = create_async_engine(DATABASE_URL, echo=True, pool_size=READ_POOL_SIZE, max_overflow=0)
+
+@event.listens_for(engine.sync_engine, "connect")
+def _on_write_connect(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # Має йти до journal_mode: на новому файлі вмикає incremental vacuum (utils/maintenance.py),
+    # на наявному лише запам'ятовується до наступного VACUUM
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    # Після чекпойнту WAL обрізається до цього розміру, а не лишається розміром найбільшої транзакції
+    cursor.execute("PRAGMA journal_size_limit=8388608")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+@event.listens_for(read_engine.sync_engine, "connect")
+def _on_read_connect(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+write_session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+read_session = async_sessionmaker(read_engine, expire_on_commit=False, class_=AsyncSession)
+# Сумісність зі старим кодом: async_session - сесія записувача
+async_session = write_session
+
+def _column_names(sync_conn, table: str) -> set[str]:
+    return {row[1] for row in sync_conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+
+def _migrate_money_to_integers(sync_conn):
+    """
+    1 -> 2: REAL-гривні у цілі копійки, тарифи у цілі 1/10000 грн.
+    SQLite не змінює тип колонки, тому таблиця bills перебудовується.
+    """
+    sync_conn.exec_driver_sql("ALTER TABLE bills RENAME TO bills_v1")
+    Bill.__table__.create(sync_conn)
+    # Таблиця створюється за поточною моделлю, тож копіюються лише колонки, що були у версії 1
+    old_columns = _column_names(sync_conn, "bills_v1")
+    columns = [column.name for column in Bill.__table__.columns if column.name in old_columns]
+    expressions = []
+    for name in columns:
+        if name in MONEY_COLUMNS:
+            expressions.append(f"CAST(ROUND({name} * 100) AS INTEGER)")
+        elif name in TARIFF_COLUMNS:
+            expressions.append(f"CAST(ROUND({name} * 10000) AS INTEGER)")
+        else:
+            expressions.append(name)
+    sync_conn.exec_driver_sql(
+        f"INSERT INTO bills ({', '.join(columns)}) SELECT {', '.join(expressions)} FROM bills_v1"
+    )
+    sync_conn.exec_driver_sql("DROP TABLE bills_v1")
+
+def _add_bills_user_created_index(sync_conn):
+    """
+    2 -> 3: індекс bills(user_id, created_at) для зведення по всіх адресах.
+    """
+    for index in Bill.__table__.indexes:
+        index.create(sync_conn, checkfirst=True)
+
+def _add_bills_idempotency_key(sync_conn):
+    """
+    3 -> 4: колонка bills.idempotency_key та унікальний індекс на неї.
+    """
+    if "idempotency_key" not in _column_names(sync_conn, "bills"):
+        sync_conn.exec_driver_sql("ALTER TABLE bills ADD COLUMN idempotency_key VARCHAR")
+    for index in Bill.__table__.indexes:
+        index.create(sync_conn, checkfirst=True)
+
+def _canonicalize_addresses(sync_conn):
+    """
+    4 -> 5: місто/вулиця/будинок з текстових полів addresses переносяться у спільні таблиці
+    cities/streets/buildings (дублі з різним написанням зливаються), addresses посилається
+    на будинок через building_id, текстові колонки видаляються.
+    """
+    from utils.addresses import CITY, STREET, HOUSE, clean_name, normalize_name, create_address_fts
+    for table in (City.__table__, Street.__table__, Building.__table__):
+        table.create(sync_conn, checkfirst=True)
+    create_address_fts(sync_conn)
+    if "building_id" not in _column_names(sync_conn, "addresses"):
+        sync_conn.exec_driver_sql("ALTER TABLE addresses ADD COLUMN building_id INTEGER REFERENCES buildings(id)")
+    cities, streets, buildings = {}, {}, {}
+    rows = sync_conn.exec_driver_sql("SELECT id, city, street, house FROM addresses ORDER BY id").all()
+    for address_id, city, street, house in rows:
+        city_key = normalize_name(CITY, city or "")
+        if city_key not in cities:
+            cities[city_key] = sync_conn.execute(
+                City.__table__.insert().values(name=clean_name(city or ""), name_norm=city_key)
+            ).inserted_primary_key[0]
+        street_key = (cities[city_key], normalize_name(STREET, street or ""))
+        if street_key not in streets:
+            streets[street_key] = sync_conn.execute(
+                Street.__table__.insert().values(city_id=street_key[0], name=clean_name(street or ""),
+                                                 name_norm=street_key[1])
+            ).inserted_primary_key[0]
+        building_key = (streets[street_key], normalize_name(HOUSE, house or ""))
+        if building_key not in buildings:
+            buildings[building_key] = sync_conn.execute(
+                Building.__table__.insert().values(street_id=building_key[0], house=clean_name(house or ""),
+                                                   house_norm=building_key[1])
+            ).inserted_primary_key[0]
+        sync_conn.exec_driver_sql(
+            "UPDATE addresses SET building_id = ? WHERE id = ?", (buildings[building_key], address_id)
+        )
+    for index in Address.__table__.indexes:
+        index.create(sync_conn, checkfirst=True)
+    for column in ("city", "street", "house"):
+        sync_conn.exec_driver_sql(f"ALTER TABLE addresses DROP COLUMN {column}")
+
+# Міграції: цільова версія -> функція (виконується у транзакції init_db)
+MIGRATIONS = {
+    2: _migrate_money_to_integers,
+    3: _add_bills_user_created_index,
+    4: _add_bills_idempotency_key,
+    5: _canonicalize_addresses,
+}
+
+def _has_table(sync_conn, name: str) -> bool:
+    from sqlalchemy import inspect
+    return inspect(sync_conn).has_table(name)
 
 async def init_db():
     async with engine.begin() as conn:
+        version = (await conn.exec_driver_sql("PRAGMA user_version")).scalar()
+        if version == SCHEMA_VERSION:
+            logging.info(f"Database schema is up to date (version {version}).")
+            return
+        if await conn.run_sync(_has_table, "bills"):
+            # База без user_version створена ще до версіонування - це схема версії 1
+            for target in range(max(version, 1) + 1, SCHEMA_VERSION + 1):
+                logging.info(f"Міграція схеми до версії {target}.")
+                await conn.run_sync(MIGRATIONS[target])
         await conn.run_sync(Base.metadata.create_all)
+        # FTS5-таблиця не є моделлю, create_all її не створює
+        from utils.addresses import create_address_fts
+        await conn.run_sync(create_address_fts)
+        await conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
     logging.info("Database initialized.")
 
 async def async_clear_old_bills():
-    from models import Bill  # імпортуємо Bill із models
-    from sqlalchemy import select
+    # Старі рахунки не видаляються назавжди, а переносяться у стиснутий архів (utils/archive.py)
+    from utils.archive import archive_old_bills
     try:
-        async with async_session() as session:
-            two_years_ago = datetime.datetime.now() - datetime.timedelta(days=2*365)
-            stmt = select(Bill).where(Bill.created_at < two_years_ago)
-            result = await session.execute(stmt)
-            old_bills = result.scalars().all()
-            for bill in old_bills:
-                await session.delete(bill)
-            await session.commit()
-            logging.info("Старі рахунки очищено.")
+        moved = await archive_old_bills()
+        logging.info(f"Старі рахунки перенесено в архів: {moved}.")
     except Exception as e:
         logging.error(f"Помилка при очищенні старих рахунків: {e}")
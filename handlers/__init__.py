@@ -0,0 +1,21 @@
+# handlers/__init__.py
+from aiogram import Router
+
+
+def get_routers() -> list[Router]:
+    """
+    Імпортує модулі хендлерів (кожен рівно один раз) і повертає їхні роутери
+    у порядку реєстрації. Callback-хендлери (bills, service тощо) реєструються
+    у спільній таблиці loader.callbacks.
+    """
+    from loader import callbacks
+    from handlers import address, bills, electricity, gas, inline_query, service, start, trash
+    return [
+        address.router,
+        electricity.router,
+        gas.router,
+        inline_query.router,
+        start.router,
+        trash.router,
+        callbacks.router,
+    ]
@@ -1,46 +1,43 @@
+import html
 import logging
-from aiogram import types, F
+from aiogram import Router, types, F
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
-from sqlalchemy import select
 from models import Address
-from db import async_session
-from keyboards.inline import menu_keyboards
+from db import write_session
+from keyboards.callbacks import AddressCallback, AddAddressCallback, AddressPartCallback
+from keyboards.inline import menu_keyboards, address_suggestions_keyboard
+from utils.helpers import invalidate_address_keyboard, get_user_address, format_address
+from utils.addresses import CITY, STREET, HOUSE, suggest, exact_match, clean_name, resolve_building
 from handlers.form_states import Form
-from loader import dp
+from loader import callbacks
 
-@dp.callback_query(F.data.startswith("select_address_"))
-async def process_select_address(callback: types.CallbackQuery, state: FSMContext):
+router = Router(name=__name__)
+
+@callbacks.handler(AddressCallback)
+async def process_select_address(callback: types.CallbackQuery, state: FSMContext, callback_data: AddressCallback):
     logging.debug("Entered process_select_address handler")
     try:
         current_state = await state.get_state()
         if current_state != Form.address_confirm.state:
             return
-        # Отримуємо id адреси із callback data
-        addr_id = int(callback.data.split("_")[-1])
+        addr_id = callback_data.address_id
+        # Завантажуємо дані адреси (з кешу або бази даних); у FSM потрапляє лише власна адреса користувача
+        address = await get_user_address(callback.from_user.id, addr_id)
+        if address is None:
+            await callback.answer("Адресу не знайдено.")
+            return
         await state.update_data(address_id=addr_id)
         await callback.answer()  # повідомлення про успішну обробку callback
-
-        # Завантажуємо дані адреси з бази даних
-        async with async_session() as session:
-            stmt = select(Address).where(Address.id == addr_id)
-            result = await session.execute(stmt)
-            address = result.scalars().first()
-            if address:
-                full_address = f"{address.city}, {address.street}, {address.house}"
-                if address.apartment:
-                    full_address += f", кв. {address.apartment}"
-            else:
-                full_address = "невідома адреса"
+        full_address = html.escape(format_address(address))
 
         data = await state.get_data()
         address_id = data.get("address_id")
-        user_id = data.get("user_id")
 
         # Формуємо inline клавіатуру для вибору послуг
         await callback.message.edit_text(
             f"Оберіть комунальну послугу для адреси {full_address}:",
-            reply_markup=menu_keyboards(address_id=address_id, user_id=user_id)
+            reply_markup=menu_keyboards(address_id=address_id)
         )
         await state.set_state(Form.service)
     except Exception as e:
@@ -50,7 +47,7 @@ async def process_select_address(callback: types.CallbackQuery, state: FSMContex
             reply_markup=None
         )
 
-@dp.callback_query(lambda c: c.data == "add_new_address")
+@callbacks.handler(AddAddressCallback)
 async def process_add_new_address(callback: types.CallbackQuery, state: FSMContext):
     logging.debug("Entered process_add_new_address handler")
     try:
@@ -68,43 +65,86 @@ async def process_add_new_address(callback: types.CallbackQuery, state: FSMConte
         )
 
 
-@dp.message(F.text, StateFilter(Form.city))
+# Рівень адреси -> (стан, ключ id у FSM, наступна підказка, наступний стан, ключ id батьківського рівня)
+ADDRESS_STEPS = {
+    CITY: (Form.city, "city_id", "Введіть вулицю:", Form.street, None),
+    STREET: (Form.street, "street_id", "Введіть номер будинку:", Form.house, "city_id"),
+    HOUSE: (Form.house, "building_id", "Введіть під'їзд (якщо є, інакше введіть '-' ):", Form.entrance, "street_id"),
+}
+# Вибір міста скидає вибрані вулицю і будинок, вибір вулиці - будинок
+_DEPENDENT_IDS = {CITY: ("street_id", "building_id"), STREET: ("building_id",), HOUSE: ()}
+
+
+async def _process_address_part(message: types.Message, state: FSMContext, level: str):
+    _, id_key, prompt, next_state, parent_key = ADDRESS_STEPS[level]
+    typed = clean_name(message.text)
+    data = await state.get_data()
+    parent_id = data.get(parent_key) if parent_key else None
+    # Для нового міста (вулиці) ще немає вулиць (будинків) - шукати нічого
+    suggestions = await suggest(level, typed, parent_id) if parent_key is None or parent_id else []
+    ref_id = exact_match(level, typed, suggestions)
+    await state.update_data({level: typed, id_key: ref_id, **{key: None for key in _DEPENDENT_IDS[level]}})
+    if suggestions and ref_id is None:
+        await message.answer("Оберіть зі списку або залиште введене:",
+                             reply_markup=address_suggestions_keyboard(level, suggestions, typed))
+        return
+    await message.answer(prompt)
+    await state.set_state(next_state)
+
+
+@router.message(F.text, StateFilter(Form.city))
 async def process_city(message: types.Message, state: FSMContext):
     logging.debug("Entered process_city handler")
     try:
-        await state.update_data(city=message.text.strip())
-        await message.answer("Введіть вулицю:")
-        await state.set_state(Form.street)
+        await _process_address_part(message, state, CITY)
     except Exception as e:
         logging.error(f"Помилка у process_city: {e}")
         await message.answer("Сталася помилка. Спробуйте пізніше.")
 
 
-@dp.message(F.text, StateFilter(Form.street))
+@router.message(F.text, StateFilter(Form.street))
 async def process_street(message: types.Message, state: FSMContext):
     logging.debug("Entered process_street handler")
     try:
-        await state.update_data(street=message.text.strip())
-        await message.answer("Введіть номер будинку:")
-        await state.set_state(Form.house)
+        await _process_address_part(message, state, STREET)
     except Exception as e:
         logging.error(f"Помилка у process_street: {e}")
         await message.answer("Сталася помилка. Спробуйте пізніше.")
 
 
-@dp.message(F.text, StateFilter(Form.house))
+@router.message(F.text, StateFilter(Form.house))
 async def process_house(message: types.Message, state: FSMContext):
     logging.debug("Entered process_house handler")
     try:
-        await state.update_data(house=message.text.strip())
-        await message.answer("Введіть під'їзд (якщо є, інакше введіть '-' ):")
-        await state.set_state(Form.entrance)
+        await _process_address_part(message, state, HOUSE)
     except Exception as e:
         logging.error(f"Помилка у process_house: {e}")
         await message.answer("Сталася помилка. Спробуйте пізніше.")
 
 
-@dp.message(F.text, StateFilter(Form.entrance))
+# Вибір підказки (або "залишити введене") під час введення міста, вулиці чи будинку
+@callbacks.handler(AddressPartCallback)
+async def process_address_part(callback: types.CallbackQuery, state: FSMContext, callback_data: AddressPartCallback):
+    logging.debug("Entered process_address_part handler")
+    try:
+        step = ADDRESS_STEPS.get(callback_data.level)
+        if step is None or await state.get_state() != step[0].state:
+            await callback.answer()
+            return
+        _, id_key, prompt, next_state, _ = step
+        await state.update_data({id_key: callback_data.ref_id or None})
+        await callback.answer()
+        await callback.message.edit_text(prompt, reply_markup=None)
+        await state.set_state(next_state)
+    except Exception as e:
+        logging.exception("Помилка у process_address_part:")
+        await callback.message.edit_text(
+            "Сталася помилка. Спробуйте пізніше. Натисніть кнопку \"/start\" для продовження",
+            reply_markup=None
+        )
+
+
+@router.message(F.text, StateFilter(Form.entrance))
 async def process_entrance(message: types.Message, state: FSMContext):
     logging.debug("Entered process_entrance handler")
     try:
@@ -119,7 +159,7 @@ async def process_entrance(message: types.Message, state: FSMContext):
         await message.answer("Сталася помилка. Спробуйте пізніше.")
 
 
-@dp.message(F.text, StateFilter(Form.floor))
+@router.message(F.text, StateFilter(Form.floor))
 async def process_floor(message: types.Message, state: FSMContext):
     logging.debug("Entered process_floor handler")
     try:
@@ -134,7 +174,7 @@ async def process_floor(message: types.Message, state: FSMContext):
         await message.answer("Сталася помилка. Спробуйте пізніше.")
 
 
-@dp.message(F.text, StateFilter(Form.apartment))
+@router.message(F.text, StateFilter(Form.apartment))
 async def process_apartment(message: types.Message, state: FSMContext):
     logging.debug("Entered process_apartment handler")
     try:
@@ -142,12 +182,11 @@ async def process_apartment(message: types.Message, state: FSMContext):
         if apartment == "-":
             apartment = None
         data = await state.get_data()
-        async with async_session() as session:
+        async with write_session() as session:
+            building = await resolve_building(session, data)
             address = Address(
                 user_id=data["user_id"],
-                city=data["city"],
-                street=data["street"],
-                house=data["house"],
+                building=building,
                 entrance=data.get("entrance"),
                 floor=data.get("floor"),
                 apartment=apartment
@@ -155,6 +194,7 @@ async def process_apartment(message: types.Message, state: FSMContext):
             session.add(address)
             await session.commit()
             await state.update_data(address_id=address.id)
+        invalidate_address_keyboard(data["user_id"])
 
         await message.answer("Оберіть комунальну послугу:", reply_markup=menu_keyboards())
         await state.set_state(Form.service)
@@ -1,14 +1,32 @@
 import logging
-from aiogram import types, F
+from aiogram import types
 from aiogram.fsm.context import FSMContext
-from sqlalchemy import select
-from models import Bill
-from db import async_session
+from db import read_session
+from utils.queries import BILL_BY_ID, BILLS_BY_ADDRESS
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import FSInputFile
+from keyboards.callbacks import BillsCallback, BillDetailCallback, ArchiveYearsCallback, ArchiveCallback, SummaryCallback, ReceiptCallback
 from keyboards.inline import menu_keyboards
 from handlers.form_states import Form
-from loader import dp
+from loader import callbacks
+from utils.archive import address_archived_years, load_archived_bills
+from utils.bill_store import bill_total_cost
+from utils.money import format_uah
+from utils.summary import load_household_summary, format_household_summary
+from utils.helpers import get_or_create_user, get_user_address, get_user_id
+from utils.receipts import bill_details_text, receipt_renderer, ReceiptQueueFull
 
-@dp.callback_query(F.data.startswith("bill_address_"))
+def receipt_keyboard(bill_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="Квитанція PNG", callback_data=ReceiptCallback(bill_id=bill_id, fmt="png").pack()),
+        InlineKeyboardButton(text="Квитанція PDF", callback_data=ReceiptCallback(bill_id=bill_id, fmt="pdf").pack()),
+    ]])
+
+def bill_summary_text(bill) -> str:
+    created_at_str = bill.created_at.strftime("%d-%m-%Y") if bill.created_at else "N/A"
+    return f"{bill.id}. {created_at_str}, {bill.service}, {format_uah(bill_total_cost(bill))} грн"
+
+@callbacks.handler(BillsCallback)
 async def process_bill_address(callback: types.CallbackQuery, state: FSMContext):
     logging.debug("Entered process_bill_address handler")
     try:
@@ -16,29 +34,23 @@ async def process_bill_address(callback: types.CallbackQuery, state: FSMContext)
         logging.debug(f"FSM data: {data}")
         if "address_id" not in data:
             raise ValueError("address_id не знайдено у FSM")
-        stmt = select(Bill).where(Bill.address_id == data["address_id"]).order_by(Bill.created_at.desc())
-        async with async_session() as session:
-            result = await session.execute(stmt)
+        async with read_session() as session:
+            result = await session.execute(BILLS_BY_ADDRESS, {"address_id": data["address_id"]})
             bills = result.scalars().all()
 
-            from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
             keyboard = InlineKeyboardMarkup(inline_keyboard=[])
             for bill in bills:
-                created_at_str = bill.created_at.strftime("%d-%m-%Y") if bill.created_at else "N/A"
-                if bill.service == "Електроенергія":
-                    total_cost = bill.total_cost or bill.total_cost_2 or bill.total_cost_3
-                elif bill.service == "Газ та Газопостачання":
-                    total_cost = bill.total_cost_gas
-                elif bill.service == "Вивіз сміття":
-                    total_cost = bill.total_cost_trash
-                else:
-                    total_cost = 0
-                total_cost_str = f"{total_cost:.2f}"
-                bill_text = f"{bill.id}. {created_at_str}, {bill.service}, {total_cost_str} грн"
                 keyboard.inline_keyboard.append(
-                    [InlineKeyboardButton(text=bill_text, callback_data=f"bill_detail_{bill.id}")]
+                    [InlineKeyboardButton(text=bill_summary_text(bill),
+                                          callback_data=BillDetailCallback(bill_id=bill.id).pack())]
                 )
-            if bills:
+            has_archive = bool(await address_archived_years(data["address_id"]))
+            if has_archive:
+                keyboard.inline_keyboard.append(
+                    [InlineKeyboardButton(text="Архів рахунків",
+                                          callback_data=ArchiveYearsCallback(address_id=data["address_id"]).pack())]
+                )
+            if bills or has_archive:
                 await callback.message.edit_text(
                     "Ваші збережені рахунки комунальних послуг або натисніть \"/start\" для вибору адреси:",
                     reply_markup=keyboard
@@ -56,75 +68,112 @@ async def process_bill_address(callback: types.CallbackQuery, state: FSMContext)
             reply_markup=None
         )
 
-@dp.callback_query(F.data.startswith("bill_detail_"))
-async def process_bill_detail(callback: types.CallbackQuery, state: FSMContext):
+@callbacks.handler(BillDetailCallback)
+async def process_bill_detail(callback: types.CallbackQuery, state: FSMContext, callback_data: BillDetailCallback):
     logging.debug("Entered process_bill_detail handler")
     try:
-        bill_id = int(callback.data.split("_")[-1])
-        async with async_session() as session:
-            stmt = select(Bill).where(Bill.id == bill_id)
-            result = await session.execute(stmt)
+        bill_id = callback_data.bill_id
+        async with read_session() as session:
+            result = await session.execute(BILL_BY_ID, {"bill_id": bill_id})
             bill = result.scalars().first()
-        if not bill:
+        # Як і з адресами, id рахунку з callback не можна використовувати без перевірки власника
+        if not bill or bill.user_id != await get_user_id(callback.from_user.id):
             await callback.message.answer("Рахунок не знайдено.")
             return
 
-        created_at_str = bill.created_at.strftime("%d-%m-%Y %H:%M") if bill.created_at else "N/A"
-        details = f"Рахунок №{bill_id}\nДата: {created_at_str}\nПослуга: {bill.service}\n\n"
-        if bill.service == "Електроенергія":
-            if bill.total_cost is not None:
-                details += "Тип: Однозонний\n"
-                details += f"Поточні показники: {int(bill.current)}\n"
-                details += f"Попередні показники: {int(bill.previous)}\n"
-                details += f"Спожито: {int(bill.consumption)}\n"
-                details += f"Тариф: {bill.tariff}\n"
-                details += f"Загальна вартість: {bill.total_cost:.2f} грн\n"
-            elif bill.total_cost_2 is not None:
-                details += "Тип: Двозонний\n"
-                details += f"Поточні показники (День): {int(bill.current_day_2)}\n"
-                details += f"Попередні показники (День): {int(bill.previous_day_2)}\n"
-                details += f"Поточні показники (Ніч): {int(bill.current_night_2)}\n"
-                details += f"Попередні показники (Ніч): {int(bill.previous_night_2)}\n"
-                details += f"Спожито (День): {int(bill.consumption_day_2)}\n"
-                details += f"Спожито (Ніч): {int(bill.consumption_night_2)}\n"
-                details += f"Тариф (День): {bill.tariff_day_2}\n"
-                details += f"Тариф (Ніч): {bill.tariff_night_2}\n"
-                details += f"Загальна вартість: {bill.total_cost_2:.2f} грн\n"
-            elif bill.total_cost_3 is not None:
-                details += "Тип: Трьохзонний\n"
-                details += f"Поточні показники (Пік): {int(bill.current_peak)}\n"
-                details += f"Попередні показники (Пік): {int(bill.previous_peak)}\n"
-                details += f"Поточні показники (День): {int(bill.current_day_3)}\n"
-                details += f"Попередні показники (День): {int(bill.previous_day_3)}\n"
-                details += f"Поточні показники (Ніч): {int(bill.current_night_3)}\n"
-                details += f"Попередні показники (Ніч): {int(bill.previous_night_3)}\n"
-                details += f"Загальна вартість: {bill.total_cost_3:.2f} грн\n"
-            else:
-                details += "Дані по електроенергії відсутні.\n"
-        elif bill.service == "Газ та Газопостачання":
-            details += f"Поточні показники: {int(bill.gas_current)}\n"
-            details += f"Попередні показники: {int(bill.gas_previous)}\n"
-            details += f"Спожито газу: {int(bill.gas_consumption)}\n"
-            details += f"Тариф газ: {bill.tariff_gas}\n"
-            details += f"Тариф газопостачання: {bill.tariff_gas_supply}\n"
-            details += f"Вартість газу: {bill.cost_gas:.2f} грн\n"
-            details += f"Вартість газопостачання: {bill.cost_gas_supply:.2f} грн\n"
-            details += f"Загальна вартість: {bill.total_cost_gas:.2f} грн\n"
-        elif bill.service == "Вивіз сміття":
-            details += f"Кількість відвантажень: {int(bill.unloads)}\n"
-            details += f"Кількість сміттєвих баків: {int(bill.bins)}\n"
-            details += f"Тариф: {bill.trash_tariff}\n"
-            details += f"Загальна вартість: {bill.total_cost_trash:.2f} грн\n"
+        details = bill_details_text(bill)
+        await callback.message.edit_text(
+            f"Ваш детальний рахунок:\n\n{details}\nДля вибору адреси натисніть \"/start\".",
+            reply_markup=receipt_keyboard(bill_id)
+        )
+    except Exception as e:
+        logging.exception("Помилка у process_bill_detail:")
+        await callback.message.edit_text(
+            "Сталася помилка. Спробуйте пізніше. Натисніть кнопку \"/start\" для продовження",
+            reply_markup=None
+        )
+
+@callbacks.handler(ArchiveYearsCallback)
+async def process_archive_years(callback: types.CallbackQuery, callback_data: ArchiveYearsCallback):
+    logging.debug("Entered process_archive_years handler")
+    try:
+        await callback.answer()
+        if await get_user_address(callback.from_user.id, callback_data.address_id) is None:
+            await callback.message.edit_text("Адресу не знайдено. Натисніть \"/start\" для вибору адреси.",
+                                             reply_markup=None)
+            return
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text=str(year),
+                                  callback_data=ArchiveCallback(address_id=callback_data.address_id, year=year).pack())]
+            for year in await address_archived_years(callback_data.address_id)
+        ])
+        await callback.message.edit_text("Оберіть рік архівних рахунків:", reply_markup=keyboard)
+    except Exception as e:
+        logging.exception("Помилка у process_archive_years:")
+        await callback.message.edit_text(
+            "Сталася помилка. Спробуйте пізніше. Натисніть кнопку \"/start\" для продовження",
+            reply_markup=None
+        )
+
+@callbacks.handler(ArchiveCallback)
+async def process_archive(callback: types.CallbackQuery, callback_data: ArchiveCallback):
+    logging.debug("Entered process_archive handler")
+    try:
+        await callback.answer()
+        if await get_user_address(callback.from_user.id, callback_data.address_id) is None:
+            await callback.message.edit_text("Адресу не знайдено. Натисніть \"/start\" для вибору адреси.",
+                                             reply_markup=None)
+            return
+        bills = await load_archived_bills(callback_data.address_id, callback_data.year)
+        if bills:
+            text = f"Архівні рахунки за {callback_data.year} рік:\n" + "\n".join(bill_summary_text(bill) for bill in bills)
         else:
-            details += "Додаткових даних немає.\n"
+            text = f"Архівних рахунків за {callback_data.year} рік не знайдено."
+        await callback.message.edit_text(f"{text}\n\nДля вибору адреси натисніть \"/start\".", reply_markup=None)
+    except Exception as e:
+        logging.exception("Помилка у process_archive:")
+        await callback.message.edit_text(
+            "Сталася помилка. Спробуйте пізніше. Натисніть кнопку \"/start\" для продовження",
+            reply_markup=None
+        )
 
+@callbacks.handler(SummaryCallback)
+async def process_household_summary(callback: types.CallbackQuery, state: FSMContext):
+    logging.debug("Entered process_household_summary handler")
+    try:
+        await callback.answer()
+        data = await state.get_data()
+        user_id = data.get("user_id")
+        if user_id is None:
+            user = await get_or_create_user(callback.from_user.id, callback.from_user.full_name)
+            user_id = user.id
+        rows = await load_household_summary(user_id)
         await callback.message.edit_text(
-            f"Ваш детальний рахунок:\n\n{details}\nДля вибору адреси натисніть \"/start\".",
+            f"{format_household_summary(rows)}\n\nДля вибору адреси натисніть \"/start\".",
             reply_markup=None
         )
     except Exception as e:
-        logging.exception("Помилка у process_bill_detail:")
+        logging.exception("Помилка у process_household_summary:")
         await callback.message.edit_text(
             "Сталася помилка. Спробуйте пізніше. Натисніть кнопку \"/start\" для продовження",
             reply_markup=None
         )
+
+@callbacks.handler(ReceiptCallback)
+async def process_receipt(callback: types.CallbackQuery, callback_data: ReceiptCallback):
+    logging.debug("Entered process_receipt handler")
+    try:
+        async with read_session() as session:
+            result = await session.execute(BILL_BY_ID, {"bill_id": callback_data.bill_id})
+            bill = result.scalars().first()
+        if not bill or bill.user_id != await get_user_id(callback.from_user.id):
+            await callback.answer("Рахунок не знайдено.")
+            return
+        await callback.answer("Готуємо квитанцію...")
+        path = await receipt_renderer.render(bill, callback_data.fmt)
+        await callback.message.answer_document(FSInputFile(path))
+    except ReceiptQueueFull:
+        await callback.message.answer("Забагато запитів на квитанції. Спробуйте за хвилину.")
+    except Exception as e:
+        logging.exception("Помилка у process_receipt:")
+        await callback.message.answer("Не вдалося сформувати квитанцію. Спробуйте пізніше.")
@@ -1,14 +1,19 @@
+import html
 import logging
 import datetime
-from aiogram import types, F
+from aiogram import Router, types, F
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
-from db import async_session
-from models import Bill
 from handlers.form_states import Form
-from loader import dp
+from utils.bill_store import ELECTRICITY, save_bill, load_bill, one_zone_columns, two_zone_columns, three_zone_columns
+from utils.helpers import format_address, claim_final_step, release_final_step
+from utils.money import format_uah, format_tariff
+from utils.receipts import bill_details_text
+from utils.write_queue import DuplicateBill
 
-@dp.message(F.text, StateFilter(Form.elec_one_current))
+router = Router(name=__name__)
+
+@router.message(F.text, StateFilter(Form.elec_one_current))
 async def process_elec_one_current(message: types.Message, state: FSMContext):
     logging.debug("Entered process_elec_one_current handler")
     try:
@@ -22,53 +27,53 @@ async def process_elec_one_current(message: types.Message, state: FSMContext):
         logging.exception("Помилка у process_elec_one_current:")
         await message.answer("Сталася помилка. Спробуйте пізніше.")
 
-@dp.message(F.text, StateFilter(Form.elec_one_previous))
+@router.message(F.text, StateFilter(Form.elec_one_previous))
 async def process_elec_one_previous(message: types.Message, state: FSMContext):
     logging.debug("Entered process_elec_one_previous handler")
     try:
         previous = float(message.text.strip())
+        if not await claim_final_step(state):
+            logging.info("Повтор у process_elec_one_previous: останній крок уже виконується")
+            return
         data = await state.get_data()
         current = data.get("elec_one_current")
-        consumption = current - previous
-        tariff = 4.32
-        total_cost = consumption * tariff
-
-        async with async_session() as session:
-            bill = Bill(
-                user_id=data["user_id"],
-                address_id=data["address_id"],
-                service="Електроенергія",
-                created_at=datetime.datetime.now(),
-                current=int(current),
-                previous=int(previous),
-                consumption=int(consumption),
-                tariff=tariff,
-                total_cost=total_cost
-            )
-            session.add(bill)
-            await session.commit()
+        bill = one_zone_columns(current, previous)
+        bill_id, address = await save_bill(data["user_id"], data["address_id"], ELECTRICITY, bill,
+                                          idempotency_key=data.get("flow_id"))
 
         bill_text = (
             f"{'-'*47}\n"
             f"Дата: {datetime.datetime.now().strftime('%d-%m-%Y %H:%M')}\n"
             f"Послуга: Електроенергія (Однозонний)\n"
+            f"Адреса: {html.escape(format_address(address)) if address else 'невідома адреса'}\n"
             f"Показники: {int(current)} - {int(previous)}\n"
-            f"Спожито: {int(consumption)} кВт\n"
-            f"Тариф: {tariff:.2f} грн/кВт\n"
+            f"Спожито: {bill['consumption']} кВт\n"
+            f"Тариф: {format_tariff(bill['tariff'])} грн/кВт\n"
             f"{'-'*47}\n"
-            f"Вартість: {total_cost:.2f} грн"
+            f"Вартість: {format_uah(bill['total_cost'])} грн"
         )
         await message.answer(bill_text)
         await state.clear()
         await state.set_state(Form.start)
+    except DuplicateBill as e:
+        # Повтор після невдалої першої спроби (паралельний повтор відсікає claim_final_step):
+        # рахунок уже збережено, а відповідь не дійшла - завершуємо розмову і надсилаємо його
+        logging.info("Повтор у process_elec_one_previous: рахунок %s уже збережено", e.bill_id)
+        await state.clear()
+        await state.set_state(Form.start)
+        bill = await load_bill(e.bill_id)
+        if bill:
+            await message.answer(f"Рахунок уже збережено:\n\n{bill_details_text(bill)}")
     except ValueError:
+        await release_final_step(state)
         await message.answer("Введіть числове значення.")
     except Exception as e:
         logging.exception("Помилка у process_elec_one_previous:")
+        await release_final_step(state)
         await message.answer("Сталася помилка. Спробуйте пізніше.")
 
 # Двозонний режим (День та Ніч)
-@dp.message(F.text, StateFilter(Form.elec_two_current_day))
+@router.message(F.text, StateFilter(Form.elec_two_current_day))
 async def process_elec_two_current_day(message: types.Message, state: FSMContext):
     logging.debug("Entered process_elec_two_current_day handler")
     try:
@@ -82,7 +87,7 @@ async def process_elec_two_current_day(message: types.Message, state: FSMContext
         logging.exception("Помилка у process_elec_two_current_day:")
         await message.answer("Сталася помилка. Спробуйте пізніше.")
 
-@dp.message(F.text, StateFilter(Form.elec_two_current_night))
+@router.message(F.text, StateFilter(Form.elec_two_current_night))
 async def process_elec_two_current_night(message: types.Message, state: FSMContext):
     logging.debug("Entered process_elec_two_current_night handler")
     try:
@@ -96,7 +101,7 @@ async def process_elec_two_current_night(message: types.Message, state: FSMConte
         logging.exception("Помилка у process_elec_two_current_night:")
         await message.answer("Сталася помилка. Спробуйте пізніше.")
 
-@dp.message(F.text, StateFilter(Form.elec_two_previous_day))
+@router.message(F.text, StateFilter(Form.elec_two_previous_day))
 async def process_elec_two_previous_day(message: types.Message, state: FSMContext):
     logging.debug("Entered process_elec_two_previous_day handler")
     try:
@@ -110,70 +115,57 @@ async def process_elec_two_previous_day(message: types.Message, state: FSMContex
         logging.exception("Помилка у process_elec_two_previous_day:")
         await message.answer("Сталася помилка. Спробуйте пізніше.")
 
-@dp.message(F.text, StateFilter(Form.elec_two_previous_night))
+@router.message(F.text, StateFilter(Form.elec_two_previous_night))
 async def process_elec_two_previous_night(message: types.Message, state: FSMContext):
     logging.debug("Entered process_elec_two_previous_night handler")
     try:
         previous_night = float(message.text.strip())
+        if not await claim_final_step(state):
+            logging.info("Повтор у process_elec_two_previous_night: останній крок уже виконується")
+            return
         data = await state.get_data()
         current_day = data.get("elec_two_current_day")
         current_night = data.get("elec_two_current_night")
         previous_day = data.get("elec_two_previous_day")
-        consumption_day = current_day - previous_day
-        consumption_night = current_night - previous_night
-        total_consumption = consumption_day + consumption_night
-        tariff_day = 4.32
-        tariff_night = 2.16
-        cost_day = consumption_day * tariff_day
-        cost_night = consumption_night * tariff_night
-        total_cost = cost_day + cost_night
-
-        async with async_session() as session:
-            from models import Bill
-            bill = Bill(
-                user_id=data["user_id"],
-                address_id=data["address_id"],
-                service="Електроенергія",
-                created_at=datetime.datetime.now(),
-                current_day_2=int(current_day),
-                current_night_2=int(current_night),
-                previous_day_2=int(previous_day),
-                previous_night_2=int(previous_night),
-                consumption_day_2=int(consumption_day),
-                consumption_night_2=int(consumption_night),
-                total_consumption_2=int(total_consumption),
-                tariff_day_2=tariff_day,
-                tariff_night_2=tariff_night,
-                cost_day_2=cost_day,
-                cost_night_2=cost_night,
-                total_cost_2=total_cost
-            )
-            session.add(bill)
-            await session.commit()
+        bill = two_zone_columns(current_day, current_night, previous_day, previous_night)
+        bill_id, address = await save_bill(data["user_id"], data["address_id"], ELECTRICITY, bill,
+                                          idempotency_key=data.get("flow_id"))
         bill_text = (
             f"{'-'*47}\n"
             f"Дата: {datetime.datetime.now().strftime('%d-%m-%Y %H:%M')}\n"
             f"Послуга: Електроенергія (Двозонний)\n"
+            f"Адреса: {html.escape(format_address(address)) if address else 'невідома адреса'}\n"
             f"Показники День: {int(current_day)} - {int(previous_day)}\n"
             f"Показники Ніч: {int(current_night)} - {int(previous_night)}\n"
-            f"Спожито День: {int(consumption_day)} кВт\n"
-            f"Спожито Ніч: {int(consumption_night)} кВт\n"
-            f"Тариф День: {tariff_day:.2f} грн/кВт\n"
-            f"Тариф Ніч: {tariff_night:.2f} грн/кВт\n"
+            f"Спожито День: {bill['consumption_day_2']} кВт\n"
+            f"Спожито Ніч: {bill['consumption_night_2']} кВт\n"
+            f"Тариф День: {format_tariff(bill['tariff_day_2'])} грн/кВт\n"
+            f"Тариф Ніч: {format_tariff(bill['tariff_night_2'])} грн/кВт\n"
             f"{'-'*47}\n"
-            f"Вартість: {total_cost:.2f} грн"
+            f"Вартість: {format_uah(bill['total_cost_2'])} грн"
         )
         await message.answer(bill_text)
         await state.clear()
         await state.set_state(Form.start)
+    except DuplicateBill as e:
+        # Повтор після невдалої першої спроби (паралельний повтор відсікає claim_final_step):
+        # рахунок уже збережено, а відповідь не дійшла - завершуємо розмову і надсилаємо його
+        logging.info("Повтор у process_elec_two_previous_night: рахунок %s уже збережено", e.bill_id)
+        await state.clear()
+        await state.set_state(Form.start)
+        bill = await load_bill(e.bill_id)
+        if bill:
+            await message.answer(f"Рахунок уже збережено:\n\n{bill_details_text(bill)}")
     except ValueError:
+        await release_final_step(state)
         await message.answer("Введіть числове значення.")
     except Exception as e:
         logging.exception("Помилка у process_elec_two_previous_night:")
+        await release_final_step(state)
         await message.answer("Сталася помилка. Спробуйте пізніше.")
 
 # Трьохзонний режим
-@dp.message(F.text, StateFilter(Form.elec_three_current_peak))
+@router.message(F.text, StateFilter(Form.elec_three_current_peak))
 async def process_elec_three_current_peak(message: types.Message, state: FSMContext):
     logging.debug("Entered process_elec_three_current_peak handler")
     try:
@@ -187,7 +179,7 @@ async def process_elec_three_current_peak(message: types.Message, state: FSMCont
         logging.exception("Помилка у process_elec_three_current_peak:")
         await message.answer("Сталася помилка. Спробуйте пізніше.")
 
-@dp.message(F.text, StateFilter(Form.elec_three_current_day))
+@router.message(F.text, StateFilter(Form.elec_three_current_day))
 async def process_elec_three_current_day(message: types.Message, state: FSMContext):
     logging.debug("Entered process_elec_three_current_day handler")
     try:
@@ -201,7 +193,7 @@ async def process_elec_three_current_day(message: types.Message, state: FSMConte
         logging.exception("Помилка у process_elec_three_current_day:")
         await message.answer("Сталася помилка. Спробуйте пізніше.")
 
-@dp.message(F.text, StateFilter(Form.elec_three_current_night))
+@router.message(F.text, StateFilter(Form.elec_three_current_night))
 async def process_elec_three_current_night(message: types.Message, state: FSMContext):
     logging.debug("Entered process_elec_three_current_night handler")
     try:
@@ -215,7 +207,7 @@ async def process_elec_three_current_night(message: types.Message, state: FSMCon
         logging.exception("Помилка у process_elec_three_current_night:")
         await message.answer("Сталася помилка. Спробуйте пізніше.")
 
-@dp.message(F.text, StateFilter(Form.elec_three_previous_peak))
+@router.message(F.text, StateFilter(Form.elec_three_previous_peak))
 async def process_elec_three_previous_peak(message: types.Message, state: FSMContext):
     logging.debug("Entered process_elec_three_previous_peak handler")
     try:
@@ -229,7 +221,7 @@ async def process_elec_three_previous_peak(message: types.Message, state: FSMCon
         logging.exception("Помилка у process_elec_three_previous_peak:")
         await message.answer("Сталася помилка. Спробуйте пізніше.")
 
-@dp.message(F.text, StateFilter(Form.elec_three_previous_day))
+@router.message(F.text, StateFilter(Form.elec_three_previous_day))
 async def process_elec_three_previous_day(message: types.Message, state: FSMContext):
     logging.debug("Entered process_elec_three_previous_day handler")
     try:
@@ -243,78 +235,58 @@ async def process_elec_three_previous_day(message: types.Message, state: FSMCont
         logging.exception("Помилка у process_elec_three_previous_day:")
         await message.answer("Сталася помилка. Спробуйте пізніше.")
 
-@dp.message(F.text, StateFilter(Form.elec_three_previous_night))
+@router.message(F.text, StateFilter(Form.elec_three_previous_night))
 async def process_elec_three_previous_night(message: types.Message, state: FSMContext):
     logging.debug("Entered process_elec_three_previous_night handler")
     try:
         previous_night = float(message.text.strip())
+        if not await claim_final_step(state):
+            logging.info("Повтор у process_elec_three_previous_night: останній крок уже виконується")
+            return
         data = await state.get_data()
         current_peak = data.get("elec_three_current_peak")
         current_day = data.get("elec_three_current_day")
         current_night = data.get("elec_three_current_night")
         previous_peak = data.get("elec_three_previous_peak")
         previous_day = data.get("elec_three_previous_day")
-        consumption_peak = current_peak - previous_peak
-        consumption_day = current_day - previous_day
-        consumption_night = current_night - previous_night
-        total_consumption = consumption_peak + consumption_day + consumption_night
-        tariff_peak = 6.48
-        tariff_day = 4.32
-        tariff_night = 1.728
-        cost_peak = consumption_peak * tariff_peak
-        cost_day = consumption_day * tariff_day
-        cost_night = consumption_night * tariff_night
-        total_cost = cost_peak + cost_day + cost_night
-
-        async with async_session() as session:
-            from models import Bill
-            bill = Bill(
-                user_id=data["user_id"],
-                address_id=data["address_id"],
-                service="Електроенергія",
-                created_at=datetime.datetime.now(),
-                current_peak=int(current_peak),
-                current_day_3=int(current_day),
-                current_night_3=int(current_night),
-                previous_peak=int(previous_peak),
-                previous_day_3=int(previous_day),
-                previous_night_3=int(previous_night),
-                consumption_peak=int(consumption_peak),
-                consumption_day_3=int(consumption_day),
-                consumption_night_3=int(consumption_night),
-                total_consumption_3=int(total_consumption),
-                tariff_peak=tariff_peak,
-                tariff_day_3=tariff_day,
-                tariff_night_3=tariff_night,
-                cost_peak=cost_peak,
-                cost_day_3=cost_day,
-                cost_night_3=cost_night,
-                total_cost_3=total_cost
-            )
-            session.add(bill)
-            await session.commit()
+        bill = three_zone_columns(current_peak, current_day, current_night,
+                                  previous_peak, previous_day, previous_night)
+        bill_id, address = await save_bill(data["user_id"], data["address_id"], ELECTRICITY, bill,
+                                          idempotency_key=data.get("flow_id"))
 
         bill_text = (
             f"{'-'*47}\n"
             f"Дата: {datetime.datetime.now().strftime('%d-%m-%Y %H:%M')}\n"
             f"Послуга: Електроенергія (Трьохзонний)\n"
+            f"Адреса: {html.escape(format_address(address)) if address else 'невідома адреса'}\n"
             f"Показники Пік: {int(current_peak)} - {int(previous_peak)}\n"
             f"Показники День: {int(current_day)} - {int(previous_day)}\n"
             f"Показники Ніч: {int(current_night)} - {int(previous_night)}\n"
-            f"Спожито Пік: {int(consumption_peak)} кВт\n"
-            f"Спожито День: {int(consumption_day)} кВт\n"
-            f"Спожито Ніч: {int(consumption_night)} кВт\n"
-            f"Тариф Пік: {tariff_peak:.2f} грн/кВт\n"
-            f"Тариф День: {tariff_day:.2f} грн/кВт\n"
-            f"Тариф Ніч: {tariff_night:.2f} грн/кВт\n"
+            f"Спожито Пік: {bill['consumption_peak']} кВт\n"
+            f"Спожито День: {bill['consumption_day_3']} кВт\n"
+            f"Спожито Ніч: {bill['consumption_night_3']} кВт\n"
+            f"Тариф Пік: {format_tariff(bill['tariff_peak'])} грн/кВт\n"
+            f"Тариф День: {format_tariff(bill['tariff_day_3'])} грн/кВт\n"
+            f"Тариф Ніч: {format_tariff(bill['tariff_night_3'])} грн/кВт\n"
             f"{'-'*47}\n"
-            f"Загальна вартість: {total_cost:.2f} грн"
+            f"Загальна вартість: {format_uah(bill['total_cost_3'])} грн"
         )
         await message.answer(bill_text)
         await state.clear()
         await state.set_state(Form.start)
+    except DuplicateBill as e:
+        # Повтор після невдалої першої спроби (паралельний повтор відсікає claim_final_step):
+        # рахунок уже збережено, а відповідь не дійшла - завершуємо розмову і надсилаємо його
+        logging.info("Повтор у process_elec_three_previous_night: рахунок %s уже збережено", e.bill_id)
+        await state.clear()
+        await state.set_state(Form.start)
+        bill = await load_bill(e.bill_id)
+        if bill:
+            await message.answer(f"Рахунок уже збережено:\n\n{bill_details_text(bill)}")
     except ValueError:
+        await release_final_step(state)
         await message.answer("Введіть числове значення.")
     except Exception as e:
         logging.exception("Помилка у process_elec_three_previous_night:")
+        await release_final_step(state)
         await message.answer("Сталася помилка. Спробуйте пізніше.")
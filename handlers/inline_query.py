@@ -0,0 +1,24 @@
+import logging
+from aiogram import Router, types
+from utils.recent_bills import recent_bills
+
+router = Router(name=__name__)
+
+# Скільки секунд Telegram кешує відповідь на боці клієнта (новий рахунок з'явиться не пізніше)
+INLINE_CACHE_TIME = 30
+
+# Inline-режим (@bot у будь-якому чаті): останні рахунки по кожній адресі користувача
+@router.inline_query()
+async def process_inline_query(inline_query: types.InlineQuery):
+    logging.debug("Entered process_inline_query handler")
+    try:
+        results = await recent_bills.results(inline_query.from_user.id, inline_query.query)
+        if results:
+            await inline_query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=True)
+        else:
+            await inline_query.answer(
+                [], cache_time=INLINE_CACHE_TIME, is_personal=True,
+                button=types.InlineQueryResultsButton(text="Рахунків ще немає - відкрити бота", start_parameter="start"),
+            )
+    except Exception as e:
+        logging.exception("Помилка у process_inline_query:")
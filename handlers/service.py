@@ -1,15 +1,21 @@
+import logging
+import uuid
+from aiogram import types
+from aiogram.fsm.context import FSMContext
+from keyboards.callbacks import ServiceCallback, MeterCallback, MeterCompareCallback
 from keyboards.inline import electricity_keyboards
 from handlers.form_states import Form
-from loader import dp, bot
-from handlers.electricity import *
+from loader import callbacks
+from utils.meter_sim import load_history, simulate, format_comparison
 
 
-@dp.callback_query(lambda c: c.data and c.data.startswith("service_"))
-async def process_service(callback: types.CallbackQuery, state: FSMContext):
+@callbacks.handler(ServiceCallback)
+async def process_service(callback: types.CallbackQuery, state: FSMContext, callback_data: ServiceCallback):
     logging.debug("Entered process_service handler")
     try:
-        service = callback.data.split("_")[1]
-        await state.update_data(service=service)
+        service = callback_data.name
+        # flow_id - ключ ідемпотентності рахунку: повтор останнього кроку не створить другий запис
+        await state.update_data(service=service, flow_id=uuid.uuid4().hex)
         await callback.answer()
         if service == "electricity":
             logging.debug("Electricity service")
@@ -48,30 +54,50 @@ async def process_service(callback: types.CallbackQuery, state: FSMContext):
 
 
 # Обробка вибору типу лічильника для електроенергії
-@dp.callback_query(lambda c: c.data in ["elec_one", "elec_two", "elec_three"])
-async def process_electricity_type(callback: types.CallbackQuery, state: FSMContext):
+@callbacks.handler(MeterCallback)
+async def process_electricity_type(callback: types.CallbackQuery, state: FSMContext, callback_data: MeterCallback):
     logging.debug("Entered process_electricity_type handler")
     try:
-        elec_type = callback.data
+        elec_type = f"elec_{callback_data.meter}"
         await state.update_data(electricity_type=elec_type)
-        await bot.answer_callback_query(callback.id)
+        await callback.bot.answer_callback_query(callback.id)
         if elec_type == "elec_one":
             logging.debug("Entered elec_one")
-            await bot.send_message(callback.from_user.id, "Введіть поточні показники лічильника (Однозонний):")
+            await callback.bot.send_message(callback.from_user.id, "Введіть поточні показники лічильника (Однозонний):")
             await state.set_state(Form.elec_one_current)
         elif elec_type == "elec_two":
             logging.debug("Entered elec_two")
-            await bot.send_message(callback.from_user.id, "Введіть поточні показники лічильника в зоні 'День':")
+            await callback.bot.send_message(callback.from_user.id, "Введіть поточні показники лічильника в зоні 'День':")
             await state.set_state(Form.elec_two_current_day)
         elif elec_type == "elec_three":
             logging.debug("Entered elec_three")
-            await bot.send_message(callback.from_user.id, "Введіть поточні показники лічильника в зоні 'Пік':")
+            await callback.bot.send_message(callback.from_user.id, "Введіть поточні показники лічильника в зоні 'Пік':")
             await state.set_state(Form.elec_three_current_peak)
     except Exception as e:
         logging.error(f"Помилка у process_electricity_type: {e}")
-        await bot.edit_message_text(
+        await callback.bot.edit_message_text(
             chat_id=callback.message.chat.id,
             message_id=callback.message.message_id,
             text="Сталася помилка. Спробуйте пізніше. Натисніть кнопку \"/start\" для продовження",
             reply_markup=None
-        )
\ No newline at end of file
+        )
+
+# Порівняння вартості історії споживання адреси за всіма типами лічильників
+@callbacks.handler(MeterCompareCallback)
+async def process_meter_compare(callback: types.CallbackQuery, state: FSMContext):
+    logging.debug("Entered process_meter_compare handler")
+    try:
+        await callback.answer()
+        data = await state.get_data()
+        history = await load_history(data["address_id"])
+        text = format_comparison(simulate(history), history)
+        await callback.message.edit_text(
+            f"{text}\n\nОберіть тип лічильника для електроенергії або натисніть \"/start\" для вибору адреси:",
+            reply_markup=electricity_keyboards()
+        )
+    except Exception as e:
+        logging.exception("Помилка у process_meter_compare:")
+        await callback.message.edit_text(
+            "Сталася помилка. Спробуйте пізніше. Натисніть кнопку \"/start\" для продовження",
+            reply_markup=None
+        )
@@ -1,17 +1,19 @@
 # handlers/start.py
 import logging
-from aiogram import types, F
+from aiogram import Router, types, F
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from sqlalchemy import select
 from models import User, Address
 from db import async_session
 from keyboards.reply import persistent_reply_keyboard
-from utils.helpers import get_or_create_user, load_addresses, build_address_inline_keyboard
+from utils.helpers import get_or_create_user, get_address_keyboard
 from handlers.form_states import Form  # Можна винести FSM стани в окремий файл
-from loader import dp
+from loader import callbacks
 
-@dp.message(Command("start"))
+router = Router(name=__name__)
+
+@router.message(Command("start"))
 async def cmd_start(message: types.Message, state: FSMContext):
     logging.debug("Entered cmd_start handler")
     # Відправляємо постійну reply клавіатуру (наприклад, з кнопкою "Розпочати")
@@ -23,9 +25,9 @@ async def cmd_start(message: types.Message, state: FSMContext):
     try:
         user = await get_or_create_user(telegram_id, user_name)
         await state.update_data(user_id=user.id, telegram_id=telegram_id, user_name=user_name)
-        addresses = await load_addresses(user.id)
-        if addresses:
-            text, inline_kb = build_address_inline_keyboard(addresses)
+        address_keyboard = await get_address_keyboard(user.id)
+        if address_keyboard:
+            text, inline_kb = address_keyboard
             await message.answer(text, reply_markup=inline_kb)
             await state.set_state(Form.address_confirm)
         else:
@@ -34,3 +36,10 @@ async def cmd_start(message: types.Message, state: FSMContext):
     except Exception as e:
         logging.exception("Error in cmd_start:")
         await message.answer("Сталася помилка. Спробуйте пізніше.")
+
+
+@callbacks.fallback
+async def process_stale_callback(callback: types.CallbackQuery):
+    # Кнопки зі старих повідомлень (service_*, bill_detail_* тощо) інакше лишаються без відповіді
+    logging.debug(f"Невідомий callback_data: {callback.data!r}")
+    await callback.answer("Ця кнопка вже не діє. Натисніть \"/start\" для продовження.", show_alert=True)
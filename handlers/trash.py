@@ -1,16 +1,20 @@
+import html
 import logging
 import datetime
-from aiogram import types, F
+from aiogram import Router, types, F
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
-from sqlalchemy import select
-from models import Bill, Address
-from db import async_session
 from aiogram.types import ReplyKeyboardRemove
 from handlers.form_states import Form
-from loader import dp
+from utils.bill_store import TRASH, save_bill, load_bill, trash_columns
+from utils.helpers import format_address, claim_final_step, release_final_step
+from utils.money import format_uah, format_tariff
+from utils.receipts import bill_details_text
+from utils.write_queue import DuplicateBill
 
-@dp.message(F.text, StateFilter(Form.trash_unloads))
+router = Router(name=__name__)
+
+@router.message(F.text, StateFilter(Form.trash_unloads))
 async def process_trash_unloads(message: types.Message, state: FSMContext):
     logging.debug("Entered process_trash_unloads handler")
     try:
@@ -24,7 +28,7 @@ async def process_trash_unloads(message: types.Message, state: FSMContext):
         logging.exception("Помилка у process_trash_unloads:")
         await message.answer("Сталася помилка. Спробуйте пізніше.")
 
-@dp.message(F.text, StateFilter(Form.trash_bins))
+@router.message(F.text, StateFilter(Form.trash_bins))
 async def process_trash_bins(message: types.Message, state: FSMContext):
     logging.debug("Entered process_trash_bins handler")
     try:
@@ -32,52 +36,42 @@ async def process_trash_bins(message: types.Message, state: FSMContext):
             await message.answer("Введіть числове значення.")
             return
         bins = int(message.text.strip())
+        if not await claim_final_step(state):
+            logging.info("Повтор у process_trash_bins: останній крок уже виконується")
+            return
         data = await state.get_data()
         unloads = data.get("trash_unloads")
-        tariff = 160
-        total_cost = unloads * bins * tariff
-
-        async with async_session() as session:
-            bill = Bill(
-                user_id=data["user_id"],
-                address_id=data["address_id"],
-                service="Вивіз сміття",
-                created_at=datetime.datetime.now(),
-                unloads=unloads,
-                bins=bins,
-                trash_tariff=tariff,
-                total_cost_trash=total_cost
-            )
-            session.add(bill)
-            await session.commit()
-
-            stmt_addr = select(Address).where(Address.id == data["address_id"])
-            result_addr = await session.execute(stmt_addr)
-            addr_obj = result_addr.scalars().first()
-
-        if addr_obj:
-            city = addr_obj.city or ""
-            street = addr_obj.street or ""
-            house = addr_obj.house or ""
-            apartment = addr_obj.apartment or ""
-        else:
-            city, street, house, apartment = "", "", "", ""
+        bill = trash_columns(unloads, bins)
+        bill_id, address = await save_bill(data["user_id"], data["address_id"], TRASH, bill,
+                                          idempotency_key=data.get("flow_id"))
 
         bill_text = (
             f"{'-'*47}\n"
             f"Дата: {datetime.datetime.now().strftime('%d-%m-%Y %H:%M')}\n"
             f"Послуга: Вивіз сміття\n"
+            f"Адреса: {html.escape(format_address(address)) if address else 'невідома адреса'}\n"
             f"Відвантаження: {int(unloads)}\n"
             f"Сміттєві баки: {int(bins)}\n"
-            f"Тариф: {tariff:.2f} грн\n"
+            f"Тариф: {format_tariff(bill['trash_tariff'])} грн\n"
             f"{'-'*47}\n"
-            f"Загальна вартість: {total_cost:.2f} грн"
+            f"Загальна вартість: {format_uah(bill['total_cost_trash'])} грн"
         )
         await message.answer(bill_text)
         await state.clear()
         await state.set_state(Form.start)
+    except DuplicateBill as e:
+        # Повтор після невдалої першої спроби (паралельний повтор відсікає claim_final_step):
+        # рахунок уже збережено, а відповідь не дійшла - завершуємо розмову і надсилаємо його
+        logging.info("Повтор у process_trash_bins: рахунок %s уже збережено", e.bill_id)
+        await state.clear()
+        await state.set_state(Form.start)
+        bill = await load_bill(e.bill_id)
+        if bill:
+            await message.answer(f"Рахунок уже збережено:\n\n{bill_details_text(bill)}")
     except ValueError:
+        await release_final_step(state)
         await message.answer("Введіть числове значення.")
     except Exception as e:
         logging.exception("Помилка у process_trash_bins:")
+        await release_final_step(state)
         await message.answer("Сталася помилка. Спробуйте пізніше.")
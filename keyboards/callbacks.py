@@ -0,0 +1,43 @@
+# keyboards/callbacks.py
+from aiogram.filters.callback_data import CallbackData
+
+# Типізовані схеми callback_data. Префікс - ключ у таблиці маршрутизації (utils/callback_router.py).
+
+class AddressCallback(CallbackData, prefix="addr"):
+    address_id: int
+
+class AddAddressCallback(CallbackData, prefix="addr_new"):
+    pass
+
+class AddressPartCallback(CallbackData, prefix="addr_part"):
+    level: str  # city, street, house
+    ref_id: int  # id підказки; 0 - залишити введений текст
+
+class ServiceCallback(CallbackData, prefix="service"):
+    name: str  # electricity, gas, trash, bills
+
+class MeterCallback(CallbackData, prefix="elec"):
+    meter: str  # one, two, three
+
+class MeterCompareCallback(CallbackData, prefix="elec_compare"):
+    pass
+
+class BillsCallback(CallbackData, prefix="bills"):
+    address_id: int
+
+class BillDetailCallback(CallbackData, prefix="bill"):
+    bill_id: int
+
+class ReceiptCallback(CallbackData, prefix="receipt"):
+    bill_id: int
+    fmt: str  # png, pdf
+
+class SummaryCallback(CallbackData, prefix="summary"):
+    pass
+
+class ArchiveYearsCallback(CallbackData, prefix="archive_years"):
+    address_id: int
+
+class ArchiveCallback(CallbackData, prefix="archive"):
+    address_id: int
+    year: int
@@ -1,6 +1,8 @@
 # keyboards/inline.py
+from functools import lru_cache
 from typing import Any, Coroutine
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from keyboards.callbacks import ServiceCallback, MeterCallback, MeterCompareCallback, BillsCallback, AddressPartCallback
 
 # def start_keyboard() -> InlineKeyboardMarkup:
 #     start_button = InlineKeyboardButton(text="Start", callback_data="start_")
@@ -11,24 +13,37 @@ from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 #     merged = InlineKeyboardMarkup(inline_keyboard=specific.inline_keyboard + default_kb.inline_keyboard)
 #     return merged
 
-def menu_keyboards(address_id: int = None, user_id: int = None) -> InlineKeyboardMarkup:
+# Клавіатури кешуються і повертаються як спільні об'єкти - не змінюйте їх після отримання.
+
+@lru_cache(maxsize=4096)
+def menu_keyboards(address_id: int = None) -> InlineKeyboardMarkup:
     buttons = [
-        [InlineKeyboardButton(text="Електроенергія", callback_data="service_electricity")],
-        [InlineKeyboardButton(text="Газ та Газопостачання", callback_data="service_gas")],
-        [InlineKeyboardButton(text="Вивіз сміття", callback_data="service_trash")]
+        [InlineKeyboardButton(text="Електроенергія", callback_data=ServiceCallback(name="electricity").pack())],
+        [InlineKeyboardButton(text="Газ та Газопостачання", callback_data=ServiceCallback(name="gas").pack())],
+        [InlineKeyboardButton(text="Вивіз сміття", callback_data=ServiceCallback(name="trash").pack())]
     ]
     if address_id is not None:
-        buttons.append([InlineKeyboardButton(text="Рахунки", callback_data=f"bill_address_{address_id}")])
-    elif user_id is not None:
-        buttons.append([InlineKeyboardButton(text="Адреси", callback_data=f"start_{user_id}")])
+        buttons.append([InlineKeyboardButton(text="Рахунки", callback_data=BillsCallback(address_id=address_id).pack())])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+@lru_cache(maxsize=1)
 def electricity_keyboards() -> InlineKeyboardMarkup:
     kb = InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text="Однозонний", callback_data="elec_one"),
-             InlineKeyboardButton(text="Двозонний", callback_data="elec_two")],
-            [InlineKeyboardButton(text="Трьохзонний", callback_data="elec_three")]
+            [InlineKeyboardButton(text="Однозонний", callback_data=MeterCallback(meter="one").pack()),
+             InlineKeyboardButton(text="Двозонний", callback_data=MeterCallback(meter="two").pack())],
+            [InlineKeyboardButton(text="Трьохзонний", callback_data=MeterCallback(meter="three").pack())],
+            [InlineKeyboardButton(text="Порівняти лічильники", callback_data=MeterCompareCallback().pack())]
         ]
     )
     return kb
+
+def address_suggestions_keyboard(level: str, suggestions: list[tuple[int, str]], typed: str) -> InlineKeyboardMarkup:
+    # Підказки залежать від введеного тексту, тож ця клавіатура не кешується
+    buttons = [
+        [InlineKeyboardButton(text=name, callback_data=AddressPartCallback(level=level, ref_id=ref_id).pack())]
+        for ref_id, name in suggestions
+    ]
+    buttons.append([InlineKeyboardButton(text=f"Залишити «{typed[:40]}»",
+                                         callback_data=AddressPartCallback(level=level, ref_id=0).pack())])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
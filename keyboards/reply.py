@@ -1,9 +1,12 @@
 # keyboards/reply.py
+from functools import lru_cache
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 
+@lru_cache(maxsize=1)
 def persistent_reply_keyboard() -> ReplyKeyboardMarkup:
     """
     Повертає постійну Reply клавіатуру з кнопкою "Розпочати".
+    Об'єкт створюється один раз і спільний для всіх викликів.
     """
     kb = ReplyKeyboardMarkup(
         keyboard=[[KeyboardButton(text="/start")]],
@@ -12,9 +15,11 @@ def persistent_reply_keyboard() -> ReplyKeyboardMarkup:
     )
     return kb
 
+@lru_cache(maxsize=1)
 def main_reply_keyboard() -> ReplyKeyboardMarkup:
     """
     Повертає Reply клавіатуру з кнопками для вибору послуг.
+    Об'єкт створюється один раз і спільний для всіх викликів.
     """
     btn_electricity = KeyboardButton(text="Електроенергія 💡")
     btn_gas = KeyboardButton(text="Газ та Газопостачання")
@@ -1,9 +1,37 @@
 # loader.py
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.client.bot import DefaultBotProperties
-import config
+from aiogram.client.session.aiohttp import AiohttpSession
+from utils.callback_router import CallbackRouter
+from utils.fsm_storage import TTLMemoryStorage
+from utils import stats
 
-bot = Bot(token=config.TG_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
-storage = MemoryStorage()
+# Незавершені розмови видаляються після FSM_TTL секунд бездіяльності. Сховище спільне для всіх
+# ботів процесу: StorageKey містить bot_id, тож розмови різних ботів не перетинаються
+storage = TTLMemoryStorage()
+stats.register("fsm", storage.counters)
 dp = Dispatcher(storage=storage)
+# Спільна таблиця маршрутизації callback_query для всіх модулів хендлерів
+callbacks = CallbackRouter(name="callbacks")
+
+def create_bot(token: str = None, session=None) -> Bot:
+    """
+    Створює Bot. config імпортується лише тут, щоб імпорт loader не залежав від токена.
+    """
+    if token is None:
+        import config
+        token = config.TG_TOKEN
+    return Bot(token=token, session=session, default=DefaultBotProperties(parse_mode="HTML"))
+
+def create_bots(tokens: list[str] = None, session=None) -> list[Bot]:
+    """
+    Боти для всіх токенів процесу: config.TG_TOKENS (кілька брендованих ботів) або config.TG_TOKEN.
+    Усі боти використовують одну HTTP-сесію (один пул з'єднань до Bot API).
+    """
+    if tokens is None:
+        import config
+        tokens = getattr(config, "TG_TOKENS", None) or [config.TG_TOKEN]
+    if len(set(tokens)) != len(tokens):
+        raise ValueError("Токени ботів повторюються")
+    session = session or AiohttpSession()
+    return [create_bot(token, session=session) for token in tokens]
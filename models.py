@@ -1,7 +1,7 @@
 # models.py
 import datetime
 from sqlalchemy.orm import declarative_base, relationship
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, UniqueConstraint
 
 Base = declarative_base()
 
@@ -13,31 +13,77 @@ class User(Base):
     addresses = relationship("Address", backref="user")
     bills = relationship("Bill", backref="user")
 
+# Канонічні місто/вулиця/будинок спільні для всіх користувачів; name_norm - ключ пошуку дублів
+# (див. utils/addresses.py), name - написання, яке ввели першим.
+class City(Base):
+    __tablename__ = 'cities'
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    name_norm = Column(String, nullable=False, unique=True)
+
+class Street(Base):
+    __tablename__ = 'streets'
+    __table_args__ = (UniqueConstraint("city_id", "name_norm"),)
+    id = Column(Integer, primary_key=True)
+    city_id = Column(Integer, ForeignKey('cities.id'), nullable=False)
+    name = Column(String, nullable=False)
+    name_norm = Column(String, nullable=False)
+    city = relationship("City", lazy="joined", innerjoin=True)
+
+class Building(Base):
+    __tablename__ = 'buildings'
+    __table_args__ = (UniqueConstraint("street_id", "house_norm"),)
+    id = Column(Integer, primary_key=True)
+    street_id = Column(Integer, ForeignKey('streets.id'), nullable=False)
+    house = Column(String, nullable=False)
+    house_norm = Column(String, nullable=False)
+    street = relationship("Street", lazy="joined", innerjoin=True)
+
 class Address(Base):
     __tablename__ = 'addresses'
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'))
-    city = Column(String)
-    street = Column(String)
-    house = Column(String)
+    building_id = Column(Integer, ForeignKey('buildings.id'), index=True)
     entrance = Column(String, nullable=True)
     floor = Column(String, nullable=True)
     apartment = Column(String, nullable=True)
     bills = relationship("Bill", backref="address")
+    # Будинок з вулицею та містом завантажуються разом з адресою (адреси кешуються поза сесією)
+    building = relationship("Building", lazy="joined")
+
+    @property
+    def city(self) -> str:
+        return self.building.street.city.name
+
+    @property
+    def street(self) -> str:
+        return self.building.street.name
+
+    @property
+    def house(self) -> str:
+        return self.building.house
 
 class Bill(Base):
     __tablename__ = 'bills'
+    __table_args__ = (
+        # Шлях доступу для зведення по всіх адресах користувача за період
+        Index("ix_bills_user_created", "user_id", "created_at"),
+        Index("ux_bills_idempotency_key", "idempotency_key", unique=True),
+    )
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'))
     address_id = Column(Integer, ForeignKey('addresses.id'))
     service = Column(String)  # "Електроенергія", "Газ та Газопостачання", "Вивіз сміття"
     created_at = Column(DateTime, default=datetime.datetime.now)
+    # Ключ сценарію введення (flow_id у FSM): повтор останнього кроку не створює дубль рахунку
+    idempotency_key = Column(String, nullable=True)
+    # Усі вартості (*cost*) - цілі копійки, усі тарифи (*tariff*) - цілі 1/10000 грн (див. utils/money.py)
     # Однозонна електроенергія
     current = Column(Integer, nullable=True)
     previous = Column(Integer, nullable=True)
     consumption = Column(Integer, nullable=True)
-    tariff = Column(Float, nullable=True)
-    total_cost = Column(Float, nullable=True)
+    tariff = Column(Integer, nullable=True)
+    total_cost = Column(Integer, nullable=True)
     # Двозонна електроенергія
     current_day_2 = Column(Integer, nullable=True)
     current_night_2 = Column(Integer, nullable=True)
@@ -46,11 +92,11 @@ class Bill(Base):
     consumption_day_2 = Column(Integer, nullable=True)
     consumption_night_2 = Column(Integer, nullable=True)
     total_consumption_2 = Column(Integer, nullable=True)
-    tariff_day_2 = Column(Float, nullable=True)
-    tariff_night_2 = Column(Float, nullable=True)
-    cost_day_2 = Column(Float, nullable=True)
-    cost_night_2 = Column(Float, nullable=True)
-    total_cost_2 = Column(Float, nullable=True)
+    tariff_day_2 = Column(Integer, nullable=True)
+    tariff_night_2 = Column(Integer, nullable=True)
+    cost_day_2 = Column(Integer, nullable=True)
+    cost_night_2 = Column(Integer, nullable=True)
+    total_cost_2 = Column(Integer, nullable=True)
     # Трьохзонна електроенергія
     current_peak = Column(Integer, nullable=True)
     previous_peak = Column(Integer, nullable=True)
@@ -62,24 +108,28 @@ class Bill(Base):
     previous_night_3 = Column(Integer, nullable=True)
     consumption_night_3 = Column(Integer, nullable=True)
     total_consumption_3 = Column(Integer, nullable=True)
-    tariff_peak = Column(Float, nullable=True)
-    tariff_day_3 = Column(Float, nullable=True)
-    tariff_night_3 = Column(Float, nullable=True)
-    cost_peak = Column(Float, nullable=True)
-    cost_day_3 = Column(Float, nullable=True)
-    cost_night_3 = Column(Float, nullable=True)
-    total_cost_3 = Column(Float, nullable=True)
+    tariff_peak = Column(Integer, nullable=True)
+    tariff_day_3 = Column(Integer, nullable=True)
+    tariff_night_3 = Column(Integer, nullable=True)
+    cost_peak = Column(Integer, nullable=True)
+    cost_day_3 = Column(Integer, nullable=True)
+    cost_night_3 = Column(Integer, nullable=True)
+    total_cost_3 = Column(Integer, nullable=True)
     # Газ та Газопостачання
     gas_current = Column(Integer, nullable=True)
     gas_previous = Column(Integer, nullable=True)
     gas_consumption = Column(Integer, nullable=True)
-    tariff_gas = Column(Float, nullable=True)
-    tariff_gas_supply = Column(Float, nullable=True)
-    cost_gas = Column(Float, nullable=True)
-    cost_gas_supply = Column(Float, nullable=True)
-    total_cost_gas = Column(Float, nullable=True)
+    tariff_gas = Column(Integer, nullable=True)
+    tariff_gas_supply = Column(Integer, nullable=True)
+    cost_gas = Column(Integer, nullable=True)
+    cost_gas_supply = Column(Integer, nullable=True)
+    total_cost_gas = Column(Integer, nullable=True)
     # Вивіз сміття
     unloads = Column(Integer, nullable=True)
     bins = Column(Integer, nullable=True)
-    trash_tariff = Column(Float, nullable=True)
-    total_cost_trash = Column(Float, nullable=True)
+    trash_tariff = Column(Integer, nullable=True)
+    total_cost_trash = Column(Integer, nullable=True)
+
+# Грошові колонки та колонки тарифів Bill (використовуються міграцією схеми у db.py)
+MONEY_COLUMNS = tuple(c.name for c in Bill.__table__.columns if "cost" in c.name)
+TARIFF_COLUMNS = tuple(c.name for c in Bill.__table__.columns if "tariff" in c.name)
@@ -0,0 +1,12 @@
+# tests/__init__.py
+# Спільне оточення тестів: тимчасова БД і каталоги. Налаштування читаються під час імпорту
+# модулів застосунку, тож задаються до імпорту будь-якого тестового модуля.
+import os
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="komunalka-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ["CDC_DIR"] = os.path.join(_tmp, "cdc")
+os.environ["RECEIPTS_DIR"] = os.path.join(_tmp, "receipts")
+os.environ["ARCHIVE_DIR"] = os.path.join(_tmp, "archive")
+os.environ["THROTTLE_USER_BURST"] = "1000"
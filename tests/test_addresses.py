@@ -0,0 +1,56 @@
+# tests/test_addresses.py
+# utils.addresses.resolve_building: id з даних FSM перевіряються, а не використовуються наосліп.
+import unittest
+
+from db import engine, read_engine, write_session, init_db
+from models import Building
+from utils.addresses import resolve_building
+
+
+class ResolveBuildingTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        await init_db()
+
+    async def asyncTearDown(self):
+        await engine.dispose()
+        await read_engine.dispose()
+
+    async def resolve(self, data: dict):
+        async with write_session() as session:
+            building = await resolve_building(session, data)
+            await session.commit()
+            # Новий будинок без завантаженої вулиці: перечитуємо разом з вулицею і містом
+            return await session.get(Building, building.id, populate_existing=True)
+
+    async def test_typed_text_creates_building(self):
+        building = await self.resolve({"city": "Одеса", "street": "Дерибасівська", "house": "1"})
+        self.assertIsNotNone(building.id)
+        self.assertEqual((building.street.city.name, building.street.name, building.house),
+                         ("Одеса", "Дерибасівська", "1"))
+
+    async def test_matching_ids_are_reused(self):
+        building = await self.resolve({"city": "Одеса", "street": "Дерибасівська", "house": "2"})
+        chosen = await self.resolve({"city": "Од", "city_id": building.street.city_id, "street": "Дериб",
+                                     "street_id": building.street_id, "house": "2б", "building_id": building.id})
+        self.assertEqual(chosen.id, building.id)
+
+    async def test_unknown_building_id_falls_back_to_typed_house(self):
+        building = await self.resolve({"city": "Одеса", "street": "Пушкінська", "house": "7",
+                                       "building_id": 10 ** 9})
+        self.assertIsNotNone(building)
+        self.assertEqual((building.street.name, building.house), ("Пушкінська", "7"))
+
+    async def test_ids_of_another_parent_are_ignored(self):
+        other = await self.resolve({"city": "Харків", "street": "Сумська", "house": "3"})
+        city = (await self.resolve({"city": "Полтава", "street": "Соборності", "house": "1"})).street.city
+        # Вулиця і будинок іншого міста не можуть бути обрані для Полтави
+        building = await self.resolve({"city": "Полтава", "city_id": city.id, "street": "Сумська",
+                                       "street_id": other.street_id, "house": "3", "building_id": other.id})
+        self.assertNotEqual(building.id, other.id)
+        self.assertEqual(building.street.city_id, city.id)
+        self.assertEqual((building.street.name, building.house), ("Сумська", "3"))
+
+
+if __name__ == "__main__":
+    unittest.main()
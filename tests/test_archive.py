@@ -0,0 +1,77 @@
+# tests/test_archive.py
+# utils.archive.archive_old_bills: запис сегмента (gzip і fsync) іде без з'єднання записувача,
+# тож збереження рахунків у цей час не чекає.
+import asyncio
+import datetime
+import threading
+import unittest
+from unittest import mock
+
+from sqlalchemy import select, update
+
+from db import engine, read_engine, read_session, write_session, init_db
+from models import Address, Bill, User
+from utils import archive
+from utils.addresses import resolve_building
+from utils.bill_store import GAS, save_bill, gas_columns
+from utils.write_queue import bill_writer
+
+OLD = datetime.datetime(2000, 1, 1)
+
+
+class ArchiveTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        await init_db()
+        async with write_session() as session:
+            user = User(telegram_id=5000, user_name="archive")
+            session.add(user)
+            await session.flush()
+            building = await resolve_building(session, {"city": "Київ", "street": "Архівна", "house": "1"})
+            address = Address(user_id=user.id, building=building)
+            session.add(address)
+            await session.commit()
+        self.user_id, self.address_id = user.id, address.id
+
+    async def asyncTearDown(self):
+        await bill_writer.stop()
+        await engine.dispose()
+        await read_engine.dispose()
+
+    async def save(self) -> int:
+        bill_id, _ = await save_bill(self.user_id, self.address_id, GAS, gas_columns(120, 100))
+        return bill_id
+
+    async def test_bill_save_does_not_wait_for_segment_write(self):
+        old_id = await self.save()
+        async with write_session() as session:
+            await session.execute(update(Bill).where(Bill.id == old_id).values(created_at=OLD))
+            await session.commit()
+
+        started, release = threading.Event(), threading.Event()
+        append_segments = archive._append_segments
+
+        def slow_append(rows_by_year):
+            started.set()
+            release.wait(10)
+            append_segments(rows_by_year)
+
+        with mock.patch.object(archive, "_append_segments", slow_append):
+            task = asyncio.create_task(archive.archive_old_bills(cutoff=OLD + datetime.timedelta(days=1)))
+            try:
+                await asyncio.to_thread(started.wait, 10)
+                # Сегмент ще пишеться, а новий рахунок уже збережено
+                new_id = await asyncio.wait_for(self.save(), 2)
+            finally:
+                release.set()
+                moved = await task
+        self.assertEqual(moved, 1)
+        async with read_session() as session:
+            ids = set((await session.execute(select(Bill.id).where(Bill.id.in_([old_id, new_id])))).scalars())
+        self.assertEqual(ids, {new_id})
+        archived = await archive.load_archived_bills(self.address_id, OLD.year)
+        self.assertEqual([bill.id for bill in archived], [old_id])
+
+
+if __name__ == "__main__":
+    unittest.main()
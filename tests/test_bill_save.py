@@ -0,0 +1,95 @@
+# tests/test_bill_save.py
+# Кількість SQL-запитів на збережений рахунок (utils.bill_store.save_bill): один INSERT ... RETURNING
+# на пакет рахунків (з idempotency_key, як у хендлерах, - ще один SELECT ключів на пакет),
+# адреса - з кешу без SELECT після першого запиту.
+import asyncio
+import itertools
+import uuid
+import unittest
+
+from sqlalchemy import event
+
+from db import engine, read_engine, write_session, init_db
+from models import User, Address
+from utils.addresses import resolve_building
+from utils.bill_store import GAS, save_bill, gas_columns
+from utils.write_queue import bill_writer
+
+_telegram_ids = itertools.count(3000)
+
+
+class BillSaveQueriesTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        await init_db()
+        async with write_session() as session:
+            user = User(telegram_id=next(_telegram_ids), user_name="test")
+            session.add(user)
+            await session.flush()
+            building = await resolve_building(session, {"city": "Київ", "street": "Хрещатик", "house": "1"})
+            address = Address(user_id=user.id, building=building)
+            session.add(address)
+            await session.commit()
+        self.user_id, self.address_id = user.id, address.id
+        self.statements = []
+        for target in (engine.sync_engine, read_engine.sync_engine):
+            event.listen(target, "before_cursor_execute", self._record)
+
+    async def asyncTearDown(self):
+        for target in (engine.sync_engine, read_engine.sync_engine):
+            event.remove(target, "before_cursor_execute", self._record)
+        await bill_writer.stop()
+        await engine.dispose()
+        await read_engine.dispose()
+
+    def _record(self, conn, cursor, statement, *args):
+        self.statements.append(" ".join(statement.split()[:3]))
+
+    async def save(self, i: int = 0, idempotency_key: str = None):
+        bill_id, address = await save_bill(self.user_id, self.address_id, GAS, gas_columns(100 + i, i),
+                                           idempotency_key=idempotency_key)
+        self.assertIsNotNone(address)
+        return bill_id
+
+    async def test_lone_bill_is_one_insert(self):
+        await self.save()
+        # Перший рахунок адреси: INSERT і один SELECT адреси (далі вона в кеші)
+        self.assertEqual(sorted(statement.split()[0] for statement in self.statements), ["INSERT", "SELECT"])
+        self.statements.clear()
+        await self.save(1)
+        self.assertEqual(len(self.statements), 1)
+        self.assertTrue(self.statements[0].startswith("INSERT INTO bills"))
+
+    async def test_concurrent_bills_share_inserts(self):
+        await self.save()
+        self.statements.clear()
+        bill_ids = await asyncio.gather(*(self.save(i) for i in range(100)))
+        self.assertEqual(len(set(bill_ids)), 100)
+        self.assertTrue(all(statement.startswith("INSERT INTO bills") for statement in self.statements))
+        # Рахунки групуються у пакети, а не пишуться по одному
+        self.assertLessEqual(len(self.statements), 10)
+
+    async def test_lone_bill_with_idempotency_key(self):
+        # Шлях хендлерів: ключ - flow_id сценарію
+        await self.save()
+        self.statements.clear()
+        await self.save(1, idempotency_key=uuid.uuid4().hex)
+        self.assertEqual(len(self.statements), 2)
+        self.assertTrue(self.statements[0].startswith("SELECT bills.idempotency_key"))
+        self.assertTrue(self.statements[1].startswith("INSERT INTO bills"))
+
+    async def test_concurrent_bills_with_idempotency_keys_share_queries(self):
+        await self.save()
+        self.statements.clear()
+        bill_ids = await asyncio.gather(*(self.save(i, idempotency_key=uuid.uuid4().hex) for i in range(100)))
+        self.assertEqual(len(set(bill_ids)), 100)
+        selects = [statement for statement in self.statements if statement.startswith("SELECT")]
+        inserts = [statement for statement in self.statements if statement.startswith("INSERT INTO bills")]
+        self.assertEqual(len(selects) + len(inserts), len(self.statements))
+        # Один SELECT ключів і один INSERT на пакет
+        self.assertEqual(len(selects), len(inserts))
+        self.assertLessEqual(len(inserts), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+# tests/test_cdc.py
+# utils.cdc.CdcLog: seq подій у журналі наскрізні й без повторів, навіть коли flush() викликається
+# одночасно (фонова задача, stop(), drains) або того, хто чекає, скасовано посеред запису.
+import asyncio
+import json
+import tempfile
+import time
+import unittest
+
+from utils.cdc import CdcLog, segment_paths
+
+
+class SlowCdcLog(CdcLog):
+    """
+    Журнал, запис пакета в якому триває delay секунд.
+    """
+
+    def __init__(self, directory: str, delay: float):
+        super().__init__(directory=directory)
+        self.delay = delay
+
+    def _write(self, batch: list[dict]) -> None:
+        time.sleep(self.delay)
+        super()._write(batch)
+
+
+class CdcFlushTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="komunalka-cdc-")
+
+    def logged_seqs(self) -> list[int]:
+        seqs = []
+        for path in segment_paths(self.directory):
+            with open(path, encoding="utf-8") as f:
+                seqs.extend(json.loads(line)["seq"] for line in f)
+        return seqs
+
+    async def test_concurrent_flushes_do_not_reuse_seq(self):
+        log = SlowCdcLog(self.directory, delay=0.05)
+        await log.open()
+        log.record_purges([1, 2, 3])
+        first = asyncio.create_task(log.flush())
+        await asyncio.sleep(0.01)
+        log.record_purges([4, 5])
+        await asyncio.gather(first, log.flush())
+        self.assertEqual(self.logged_seqs(), [1, 2, 3, 4, 5])
+        self.assertEqual(log.counters()["pending"], 0)
+
+    async def test_cancelled_flush_still_advances_seq(self):
+        log = SlowCdcLog(self.directory, delay=0.1)
+        await log.open()
+        log.record_purges([1, 2])
+        # Як _run_drains при вичерпаному часі зупинки
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(log.flush(), 0.01)
+        log.record_purges([3])
+        await log.flush()
+        self.assertEqual(self.logged_seqs(), [1, 2, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
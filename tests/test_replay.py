@@ -0,0 +1,191 @@
+# tests/test_replay.py
+# Прогін апдейтів через dispatcher (benchmarks/replay.py) на тимчасовій БД: повторна доставка
+# і подвійна відправка останнього кроку не створюють другий рахунок.
+# Запуск: python -m pytest -q tests  (або python -m unittest discover -s tests -t .)
+import asyncio
+import datetime
+import unittest
+
+from aiogram import Bot
+from aiogram.methods import AnswerCallbackQuery, EditMessageText, SendDocument, SendMessage
+from sqlalchemy import func, select
+
+import app
+from benchmarks.replay import FakeSession, message_update, callback_update
+from db import engine, read_engine, read_session
+from models import Bill
+from utils.archive import archive_old_bills
+from utils.helpers import get_or_create_user, load_addresses
+from utils.startup import StartupReport
+
+TOKEN = "42:TEST"
+_started = False
+_user_ids = iter(range(1000, 2000))
+
+
+class FlakySession(FakeSession):
+    """
+    FakeSession, у якій перша відправка тексту з префіксом fail_prefix падає.
+    """
+
+    def __init__(self, fail_prefix: str = None):
+        super().__init__()
+        self.fail_prefix = fail_prefix
+
+    async def make_request(self, bot, method, timeout=None):
+        if self.fail_prefix and isinstance(method, SendMessage) and method.text.startswith(self.fail_prefix):
+            self.fail_prefix = None
+            raise RuntimeError("Telegram недоступний")
+        return await super().make_request(bot, method, timeout)
+
+
+class ReplayTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        global _started
+        self.session = FlakySession()
+        if not _started:
+            await app.on_startup(StartupReport(), session=FakeSession(), tokens=[TOKEN])
+            _started = True
+        else:
+            app.bill_writer.start()
+        self.bot = Bot(TOKEN, session=self.session)
+
+    async def asyncTearDown(self):
+        await app.bill_writer.stop()
+        await app.cdc_log.stop()
+        await app.loop_monitor.stop()
+        # З'єднання прив'язані до event loop тесту
+        await engine.dispose()
+        await read_engine.dispose()
+
+    async def feed(self, *updates):
+        for update in updates:
+            await app.dp.feed_update(self.bot, update)
+
+    def sent(self) -> list[SendMessage]:
+        return [request for request in self.session.requests if isinstance(request, SendMessage)]
+
+    def last_edit(self) -> EditMessageText:
+        return [request for request in self.session.requests if isinstance(request, EditMessageText)][-1]
+
+    async def start_trash_flow(self, city: str = "Kyiv", street: str = "Main") -> int:
+        """
+        Новий користувач з адресою доходить до останнього кроку (кількість баків). Повертає user.id.
+        """
+        telegram_id = next(_user_ids)
+        await self.feed(*(message_update(telegram_id, text) for text in ("/start", city, street, "1", "-", "-", "7")))
+        user = await get_or_create_user(telegram_id, f"User{telegram_id}")
+        address = (await load_addresses(user.id))[0]
+        await self.feed(
+            message_update(telegram_id, "/start"),
+            callback_update(telegram_id, f"addr:{address.id}"),
+            callback_update(telegram_id, "service:trash"),
+            message_update(telegram_id, "2"),
+        )
+        self.telegram_id = telegram_id
+        self.address_id = address.id
+        return user.id
+
+    async def bill_count(self, user_id: int) -> int:
+        async with read_session() as session:
+            return (await session.execute(select(func.count()).select_from(Bill).where(Bill.user_id == user_id))).scalar()
+
+    async def test_redelivered_update_is_processed_once(self):
+        user_id = await self.start_trash_flow()
+        final = message_update(self.telegram_id, "3")
+        sent_before = len(self.sent())
+        await self.feed(final, final)
+        self.assertEqual(await self.bill_count(user_id), 1)
+        self.assertEqual(len(self.sent()) - sent_before, 1)
+
+    async def test_concurrent_final_step_saves_one_bill(self):
+        user_id = await self.start_trash_flow()
+        sent_before = len(self.sent())
+        await asyncio.gather(*(app.dp.feed_update(self.bot, message_update(self.telegram_id, "3")) for _ in range(2)))
+        self.assertEqual(await self.bill_count(user_id), 1)
+        # Відповідь з рахунком - лише від першої спроби
+        replies = self.sent()[sent_before:]
+        self.assertEqual(len(replies), 1)
+        self.assertTrue(replies[0].text.startswith("-" * 47))
+
+    async def test_resend_after_failed_reply_returns_saved_bill(self):
+        user_id = await self.start_trash_flow()
+        # Рахунок записано, але відповідь з ним не дійшла до користувача
+        self.session.fail_prefix = "-" * 47
+        await self.feed(message_update(self.telegram_id, "3"))
+        sent_before = len(self.sent())
+        await self.feed(message_update(self.telegram_id, "3"))
+        self.assertEqual(await self.bill_count(user_id), 1)
+        replies = self.sent()[sent_before:]
+        self.assertEqual(len(replies), 1)
+        self.assertTrue(replies[0].text.startswith("Рахунок уже збережено"))
+        # Розмову завершено: наступна відправка вже не потрапляє в крок введення баків
+        state = await app.dp.fsm.get_context(self.bot, self.telegram_id, self.telegram_id).get_state()
+        self.assertEqual(state, "Form:start")
+
+    async def test_bill_is_visible_only_to_owner(self):
+        user_id = await self.start_trash_flow()
+        await self.feed(message_update(self.telegram_id, "3"))
+        async with read_session() as session:
+            bill_id = (await session.execute(select(Bill.id).where(Bill.user_id == user_id))).scalar()
+
+        await self.start_trash_flow()
+        sent_before = len(self.sent())
+        await self.feed(callback_update(self.telegram_id, f"bill:{bill_id}"))
+        self.assertEqual([reply.text for reply in self.sent()[sent_before:]], ["Рахунок не знайдено."])
+        await self.feed(callback_update(self.telegram_id, f"receipt:{bill_id}:png"))
+        answers = [request for request in self.session.requests if isinstance(request, AnswerCallbackQuery)]
+        self.assertEqual(answers[-1].text, "Рахунок не знайдено.")
+        self.assertFalse(any(isinstance(request, SendDocument) for request in self.session.requests))
+
+    async def test_stale_callback_data_gets_start_prompt(self):
+        telegram_id = next(_user_ids)
+        # Формати кнопок старих версій бота і дані, що не розбираються схемою
+        for data in ("service_gas", "bill_detail_5", "start_1", "addr:abc"):
+            await self.feed(callback_update(telegram_id, data))
+            answer = self.session.requests[-1]
+            self.assertIsInstance(answer, AnswerCallbackQuery)
+            self.assertIn("/start", answer.text)
+
+    async def test_address_is_escaped_in_html_replies(self):
+        # Окреме місто: назва вулиці не має ставати підказкою в інших тестах
+        await self.start_trash_flow(city="Lviv", street="<Rynok & Co>")
+        await self.feed(message_update(self.telegram_id, "3"))
+        receipt = self.sent()[-1].text
+        self.assertIn("Адреса: Lviv, &lt;Rynok &amp; Co&gt;, 1", receipt)
+        self.assertNotIn("<Rynok", receipt)
+
+    async def test_archive_is_visible_only_to_address_owner(self):
+        await self.start_trash_flow()
+        owner, owner_address = self.telegram_id, self.address_id
+        await self.feed(message_update(owner, "3"))
+        await app.bill_writer.drain()
+        await archive_old_bills(cutoff=datetime.datetime.now() + datetime.timedelta(days=1))
+        year = datetime.datetime.now().year
+
+        await self.start_trash_flow()
+        stranger, stranger_address = self.telegram_id, self.address_id
+        await self.feed(callback_update(stranger, f"archive:{owner_address}:{year}"))
+        self.assertTrue(self.last_edit().text.startswith("Адресу не знайдено"))
+        await self.feed(callback_update(stranger, f"archive_years:{owner_address}"))
+        self.assertTrue(self.last_edit().text.startswith("Адресу не знайдено"))
+        # Чужу адресу не можна обрати і через кнопку адреси
+        await self.feed(message_update(stranger, "/start"), callback_update(stranger, f"addr:{owner_address}"))
+        data = await app.dp.fsm.get_context(self.bot, stranger, stranger).get_data()
+        self.assertNotEqual(data.get("address_id"), owner_address)
+        # Кнопка архіву - лише для адреси, що має архівні рахунки
+        await self.feed(callback_update(stranger, f"addr:{stranger_address}"),
+                        callback_update(stranger, f"bills:{stranger_address}"))
+        self.assertIsNone(self.last_edit().reply_markup)
+
+        await self.feed(message_update(owner, "/start"), callback_update(owner, f"addr:{owner_address}"),
+                        callback_update(owner, f"bills:{owner_address}"))
+        buttons = [button.callback_data for row in self.last_edit().reply_markup.inline_keyboard for button in row]
+        self.assertIn(f"archive_years:{owner_address}", buttons)
+        await self.feed(callback_update(owner, f"archive:{owner_address}:{year}"))
+        self.assertTrue(self.last_edit().text.startswith(f"Архівні рахунки за {year} рік"))
+
+
+if __name__ == "__main__":
+    unittest.main()
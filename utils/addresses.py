@@ -0,0 +1,143 @@
+# utils/addresses.py
+import re
+from sqlalchemy import select, text
+from db import read_session
+from models import City, Street, Building
+
+# Скільки підказок показувати кнопками під час введення адреси
+SUGGESTIONS_LIMIT = 5
+
+# Рівні адреси: FSM-ключ -> префікс області пошуку в address_fts
+CITY, STREET, HOUSE = "city", "street", "house"
+
+_SPACES = re.compile(r"\s+")
+_APOSTROPHES = str.maketrans({"’": "'", "ʼ": "'", "`": "'", "‘": "'"})
+_PREFIXES = {
+    CITY: ("місто ", "м. ", "м.", "м "),
+    STREET: ("вулиця ", "вул. ", "вул.", "вул "),
+    HOUSE: ("будинок ", "буд. ", "буд.", "буд "),
+}
+
+# FTS5-індекс назв: scope звужує пошук до міст ("c"), вулиць міста ("s<city_id>")
+# або будинків вулиці ("h<street_id>"), name шукається за префіксом.
+ADDRESS_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS address_fts USING fts5("
+    "name, scope, ref_id UNINDEXED, tokenize='unicode61 remove_diacritics 2', prefix='1 2 3')",
+    "CREATE TRIGGER IF NOT EXISTS cities_fts AFTER INSERT ON cities BEGIN "
+    "INSERT INTO address_fts (name, scope, ref_id) VALUES (new.name, 'c', new.id); END",
+    "CREATE TRIGGER IF NOT EXISTS streets_fts AFTER INSERT ON streets BEGIN "
+    "INSERT INTO address_fts (name, scope, ref_id) VALUES (new.name, 's' || new.city_id, new.id); END",
+    "CREATE TRIGGER IF NOT EXISTS buildings_fts AFTER INSERT ON buildings BEGIN "
+    "INSERT INTO address_fts (name, scope, ref_id) VALUES (new.house, 'h' || new.street_id, new.id); END",
+)
+
+
+def create_address_fts(sync_conn) -> None:
+    for statement in ADDRESS_FTS_DDL:
+        sync_conn.exec_driver_sql(statement)
+
+
+def clean_name(value: str) -> str:
+    """
+    Назва для відображення: без зайвих пробілів і з однаковим апострофом.
+    """
+    return _SPACES.sub(" ", value.translate(_APOSTROPHES)).strip()
+
+
+def normalize_name(level: str, value: str) -> str:
+    """
+    Ключ для пошуку дублів: "м. Київ", "київ" і "Київ " дають один ключ.
+    """
+    value = clean_name(value).casefold()
+    for prefix in _PREFIXES[level]:
+        if value.startswith(prefix):
+            value = value[len(prefix):].lstrip()
+            break
+    return value.rstrip(".")
+
+
+def _scope(level: str, parent_id: int | None) -> str:
+    return {CITY: "c", STREET: "s", HOUSE: "h"}[level] + ("" if level == CITY else str(parent_id))
+
+
+def _match_query(level: str, parent_id: int | None, typed: str) -> str | None:
+    words = re.findall(r"\w+", normalize_name(level, typed))
+    if not words:
+        return None
+    # Кожне слово - окремий префікс: "шевч тар" знаходить "Тараса Шевченка"
+    prefixes = " ".join(f'"{word}"*' for word in words)
+    return f'scope:"{_scope(level, parent_id)}" AND name:({prefixes})'
+
+
+async def suggest(level: str, typed: str, parent_id: int | None = None,
+                  limit: int = SUGGESTIONS_LIMIT) -> list[tuple[int, str]]:
+    """
+    Підказки (id, назва) для введеного тексту на рівні level у межах батьківського запису.
+    """
+    query = _match_query(level, parent_id, typed)
+    if query is None:
+        return []
+    stmt = text(
+        "SELECT ref_id, name FROM address_fts WHERE address_fts MATCH :query "
+        "ORDER BY rank, length(name) LIMIT :limit"
+    )
+    async with read_session() as session:
+        result = await session.execute(stmt, {"query": query, "limit": limit})
+        return [(int(ref_id), name) for ref_id, name in result.all()]
+
+
+def exact_match(level: str, typed: str, suggestions: list[tuple[int, str]]) -> int | None:
+    """
+    id підказки, що збігається з введеним текстом після нормалізації.
+    """
+    key = normalize_name(level, typed)
+    for ref_id, name in suggestions:
+        if normalize_name(level, name) == key:
+            return ref_id
+    return None
+
+
+async def _get_or_create(session, model, filters: dict, values: dict):
+    stmt = select(model).filter_by(**filters)
+    instance = (await session.execute(stmt)).scalars().first()
+    if instance is None:
+        instance = model(**filters, **values)
+        session.add(instance)
+        await session.flush()
+    return instance
+
+
+async def _get_checked(session, model, ref_id: int | None, **parent):
+    """
+    Запис за id з FSM, лише якщо він існує і належить вибраному батьківському запису.
+    id приходять з callback-даних підказок, тож можуть бути застарілими або підробленими.
+    """
+    if not ref_id:
+        return None
+    instance = await session.get(model, ref_id)
+    if instance is None or any(getattr(instance, key) != value for key, value in parent.items()):
+        return None
+    return instance
+
+
+async def resolve_building(session, data: dict) -> Building:
+    """
+    Канонічний будинок для даних FSM (city_id/city, street_id/street, building_id/house).
+    Виконується в сесії записувача; відсутні місто, вулиця і будинок створюються.
+    Невідомий або чужий для батьківського запису id замінюється введеним текстом.
+    """
+    city = await _get_checked(session, City, data.get("city_id"))
+    if city is None:
+        city = await _get_or_create(session, City, {"name_norm": normalize_name(CITY, data["city"])},
+                                    {"name": clean_name(data["city"])})
+    street = await _get_checked(session, Street, data.get("street_id"), city_id=city.id)
+    if street is None:
+        street = await _get_or_create(session, Street,
+                                      {"city_id": city.id, "name_norm": normalize_name(STREET, data["street"])},
+                                      {"name": clean_name(data["street"])})
+    building = await _get_checked(session, Building, data.get("building_id"), street_id=street.id)
+    if building is None:
+        building = await _get_or_create(session, Building,
+                                        {"street_id": street.id, "house_norm": normalize_name(HOUSE, data["house"])},
+                                        {"house": clean_name(data["house"])})
+    return building
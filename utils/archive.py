@@ -0,0 +1,203 @@
+# utils/archive.py
+import asyncio
+import datetime
+import gzip
+import json
+import logging
+import os
+import threading
+from sqlalchemy import select, delete
+from db import read_session, write_session
+from models import Bill, MONEY_COLUMNS, TARIFF_COLUMNS
+from utils.money import KOPECKS_PER_UAH, TARIFF_SCALE
+
+# Рахунки старші за ARCHIVE_AFTER_DAYS переносяться з таблиці bills у стиснуті сегменти
+# archive/bills-<рік>.jsonl.gz (один JSON-рядок на рахунок, сегмент - рік створення рахунку).
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_AFTER_DAYS = 2 * 365
+ARCHIVE_BATCH_SIZE = 1000
+# Формат рядка: 1 (без поля "_v") - гроші у гривнях float, 2 - копійки та 1/10000 грн цілими
+ARCHIVE_FORMAT = 2
+
+_BILL_COLUMNS = [column.name for column in Bill.__table__.columns]
+
+# Індекс archive/addresses.json: address_id -> роки сегментів з рахунками цієї адреси, щоб
+# не розпаковувати сегменти, лише щоб показати (чи ні) кнопку архіву
+_address_years: dict[int, set[int]] | None = None
+_index_lock = threading.Lock()
+
+# Слухачі видалення: listener(bill_ids) викликається після commit кожного пакета архівації
+# (журнал змін utils/cdc.py записує ці видалення для бази аналітики)
+bill_purged_listeners: list = []
+
+
+def segment_path(year: int) -> str:
+    return os.path.join(ARCHIVE_DIR, f"bills-{year}.jsonl.gz")
+
+
+def archived_years() -> list[int]:
+    if not os.path.isdir(ARCHIVE_DIR):
+        return []
+    years = []
+    for name in os.listdir(ARCHIVE_DIR):
+        if name.startswith("bills-") and name.endswith(".jsonl.gz"):
+            years.append(int(name[len("bills-"):-len(".jsonl.gz")]))
+    return sorted(years, reverse=True)
+
+
+def _index_path() -> str:
+    return os.path.join(ARCHIVE_DIR, "addresses.json")
+
+
+def _scan_segments() -> dict[int, set[int]]:
+    index: dict[int, set[int]] = {}
+    for year in archived_years():
+        with gzip.open(segment_path(year), "rt", encoding="utf-8") as f:
+            for line in f:
+                address_id = json.loads(line).get("address_id")
+                if address_id is not None:
+                    index.setdefault(address_id, set()).add(year)
+    return index
+
+
+def _write_index(index: dict[int, set[int]]) -> None:
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    tmp_path = f"{_index_path()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({str(address_id): sorted(years) for address_id, years in index.items()}, f)
+    os.replace(tmp_path, _index_path())
+
+
+def _load_index() -> dict[int, set[int]]:
+    # Викликається під _index_lock
+    global _address_years
+    if _address_years is None:
+        try:
+            with open(_index_path(), encoding="utf-8") as f:
+                _address_years = {int(address_id): set(years) for address_id, years in json.load(f).items()}
+        except (FileNotFoundError, ValueError):
+            # Архів, створений до появи індексу (або пошкоджений індекс): індекс будується з сегментів
+            _address_years = _scan_segments()
+            if _address_years:
+                _write_index(_address_years)
+    return _address_years
+
+
+def _address_archived_years(address_id: int) -> list[int]:
+    with _index_lock:
+        return sorted(_load_index().get(address_id, ()), reverse=True)
+
+
+async def address_archived_years(address_id: int) -> list[int]:
+    """
+    Роки, за які в архіві є рахунки адреси, новіші першими.
+    """
+    return await asyncio.to_thread(_address_archived_years, address_id)
+
+
+def _bill_to_row(bill: Bill) -> dict:
+    row = {name: getattr(bill, name) for name in _BILL_COLUMNS}
+    if row["created_at"] is not None:
+        row["created_at"] = row["created_at"].isoformat()
+    row = {key: value for key, value in row.items() if value is not None}
+    row["_v"] = ARCHIVE_FORMAT
+    return row
+
+
+def _row_to_bill(row: dict) -> Bill:
+    if row.get("_v", 1) < 2:
+        for key in MONEY_COLUMNS:
+            if key in row:
+                row[key] = round(row[key] * KOPECKS_PER_UAH)
+        for key in TARIFF_COLUMNS:
+            if key in row:
+                row[key] = round(row[key] * TARIFF_SCALE)
+    if row.get("created_at"):
+        row["created_at"] = datetime.datetime.fromisoformat(row["created_at"])
+    return Bill(**{key: value for key, value in row.items() if key in _BILL_COLUMNS})
+
+
+def _append_segments(rows_by_year: dict[int, list[dict]]) -> None:
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    # Індекс оновлюється до запису сегментів: після збою він може вказати на рік без рахунків
+    # адреси (порожній список), але не сховає вже архівовані рахунки
+    with _index_lock:
+        index = _load_index()
+        changed = False
+        for year, rows in rows_by_year.items():
+            for row in rows:
+                if row.get("address_id") is None:
+                    continue
+                years = index.setdefault(row["address_id"], set())
+                if year not in years:
+                    years.add(year)
+                    changed = True
+        if changed:
+            _write_index(index)
+    for year, rows in rows_by_year.items():
+        payload = "".join(json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n" for row in rows)
+        # Кожен виклик дописує окремий gzip-member; gzip читає їх як один потік
+        with open(segment_path(year), "ab") as f:
+            f.write(gzip.compress(payload.encode("utf-8")))
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _read_segment(year: int, address_id: int) -> list[dict]:
+    path = segment_path(year)
+    if not os.path.exists(path):
+        return []
+    rows = {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            if row.get("address_id") == address_id:
+                # Після збою між записом сегмента і видаленням рахунок може бути записаний двічі
+                rows[row["id"]] = row
+    return list(rows.values())
+
+
+async def archive_old_bills(cutoff: datetime.datetime = None) -> int:
+    """
+    Переносить прострочені рахунки в архів невеликими пакетами. Пакет читається через
+    read_session, дописується в сегмент (gzip і fsync - без жодної сесії) і лише потім
+    видаляється з bills короткою транзакцією записувача: з'єднання записувача одне, і збереження
+    рахунків не чекає на файловий ввід-вивід. Збій між кроками дає лише дубль у сегменті
+    (_read_segment його відкидає), але не втрату рахунку.
+    Повертає кількість перенесених рахунків.
+    """
+    if cutoff is None:
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=ARCHIVE_AFTER_DAYS)
+    moved = 0
+    while True:
+        async with read_session() as session:
+            stmt = select(Bill).where(Bill.created_at < cutoff).order_by(Bill.id).limit(ARCHIVE_BATCH_SIZE)
+            bills = (await session.execute(stmt)).scalars().all()
+        if not bills:
+            return moved
+        rows_by_year: dict[int, list[dict]] = {}
+        for bill in bills:
+            rows_by_year.setdefault(bill.created_at.year, []).append(_bill_to_row(bill))
+        await asyncio.to_thread(_append_segments, rows_by_year)
+        bill_ids = [bill.id for bill in bills]
+        async with write_session() as session:
+            await session.execute(delete(Bill).where(Bill.id.in_(bill_ids)))
+            await session.commit()
+        for listener in bill_purged_listeners:
+            try:
+                listener(bill_ids)
+            except Exception:
+                logging.exception("Помилка у слухачі видалення рахунків:")
+        moved += len(bills)
+        logging.info(f"Архівовано {moved} рахунків.")
+
+
+async def load_archived_bills(address_id: int, year: int) -> list[Bill]:
+    """
+    Читає лише сегмент потрібного року і повертає архівні рахунки адреси
+    (як не прив'язані до сесії об'єкти Bill), новіші першими.
+    """
+    rows = await asyncio.to_thread(_read_segment, year, address_id)
+    bills = [_row_to_bill(row) for row in rows]
+    bills.sort(key=lambda bill: bill.created_at or datetime.datetime.min, reverse=True)
+    return bills
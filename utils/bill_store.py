@@ -0,0 +1,172 @@
+# utils/bill_store.py
+import asyncio
+import datetime
+import logging
+from sqlalchemy import func
+from db import read_session
+from models import Bill
+from utils.helpers import get_address
+from utils.queries import BILL_BY_ID
+from utils.money import tariff, cost_kopecks
+from utils.write_queue import bill_writer
+
+ELECTRICITY = "Електроенергія"
+GAS = "Газ та Газопостачання"
+TRASH = "Вивіз сміття"
+
+# Тарифи у цілих 1/10000 грн за одиницю (див. utils/money.py)
+TARIFF_ONE_ZONE = tariff("4.32")
+TARIFF_TWO_ZONE_DAY = tariff("4.32")
+TARIFF_TWO_ZONE_NIGHT = tariff("2.16")
+TARIFF_THREE_ZONE_PEAK = tariff("6.48")
+TARIFF_THREE_ZONE_DAY = tariff("4.32")
+TARIFF_THREE_ZONE_NIGHT = tariff("1.728")
+TARIFF_GAS = tariff("7.96")
+TARIFF_GAS_SUPPLY = tariff("1.308")
+TARIFF_TRASH = tariff("160")
+
+# Показники лічильників зберігаються цілими, тож споживання і вартість рахуються з цілих
+# значень. Кожна складова рахунку округлюється до копійки, підсумок - сума складових.
+
+
+def one_zone_columns(current: float, previous: float) -> dict:
+    consumption = int(current) - int(previous)
+    return {
+        "current": int(current),
+        "previous": int(previous),
+        "consumption": consumption,
+        "tariff": TARIFF_ONE_ZONE,
+        "total_cost": cost_kopecks(consumption, TARIFF_ONE_ZONE),
+    }
+
+
+def two_zone_columns(current_day: float, current_night: float, previous_day: float, previous_night: float) -> dict:
+    consumption_day = int(current_day) - int(previous_day)
+    consumption_night = int(current_night) - int(previous_night)
+    cost_day = cost_kopecks(consumption_day, TARIFF_TWO_ZONE_DAY)
+    cost_night = cost_kopecks(consumption_night, TARIFF_TWO_ZONE_NIGHT)
+    return {
+        "current_day_2": int(current_day),
+        "current_night_2": int(current_night),
+        "previous_day_2": int(previous_day),
+        "previous_night_2": int(previous_night),
+        "consumption_day_2": consumption_day,
+        "consumption_night_2": consumption_night,
+        "total_consumption_2": consumption_day + consumption_night,
+        "tariff_day_2": TARIFF_TWO_ZONE_DAY,
+        "tariff_night_2": TARIFF_TWO_ZONE_NIGHT,
+        "cost_day_2": cost_day,
+        "cost_night_2": cost_night,
+        "total_cost_2": cost_day + cost_night,
+    }
+
+
+def three_zone_columns(current_peak: float, current_day: float, current_night: float,
+                       previous_peak: float, previous_day: float, previous_night: float) -> dict:
+    consumption_peak = int(current_peak) - int(previous_peak)
+    consumption_day = int(current_day) - int(previous_day)
+    consumption_night = int(current_night) - int(previous_night)
+    cost_peak = cost_kopecks(consumption_peak, TARIFF_THREE_ZONE_PEAK)
+    cost_day = cost_kopecks(consumption_day, TARIFF_THREE_ZONE_DAY)
+    cost_night = cost_kopecks(consumption_night, TARIFF_THREE_ZONE_NIGHT)
+    return {
+        "current_peak": int(current_peak),
+        "current_day_3": int(current_day),
+        "current_night_3": int(current_night),
+        "previous_peak": int(previous_peak),
+        "previous_day_3": int(previous_day),
+        "previous_night_3": int(previous_night),
+        "consumption_peak": consumption_peak,
+        "consumption_day_3": consumption_day,
+        "consumption_night_3": consumption_night,
+        "total_consumption_3": consumption_peak + consumption_day + consumption_night,
+        "tariff_peak": TARIFF_THREE_ZONE_PEAK,
+        "tariff_day_3": TARIFF_THREE_ZONE_DAY,
+        "tariff_night_3": TARIFF_THREE_ZONE_NIGHT,
+        "cost_peak": cost_peak,
+        "cost_day_3": cost_day,
+        "cost_night_3": cost_night,
+        "total_cost_3": cost_peak + cost_day + cost_night,
+    }
+
+
+def gas_columns(current: float, previous: float) -> dict:
+    gas_consumption = int(current) - int(previous)
+    cost_gas = cost_kopecks(gas_consumption, TARIFF_GAS)
+    cost_supply = cost_kopecks(gas_consumption, TARIFF_GAS_SUPPLY)
+    return {
+        "gas_current": int(current),
+        "gas_previous": int(previous),
+        "gas_consumption": gas_consumption,
+        "tariff_gas": TARIFF_GAS,
+        "tariff_gas_supply": TARIFF_GAS_SUPPLY,
+        "cost_gas": cost_gas,
+        "cost_gas_supply": cost_supply,
+        "total_cost_gas": cost_gas + cost_supply,
+    }
+
+
+def trash_columns(unloads: int, bins: int) -> dict:
+    return {
+        "unloads": unloads,
+        "bins": bins,
+        "trash_tariff": TARIFF_TRASH,
+        "total_cost_trash": cost_kopecks(unloads * bins, TARIFF_TRASH),
+    }
+
+
+def bill_total_cost(bill) -> int:
+    """
+    Загальна вартість рахунку у копійках.
+    """
+    if bill.service == ELECTRICITY:
+        return bill.total_cost or bill.total_cost_2 or bill.total_cost_3
+    if bill.service == GAS:
+        return bill.total_cost_gas
+    if bill.service == TRASH:
+        return bill.total_cost_trash
+    return 0
+
+
+# Та сама загальна вартість як SQL-вираз (цілі копійки) - для SUM/GROUP BY без округлень.
+# Колонки вартості різних послуг взаємовиключні, тож достатньо першої не-NULL.
+bill_total_cost_sql = func.coalesce(
+    Bill.total_cost, Bill.total_cost_2, Bill.total_cost_3, Bill.total_cost_gas, Bill.total_cost_trash, 0
+)
+
+
+# Слухачі збереженого рахунку: listener(bill, address) викликається після запису в БД.
+# Через них оновлюються кеші (utils/recent_bills.py) без циклічних імпортів.
+bill_saved_listeners: list = []
+
+
+async def save_bill(user_id: int, address_id: int, service: str, columns: dict,
+                    idempotency_key: str | None = None):
+    """
+    Записує рахунок одним INSERT ... RETURNING (через bill_writer) і паралельно бере адресу
+    з кешу. Повертає (bill_id, address); address - None, якщо адресу не знайдено.
+    Якщо рахунок з таким idempotency_key уже записано, кидає DuplicateBill.
+    """
+    values = {
+        "user_id": user_id,
+        "address_id": address_id,
+        "service": service,
+        "created_at": datetime.datetime.now(),
+        "idempotency_key": idempotency_key,
+        **columns,
+    }
+    bill_id, address = await asyncio.gather(bill_writer.submit(values), get_address(address_id))
+    if bill_saved_listeners:
+        bill = Bill(id=bill_id, **values)
+        for listener in bill_saved_listeners:
+            try:
+                listener(bill, address)
+            except Exception:
+                logging.exception("Помилка у слухачі збереження рахунку:")
+    return bill_id, address
+
+
+async def load_bill(bill_id: int) -> Bill | None:
+    async with read_session() as session:
+        result = await session.execute(BILL_BY_ID, {"bill_id": bill_id})
+        return result.scalars().first()
@@ -0,0 +1,55 @@
+# utils/callback_router.py
+from aiogram import Router
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import CallbackQuery
+
+
+class CallbackRouter:
+    """
+    Маршрутизація callback_query через таблицю префіксів.
+
+    Замість послідовної перевірки фільтрів кожного хендлера апдейт потрапляє до
+    потрібного хендлера за один пошук у словнику, а поля callback_data вже розпаковані
+    у типізований об'єкт CallbackData (аргумент callback_data хендлера).
+    """
+
+    def __init__(self, name: str = None):
+        self.router = Router(name=name)
+        self._routes: dict[str, tuple[type[CallbackData], CallableObject]] = {}
+        self.router.callback_query.register(self._dispatch, self._resolve)
+
+    def handler(self, schema: type[CallbackData]):
+        """
+        Декоратор: реєструє хендлер для callback_data зі схемою schema.
+        """
+        def decorator(func):
+            if schema.__prefix__ in self._routes:
+                raise ValueError(f"Префікс {schema.__prefix__!r} вже зареєстровано")
+            self._routes[schema.__prefix__] = (schema, CallableObject(callback=func))
+            return func
+        return decorator
+
+    def fallback(self, func):
+        """
+        Декоратор: хендлер для callback_data, яку не розібрала жодна схема (кнопки старих
+        версій бота, пошкоджені або підроблені дані). Перевіряється після таблиці префіксів.
+        """
+        self.router.callback_query.register(func)
+        return func
+
+    def _resolve(self, callback: CallbackQuery):
+        if not callback.data:
+            return False
+        route = self._routes.get(callback.data.partition(":")[0])
+        if route is None:
+            return False
+        schema, handler = route
+        try:
+            callback_data = schema.unpack(callback.data)
+        except (TypeError, ValueError):
+            return False
+        return {"callback_data": callback_data, "callback_handler": handler}
+
+    async def _dispatch(self, callback: CallbackQuery, callback_handler: CallableObject, **kwargs):
+        return await callback_handler.call(callback, **kwargs)
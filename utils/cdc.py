@@ -0,0 +1,332 @@
+# utils/cdc.py
+# Потік змін рахунків (change data capture) для офлайн-аналітики: кожна вставка і видалення
+# рахунку дописується в локальний журнал cdc/bills-<перший seq>.cdc, а replay() переносить
+# його в окрему базу аналітики, щоб аналітики не читали робочу komunalka.db.
+#
+# Формат: один компактний JSON-рядок на подію, поля рахунку - на верхньому рівні поруч з
+#   seq - наскрізний номер події, op - "i" (вставка) або "d" (видалення), reason - причина видалення.
+#
+# Журнал пишеться асинхронно, вже після commit рахунку: при аварійному завершенні процесу
+# втрачаються події за останні CDC_FLUSH_INTERVAL секунд (рахунки в робочій базі лишаються).
+# Звірки журналу з базою немає - для точної аналітики після збою базу аналітики треба перебудувати.
+# Запуск споживача: python -m utils.cdc analytics.db [--keep-purged]
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import sqlite3
+
+from models import Bill
+from utils import stats
+from utils.archive import bill_purged_listeners
+from utils.write_queue import bill_writer
+
+CDC_DIR = os.getenv("CDC_DIR", "cdc")
+# Новий сегмент починається, коли поточний перевищив цей розмір (межа - завжди між пакетами)
+CDC_SEGMENT_BYTES = int(os.getenv("CDC_SEGMENT_BYTES", str(16 * 1024 * 1024)))
+# Як довго події накопичуються в пам'яті перед записом одним пакетом
+CDC_FLUSH_INTERVAL = 0.5
+CDC_MAX_BATCH = 5000
+
+INSERT, DELETE = "i", "d"
+RETENTION = "retention"
+
+_SEGMENT_PREFIX, _SEGMENT_SUFFIX = "bills-", ".cdc"
+_TAIL_BLOCK = 64 * 1024
+_BILL_COLUMNS = [column.name for column in Bill.__table__.columns]
+
+
+def segment_paths(directory: str = CDC_DIR) -> list[str]:
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(
+        name for name in os.listdir(directory)
+        if name.startswith(_SEGMENT_PREFIX) and name.endswith(_SEGMENT_SUFFIX)
+    )
+    return [os.path.join(directory, name) for name in names]
+
+
+def _encode(event: dict) -> str:
+    if isinstance(event.get("created_at"), datetime.datetime):
+        event["created_at"] = event["created_at"].isoformat(sep=" ")
+    return json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def _recover_tail(path: str) -> int | None:
+    """
+    Обрізає недописаний останній рядок (збій посеред запису) і повертає seq останньої події
+    (None, якщо в сегменті не лишилось подій). Читається лише кінець файлу.
+    """
+    with open(path, "rb+") as f:
+        size = pos = f.seek(0, os.SEEK_END)
+        tail = b""
+        # Блоками з кінця, доки в tail не потрапить останній повний рядок цілком
+        while pos > 0:
+            step = min(_TAIL_BLOCK, pos)
+            pos -= step
+            f.seek(pos)
+            tail = f.read(step) + tail
+            end = tail.rfind(b"\n")
+            if end != -1 and tail.rfind(b"\n", 0, end) != -1:
+                break
+        end = tail.rfind(b"\n") + 1
+        if pos + end != size:
+            logging.warning(f"CDC: обрізано недописаний рядок у {path}.")
+            f.truncate(pos + end)
+        if end == 0:
+            return None
+        last = tail[tail.rfind(b"\n", 0, end - 1) + 1:end]
+        return json.loads(last)["seq"]
+
+
+class CdcLog:
+    """
+    Журнал змін рахунків, що лише дописується і ділиться на сегменти.
+
+    record_*() лише ставлять подію в буфер пам'яті (шлях збереження рахунку не чекає на диск).
+    Фонова задача раз на flush_interval секунд (або при max_batch подіях) нумерує пакет,
+    серіалізує його і дописує в поточний сегмент в окремому потоці з одним fsync на пакет.
+    Журнал відкривається (пошук останнього сегмента, відновлення seq) один раз через open(),
+    теж в окремому потоці. Пакети пишуться по одному під _lock - flush() викликають і фонова
+    задача, і stop(), і drains при зупинці BotHost.
+    """
+
+    def __init__(self, directory: str = CDC_DIR, segment_bytes: int = CDC_SEGMENT_BYTES,
+                 flush_interval: float = CDC_FLUSH_INTERVAL, max_batch: int = CDC_MAX_BATCH):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._buffer: list[dict] = []
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._closing = False
+        self._lock = asyncio.Lock()
+        self._seq: int | None = None
+        self._segment: str | None = None
+        self.written = 0
+        self.batches = 0
+        self.segments = 0
+
+    def _open(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        paths = segment_paths(self.directory)
+        self._segment = paths[-1] if paths else None
+        seq = _recover_tail(self._segment) if self._segment else 0
+        # Порожній після обрізання сегмент: нумерація продовжується з його назви
+        self._seq = _segment_start(self._segment) - 1 if seq is None else seq
+        self.segments = len(paths)
+
+    async def open(self) -> None:
+        """
+        Відкриває журнал (викликається при старті застосунку). Помилка тут - пошкоджений
+        сегмент або недоступний каталог - зупиняє старт, а не губить події мовчки.
+        """
+        if self._seq is None:
+            try:
+                await asyncio.to_thread(self._open)
+            except Exception as e:
+                logging.error(f"CDC: не вдалося відкрити журнал у {self.directory}: {e}")
+                raise
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name="cdc-writer")
+
+    def _emit(self, op: str, fields: dict) -> None:
+        self.start()
+        # seq присвоюється при записі пакета: тут немає звернень до диска
+        self._buffer.append({"op": op, **fields})
+        if len(self._buffer) >= self.max_batch:
+            self._wakeup.set()
+
+    def record_inserts(self, rows: list[dict]) -> None:
+        """
+        Слухач bill_writer: rows - значення колонок записаних рахунків разом з id.
+        """
+        for row in rows:
+            self._emit(INSERT, {key: value for key, value in row.items() if value is not None})
+
+    def record_purges(self, bill_ids: list[int]) -> None:
+        """
+        Слухач архівації: рахунки видалено з bills за політикою зберігання.
+        """
+        for bill_id in bill_ids:
+            self._emit(DELETE, {"id": bill_id, "reason": RETENTION})
+
+    def _write(self, batch: list[dict]) -> None:
+        payload = "".join(_encode(event) for event in batch).encode("utf-8")
+        if self._segment is None or os.path.getsize(self._segment) >= self.segment_bytes:
+            self._segment = os.path.join(
+                self.directory, f"{_SEGMENT_PREFIX}{batch[0]['seq']:012d}{_SEGMENT_SUFFIX}"
+            )
+            self.segments += 1
+        with open(self._segment, "ab") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def flush(self) -> None:
+        # Пакет пишеться в окремій задачі: скасування того, хто чекає (wait_for у drains),
+        # не розриває запис сегмента і просування _seq - задача завершиться і відпустить _lock
+        if not self._buffer and not self._lock.locked():
+            return
+        await asyncio.shield(self._flush_batch())
+
+    async def _flush_batch(self) -> None:
+        async with self._lock:
+            if self._buffer:
+                await self._write_buffer()
+
+    async def _write_buffer(self) -> None:
+        # Якщо журнал не вдалося відкрити, події лишаються в буфері (pending у лічильниках),
+        # а помилка повторюється в лозі при кожній спробі
+        await self.open()
+        events, self._buffer = self._buffer, []
+        first = self._seq + 1
+        batch = [{"seq": first + i, **event} for i, event in enumerate(events)]
+        try:
+            await asyncio.to_thread(self._write, batch)
+        except Exception:
+            # Події повертаються в буфер і будуть записані (з тими ж seq) наступним пакетом
+            self._buffer[:0] = events
+            raise
+        self._seq = first + len(batch) - 1
+        self.written += len(batch)
+        self.batches += 1
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logging.exception("Помилка запису журналу CDC:")
+            if self._closing:
+                return
+
+    async def stop(self) -> None:
+        # Задача завершується сама після останнього пакета: cancel() під час wait_for
+        # може бути поглинутий, якщо подія настала одночасно зі скасуванням
+        if self._task is not None:
+            self._closing = True
+            self._wakeup.set()
+            try:
+                await self._task
+            finally:
+                self._task = None
+                self._closing = False
+        await self.flush()
+        # Як і черга bill_writer, замок прив'язується до event loop - наступний старт створює новий
+        self._lock = asyncio.Lock()
+
+    def counters(self) -> dict:
+        return {"written": self.written, "pending": len(self._buffer), "batches": self.batches,
+                "segments": self.segments}
+
+
+cdc_log = CdcLog()
+bill_writer.commit_listeners.append(cdc_log.record_inserts)
+bill_purged_listeners.append(cdc_log.record_purges)
+stats.register("cdc", cdc_log.counters)
+
+
+# --- Споживач: відтворення журналу в базі аналітики ---
+
+def _prepare_target(conn: sqlite3.Connection) -> int:
+    columns = ", ".join(
+        f"{column.name} INTEGER PRIMARY KEY" if column.primary_key else f"{column.name} {column.type.compile()}"
+        for column in Bill.__table__.columns
+    )
+    conn.execute(f"CREATE TABLE IF NOT EXISTS bills ({columns})")
+    # Номер останньої застосованої події: повторний запуск продовжує з місця зупинки
+    conn.execute("CREATE TABLE IF NOT EXISTS cdc_offset (id INTEGER PRIMARY KEY CHECK (id = 1), seq INTEGER NOT NULL)")
+    row = conn.execute("SELECT seq FROM cdc_offset WHERE id = 1").fetchone()
+    return row[0] if row else 0
+
+
+def _segment_start(path: str) -> int:
+    return int(os.path.basename(path)[len(_SEGMENT_PREFIX):-len(_SEGMENT_SUFFIX)])
+
+
+def _read_events(directory: str, after: int):
+    paths = segment_paths(directory)
+    for i, path in enumerate(paths):
+        # Сегмент, наступний за яким починається не пізніше after + 1, уже повністю застосовано
+        if i + 1 < len(paths) and _segment_start(paths[i + 1]) <= after + 1:
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    # Рядок ще дописується записувачем - його буде прочитано наступного разу
+                    return
+                event = json.loads(line)
+                if event["seq"] > after:
+                    yield event
+
+
+def replay(target: str, directory: str = CDC_DIR, keep_purged: bool = False, batch_size: int = 10_000) -> int:
+    """
+    Застосовує до бази target події журналу, новіші за збережений offset. Кожен пакет подій
+    і новий offset фіксуються однією транзакцією, тож перерваний прогін можна просто повторити.
+    keep_purged - не видаляти рахунки, прибрані з робочої бази за політикою зберігання
+    (якщо SQLite повторно видасть id видаленого рахунку, новий рахунок його замінить).
+    Повертає кількість застосованих подій.
+    """
+    conn = sqlite3.connect(target)
+    try:
+        offset = _prepare_target(conn)
+        placeholders = ", ".join("?" for _ in _BILL_COLUMNS)
+        statements = {
+            INSERT: f"INSERT OR REPLACE INTO bills ({', '.join(_BILL_COLUMNS)}) VALUES ({placeholders})",
+            DELETE: "DELETE FROM bills WHERE id = ?",
+        }
+        # Події однієї операції, що йдуть підряд, виконуються одним executemany; при зміні
+        # операції накопичене виконується, щоб зберегти порядок (SQLite може повторно видати id)
+        pending_op, pending = None, []
+
+        def execute_pending() -> None:
+            if pending:
+                conn.executemany(statements[pending_op], pending)
+                pending.clear()
+
+        applied = 0
+        seq = offset
+        for event in _read_events(directory, offset):
+            seq = event["seq"]
+            op = event["op"]
+            applied += 1
+            if op == DELETE and keep_purged and event.get("reason") == RETENTION:
+                continue
+            if op != pending_op:
+                execute_pending()
+                pending_op = op
+            pending.append([event.get(name) for name in _BILL_COLUMNS] if op == INSERT else (event["id"],))
+            if applied % batch_size == 0:
+                execute_pending()
+                conn.execute("INSERT OR REPLACE INTO cdc_offset (id, seq) VALUES (1, ?)", (seq,))
+                conn.commit()
+        execute_pending()
+        conn.execute("INSERT OR REPLACE INTO cdc_offset (id, seq) VALUES (1, ?)", (seq,))
+        conn.commit()
+        return applied
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Відтворення журналу змін рахунків у базі аналітики")
+    parser.add_argument("target", help="файл SQLite бази аналітики")
+    parser.add_argument("--dir", default=CDC_DIR, help="каталог сегментів журналу")
+    parser.add_argument("--keep-purged", action="store_true",
+                        help="не видаляти рахунки, перенесені з робочої бази в архів")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(f"Застосовано подій: {replay(args.target, args.dir, args.keep_purged)}")
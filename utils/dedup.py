@@ -0,0 +1,59 @@
+# utils/dedup.py
+import time
+import logging
+from collections import OrderedDict
+
+from utils import stats
+
+# Скільки update_id пам'ятати і як довго (Telegram повторює доставку протягом кількох хвилин)
+DEDUP_MAX_SIZE = 10000
+DEDUP_TTL = 600.0
+
+
+class UpdateDeduplicator:
+    """
+    Outer middleware для dp.update: пропускає апдейти, чий update_id уже оброблено.
+    Кеш обмежений за розміром (LRU) і за часом (TTL).
+    """
+
+    def __init__(self, max_size: int = DEDUP_MAX_SIZE, ttl: float = DEDUP_TTL, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        # (bot_id, update_id) -> час отримання
+        self._seen: OrderedDict[tuple, float] = OrderedDict()
+        self.skipped = 0
+
+    def seen(self, update_id) -> bool:
+        """
+        Повертає True, якщо update_id уже був у вікні; інакше запам'ятовує його.
+        """
+        now = self.clock()
+        # Найстаріші записи на початку - викидаємо прострочені
+        while self._seen:
+            oldest_id, seen_at = next(iter(self._seen.items()))
+            if now - seen_at < self.ttl:
+                break
+            del self._seen[oldest_id]
+        if update_id in self._seen:
+            return True
+        self._seen[update_id] = now
+        if len(self._seen) > self.max_size:
+            self._seen.popitem(last=False)
+        return False
+
+    async def __call__(self, handler, event, data):
+        # update_id унікальний лише в межах одного бота
+        bot = data.get("bot")
+        if self.seen((bot.id, event.update_id) if bot else event.update_id):
+            self.skipped += 1
+            logging.info(f"Повторний апдейт {event.update_id} пропущено.")
+            return None
+        return await handler(event, data)
+
+    def counters(self) -> dict:
+        return {"skipped": self.skipped, "tracked": len(self._seen)}
+
+
+update_dedup = UpdateDeduplicator()
+stats.register("dedup", update_dedup.counters)
@@ -0,0 +1,115 @@
+# utils/fsm_storage.py
+import os
+import sys
+import time
+from collections import OrderedDict
+from copy import copy
+from typing import Any
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+
+# Скільки секунд бездіяльності зберігати незавершену розмову (стан і дані FSM)
+FSM_TTL = float(os.getenv("FSM_TTL", str(6 * 3600)))
+
+
+def _approx_size(state: str | None, data: dict) -> int:
+    """
+    Наближений розмір запису: словник даних, ключі та значення першого рівня.
+    """
+    size = sys.getsizeof(data) + (sys.getsizeof(state) if state is not None else 0)
+    for name, value in data.items():
+        size += sys.getsizeof(name) + sys.getsizeof(value)
+    return size
+
+
+class TTLMemoryStorage(BaseStorage):
+    """
+    Сховище FSM у пам'яті, що видаляє розмови, неактивні довше за ttl.
+
+    Записи лежать в OrderedDict у порядку останнього звернення, тож прострочені завжди на
+    початку і видаляються під час наступних звернень без окремої фонової задачі.
+    Порожній запис (стан None і порожні дані, як після state.clear()) не зберігається.
+    """
+
+    def __init__(self, ttl: float = FSM_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        # key -> [state, data, last_access, approx_bytes]
+        self._records: "OrderedDict[StorageKey, list]" = OrderedDict()
+        self.approx_bytes = 0
+        self.evicted = 0
+
+    def _evict_expired(self, now: float) -> None:
+        deadline = now - self.ttl
+        records = self._records
+        while records:
+            key = next(iter(records))
+            record = records[key]
+            if record[2] > deadline:
+                break
+            del records[key]
+            self.approx_bytes -= record[3]
+            self.evicted += 1
+
+    def _get(self, key: StorageKey) -> list | None:
+        now = self.clock()
+        self._evict_expired(now)
+        record = self._records.get(key)
+        if record is not None:
+            record[2] = now
+            self._records.move_to_end(key)
+        return record
+
+    def _put(self, key: StorageKey, record: list | None, state: str | None, data: dict) -> None:
+        # record - результат _get(key) у тому самому виклику
+        if record is not None:
+            self.approx_bytes -= record[3]
+        if state is None and not data:
+            if record is not None:
+                del self._records[key]
+            return
+        size = _approx_size(state, data)
+        self.approx_bytes += size
+        if record is None:
+            self._records[key] = [state, data, self.clock(), size]
+        else:
+            record[0], record[1], record[3] = state, data, size
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = self._get(key)
+        state = state.state if isinstance(state, State) else state
+        if record is not None and state is not None:
+            # Дані не змінились - перераховується лише розмір рядка стану
+            delta = sys.getsizeof(state) - (sys.getsizeof(record[0]) if record[0] is not None else 0)
+            record[0] = state
+            record[3] += delta
+            self.approx_bytes += delta
+            return
+        self._put(key, record, state, record[1] if record else {})
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        record = self._get(key)
+        return record[0] if record else None
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        record = self._get(key)
+        self._put(key, record, record[0] if record else None, data.copy())
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        record = self._get(key)
+        return record[1].copy() if record else {}
+
+    async def get_value(self, storage_key: StorageKey, dict_key: str, default: Any | None = None) -> Any | None:
+        record = self._get(storage_key)
+        return copy(record[1].get(dict_key, default)) if record else default
+
+    async def close(self) -> None:
+        pass
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def counters(self) -> dict:
+        self._evict_expired(self.clock())
+        return {"conversations": len(self._records), "approx_bytes": self.approx_bytes, "evicted": self.evicted}
@@ -1,13 +1,29 @@
 # utils/helpers.py
+import html
 import logging
-from sqlalchemy import select
+from collections import OrderedDict
 from models import User, Address
-from db import async_session
+from db import read_session, write_session
+from utils.queries import USER_BY_TELEGRAM_ID, USER_ID_BY_TELEGRAM_ID, ADDRESSES_BY_USER, ADDRESS_BY_ID
+from keyboards.callbacks import AddressCallback, AddAddressCallback, SummaryCallback
+
+# Кеш тексту та клавіатури адрес: user_id -> (text, kb) або None, якщо адрес немає.
+ADDRESS_KEYBOARD_CACHE_SIZE = 10_000
+_address_keyboard_cache: "OrderedDict[int, tuple[str, any] | None]" = OrderedDict()
+# Кеш адрес за id (адреси не змінюються після створення)
+ADDRESS_CACHE_SIZE = 10_000
+_address_cache: "OrderedDict[int, Address]" = OrderedDict()
 
 async def get_or_create_user(telegram_id: int, user_name: str) -> User:
-    async with async_session() as session:
-        stmt = select(User).where(User.telegram_id == telegram_id)
-        result = await session.execute(stmt)
+    params = {"telegram_id": telegram_id}
+    async with read_session() as session:
+        result = await session.execute(USER_BY_TELEGRAM_ID, params)
+        user = result.scalars().first()
+    if user:
+        return user
+    async with write_session() as session:
+        # Повторна перевірка під з'єднанням записувача: користувача міг щойно створити інший апдейт
+        result = await session.execute(USER_BY_TELEGRAM_ID, params)
         user = result.scalars().first()
         if not user:
             user = User(telegram_id=telegram_id, user_name=user_name)
@@ -16,12 +32,48 @@ async def get_or_create_user(telegram_id: int, user_name: str) -> User:
         return user
 
 async def load_addresses(user_id: int):
-    async with async_session() as session:
-        stmt = select(Address).where(Address.user_id == user_id)
-        result = await session.execute(stmt)
+    async with read_session() as session:
+        result = await session.execute(ADDRESSES_BY_USER, {"user_id": user_id})
         addresses = result.scalars().all()
     return addresses
 
+async def get_address(address_id: int) -> Address | None:
+    """
+    Повертає адресу за id з кешу, звертаючись до БД лише при першому запиті.
+    """
+    address = _address_cache.get(address_id)
+    if address is not None:
+        _address_cache.move_to_end(address_id)
+        return address
+    async with read_session() as session:
+        result = await session.execute(ADDRESS_BY_ID, {"address_id": address_id})
+        address = result.scalars().first()
+    if address is not None:
+        _address_cache[address_id] = address
+        if len(_address_cache) > ADDRESS_CACHE_SIZE:
+            _address_cache.popitem(last=False)
+    return address
+
+async def get_user_id(telegram_id: int) -> int | None:
+    async with read_session() as session:
+        return (await session.execute(USER_ID_BY_TELEGRAM_ID, {"telegram_id": telegram_id})).scalar()
+
+async def get_user_address(telegram_id: int, address_id: int) -> Address | None:
+    """
+    Адреса, лише якщо вона належить користувачу Telegram telegram_id. Дані callback формує
+    клієнт, тож id адреси з них не можна використовувати без цієї перевірки.
+    """
+    address = await get_address(address_id)
+    if address is None or address.user_id != await get_user_id(telegram_id):
+        return None
+    return address
+
+def format_address(address) -> str:
+    text = f"{address.city}, {address.street}, {address.house}"
+    if address.apartment:
+        text += f", кв. {address.apartment}"
+    return text
+
 def build_address_inline_keyboard(addresses) -> tuple[str, any]:
     """
     Формує текст повідомлення та inline клавіатуру для вибору адрес.
@@ -30,10 +82,52 @@ def build_address_inline_keyboard(addresses) -> tuple[str, any]:
     text = "Ваші збережені адреси:\n"
     kb = InlineKeyboardMarkup(inline_keyboard=[])
     for addr in addresses:
-        addr_text = f"{addr.city}, {addr.street}, {addr.house}"
-        if addr.apartment:
-            addr_text += f", кв. {addr.apartment}"
-        text += addr_text + "\n"
-        kb.inline_keyboard.append([InlineKeyboardButton(text=addr_text, callback_data=f"select_address_{addr.id}")])
-    kb.inline_keyboard.append([InlineKeyboardButton(text="Додати нову адресу", callback_data="add_new_address")])
+        addr_text = format_address(addr)
+        # Текст повідомлення йде з parse_mode HTML, підпис кнопки - як є
+        text += html.escape(addr_text) + "\n"
+        kb.inline_keyboard.append([InlineKeyboardButton(text=addr_text, callback_data=AddressCallback(address_id=addr.id).pack())])
+    if len(addresses) > 1:
+        kb.inline_keyboard.append([InlineKeyboardButton(text="Зведення по всіх адресах", callback_data=SummaryCallback().pack())])
+    kb.inline_keyboard.append([InlineKeyboardButton(text="Додати нову адресу", callback_data=AddAddressCallback().pack())])
     return text, kb
+
+async def get_address_keyboard(user_id: int) -> tuple[str, any] | None:
+    """
+    Повертає кешовані текст та клавіатуру адрес користувача або None, якщо адрес немає.
+    Після зміни адрес потрібно викликати invalidate_address_keyboard.
+    """
+    if user_id in _address_keyboard_cache:
+        _address_keyboard_cache.move_to_end(user_id)
+        return _address_keyboard_cache[user_id]
+    addresses = await load_addresses(user_id)
+    result = build_address_inline_keyboard(addresses) if addresses else None
+    _address_keyboard_cache[user_id] = result
+    if len(_address_keyboard_cache) > ADDRESS_KEYBOARD_CACHE_SIZE:
+        _address_keyboard_cache.popitem(last=False)
+    return result
+
+def invalidate_address_keyboard(user_id: int) -> None:
+    _address_keyboard_cache.pop(user_id, None)
+
+# Ключ FSM: flow_id сценарію, останній крок якого (запис рахунку і відповідь) зараз виконується
+FINAL_STEP_KEY = "final_step_flow_id"
+
+async def claim_final_step(state) -> bool:
+    """
+    Позначає останній крок сценарію як такий, що виконується. False - його вже виконує інший
+    апдейт з тим самим flow_id (подвійна відправка): такий апдейт не зберігає і не відповідає.
+    Між читанням і записом даних FSM немає перемикання задач, тож перевірка атомарна.
+    """
+    data = await state.get_data()
+    flow_id = data.get("flow_id")
+    if flow_id is not None and data.get(FINAL_STEP_KEY) == flow_id:
+        return False
+    await state.update_data({FINAL_STEP_KEY: flow_id})
+    return True
+
+async def release_final_step(state) -> None:
+    """
+    Знімає позначку, якщо рахунок не записано або відповідь не дійшла: повтор кроку
+    отримає DuplicateBill і надішле збережений рахунок.
+    """
+    await state.update_data({FINAL_STEP_KEY: None})
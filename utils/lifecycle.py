@@ -0,0 +1,311 @@
+# utils/lifecycle.py
+import asyncio
+import json
+import logging
+import os
+import signal
+import time
+from contextlib import suppress
+from functools import partial
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import GetUpdates
+from aiogram.types import Update
+from aiogram.utils.backoff import Backoff, BackoffConfig
+
+# Файл з останнім отриманим update_id і апдейтами, що ще обробляються (для кількох ботів -
+# окремий файл на бот)
+UPDATE_CHECKPOINT = os.getenv("UPDATE_CHECKPOINT", "update_offset.json")
+# Скільки секунд при зупинці чекати на апдейти в обробці та черги запису
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", "20"))
+POLLING_TIMEOUT = 10
+# Як часто (не частіше) оновлювати контрольну точку після завершення обробки апдейтів
+CHECKPOINT_INTERVAL = 0.1
+
+_BACKOFF = BackoffConfig(min_delay=1.0, max_delay=5.0, factor=1.3, jitter=0.1)
+_STOP_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+
+def checkpoint_path(bot_id: int) -> str:
+    root, ext = os.path.splitext(UPDATE_CHECKPOINT)
+    return f"{root}-{bot_id}{ext}"
+
+
+def _handle_stop_signals(callback) -> None:
+    loop = asyncio.get_running_loop()
+    for sig in _STOP_SIGNALS:
+        with suppress(NotImplementedError, RuntimeError):
+            loop.add_signal_handler(sig, callback)
+
+
+def _release_stop_signals() -> None:
+    loop = asyncio.get_running_loop()
+    for sig in _STOP_SIGNALS:
+        with suppress(NotImplementedError, RuntimeError):
+            loop.remove_signal_handler(sig)
+
+
+async def _run_drains(drains, deadline: float) -> None:
+    loop = asyncio.get_running_loop()
+    for drain in drains:
+        try:
+            await asyncio.wait_for(drain(), max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            logging.warning(f"Зупинка: {getattr(drain, '__qualname__', drain)} не завершився вчасно.")
+
+
+class UpdateCheckpoint:
+    """
+    Контрольна точка polling: last_update_id - останній отриманий (і підтверджений Telegram)
+    апдейт, pending - сирі дані апдейтів, що ще не оброблені; після рестарту їх обробляють
+    знову, бо Telegram їх уже не доставить. Записується атомарно (тимчасовий файл + os.replace),
+    тож після збою у файлі завжди цілий попередній стан.
+    """
+
+    def __init__(self, path: str = UPDATE_CHECKPOINT):
+        self.path = path
+        self.last_update_id = 0
+        self.pending_ids: frozenset[int] = frozenset()
+
+    def load(self) -> tuple[int, list[dict]]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                state = json.load(f)
+            self.last_update_id = int(state["last_update_id"])
+            pending = list(state.get("pending", ()))
+            self.pending_ids = frozenset(payload["update_id"] for payload in pending)
+        except FileNotFoundError:
+            self.last_update_id, self.pending_ids, pending = 0, frozenset(), []
+        except (ValueError, KeyError, TypeError) as e:
+            logging.error(f"Пошкоджений файл {self.path} ({e}), offset не відновлено.")
+            self.last_update_id, self.pending_ids, pending = 0, frozenset(), []
+        return self.last_update_id, pending
+
+    def save(self, last_update_id: int, pending: dict[int, dict] = None) -> None:
+        pending = pending or {}
+        if last_update_id == self.last_update_id and pending.keys() == self.pending_ids:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"last_update_id": last_update_id,
+                       "pending": [pending[update_id] for update_id in sorted(pending)]}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self.last_update_id, self.pending_ids = last_update_id, frozenset(pending)
+
+
+class BotLifecycle:
+    """
+    Polling, що не губить апдейти при рестарті, і плавна зупинка.
+
+    Як і в aiogram, offset у getUpdates підтверджує все отримане, тож повільний хендлер не
+    затримує прийом інших апдейтів. Але перед кожним getUpdates у контрольну точку пишуться
+    сирі дані апдейтів, що ще обробляються: після рестарту (або збою) вони обробляються знову
+    з файлу, а не втрачаються разом із підтвердженням.
+
+    Зупинка (SIGTERM/SIGINT або request_stop): прийом нових апдейтів припиняється, далі до
+    drain_timeout секунд чекаємо на апдейти в обробці та на drains (черги запису).
+    """
+
+    def __init__(self, dp: Dispatcher, checkpoint: UpdateCheckpoint = None, drains=(),
+                 drain_timeout: float = DRAIN_TIMEOUT, polling_timeout: int = POLLING_TIMEOUT,
+                 handle_signals: bool = True):
+        self.dp = dp
+        self.checkpoint = checkpoint or UpdateCheckpoint()
+        self.drains = list(drains)
+        self.handle_signals = handle_signals
+        self.drain_timeout = drain_timeout
+        self.polling_timeout = polling_timeout
+        self._stop = asyncio.Event()
+        # update_id -> задача обробки; скасовані при зупинці лишаються тут і потрапляють у файл
+        self._in_flight: dict[int, asyncio.Task] = {}
+        # update_id -> сирі дані апдейту в обробці (серіалізуються один раз, при першому записі)
+        self._payloads: dict[int, dict] = {}
+        self._updates: dict[int, Update] = {}
+        self._received = 0
+        self._saved_at = 0.0
+        self.processed = 0
+        self.redelivered = 0
+        self.restored = 0
+        self.abandoned = 0
+        self.serving_at: float | None = None
+
+    def request_stop(self) -> None:
+        self._stop.set()
+
+    async def run(self, bot: Bot) -> None:
+        """
+        Обробляє апдейти до запиту на зупинку, потім чекає на незавершену роботу.
+        """
+        self._in_flight.clear()
+        self._payloads.clear()
+        self._updates.clear()
+        self._received, pending = self.checkpoint.load()
+        if self.handle_signals:
+            _handle_stop_signals(self.request_stop)
+        self._restore(bot, pending)
+        poll = asyncio.create_task(self._poll(bot), name="polling")
+        stop = asyncio.create_task(self._stop.wait())
+        try:
+            await asyncio.wait({poll, stop}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            # Припинення прийому: незавершений getUpdates просто скасовується - offset його
+            # апдейтів ще не надіслано, тож вони прийдуть знову
+            for task in (poll, stop):
+                task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await task
+            if self.handle_signals:
+                _release_stop_signals()
+            await self.drain()
+            self._stop.clear()
+
+    def _restore(self, bot: Bot, pending: list[dict]) -> None:
+        for payload in pending:
+            try:
+                update = Update.model_validate(payload, context={"bot": bot})
+            except ValueError as e:
+                logging.error(f"Не вдалося відновити апдейт з контрольної точки: {e}")
+                continue
+            self._payloads[update.update_id] = payload
+            self._start(bot, update)
+            self.restored += 1
+        if pending:
+            logging.info(f"Відновлено з контрольної точки апдейтів: {self.restored}.")
+
+    def _start(self, bot: Bot, update: Update) -> None:
+        task = asyncio.create_task(self._handle(bot, update))
+        self._in_flight[update.update_id] = task
+        self._updates[update.update_id] = update
+        task.add_done_callback(partial(self._finished, update.update_id))
+
+    async def _poll(self, bot: Bot) -> None:
+        allowed_updates = self.dp.resolve_used_update_types()
+        backoff = Backoff(config=_BACKOFF)
+        while True:
+            # Контрольна точка пишеться перед кожним getUpdates, тобто перед тим, як Telegram
+            # забуде отримані апдейти, - апдейти в обробці завжди є у файлі
+            self._save()
+            request = GetUpdates(offset=self._received + 1, timeout=self.polling_timeout,
+                                 allowed_updates=allowed_updates)
+            try:
+                updates = await bot(request)
+            except Exception as e:
+                logging.error(f"Не вдалося отримати апдейти: {e}. Повтор через {backoff.next_delay:.1f} с.")
+                await backoff.asleep()
+                continue
+            backoff.reset()
+            for update in updates:
+                if update.update_id <= self._received:
+                    # Уже отриманий апдейт (наприклад, відновлений з контрольної точки)
+                    self.redelivered += 1
+                    continue
+                self._received = update.update_id
+                self._start(bot, update)
+
+    async def _handle(self, bot: Bot, update) -> None:
+        try:
+            await self.dp.feed_update(bot, update)
+        except Exception:
+            # Як і в aiogram: апдейт з помилкою вважається обробленим, інакше він повторювався б після кожного рестарту
+            logging.exception(f"Помилка обробки апдейту {update.update_id}:")
+
+    def _finished(self, update_id: int, task: asyncio.Task) -> None:
+        if task.cancelled():
+            return
+        del self._in_flight[update_id]
+        self._updates.pop(update_id, None)
+        self._payloads.pop(update_id, None)
+        self.processed += 1
+        now = time.perf_counter()
+        if self.serving_at is None:
+            self.serving_at = now
+        # Після аварійного завершення повторно обробляться лише апдейти за останні CHECKPOINT_INTERVAL
+        if now - self._saved_at >= CHECKPOINT_INTERVAL:
+            self._saved_at = now
+            try:
+                self._save()
+            except OSError as e:
+                logging.error(f"Не вдалося записати контрольну точку: {e}")
+
+    async def drain(self) -> None:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.drain_timeout
+        tasks = [task for task in self._in_flight.values() if not task.done()]
+        if tasks:
+            logging.info(f"Зупинка: очікування {len(tasks)} апдейтів в обробці.")
+            _, pending = await asyncio.wait(tasks, timeout=self.drain_timeout)
+            if pending:
+                # Ці апдейти лишаються в контрольній точці і будуть оброблені після рестарту
+                self.abandoned += len(pending)
+                logging.warning(f"Зупинка: {len(pending)} апдейтів не завершились за {self.drain_timeout} с.")
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+        await _run_drains(self.drains, deadline)
+        self._save()
+        logging.info(f"Зупинка: контрольна точка update_id={self._received}, "
+                     f"незавершених апдейтів {len(self._in_flight)}.")
+
+    def _save(self) -> None:
+        for update_id in self._in_flight.keys() - self._payloads.keys():
+            self._payloads[update_id] = self._updates[update_id].model_dump(
+                mode="json", exclude_unset=True, by_alias=True)
+        self.checkpoint.save(self._received, self._payloads)
+
+    def counters(self) -> dict:
+        return {"processed": self.processed, "in_flight": len(self._in_flight), "redelivered": self.redelivered,
+                "restored": self.restored, "abandoned": self.abandoned,
+                "checkpoint": self.checkpoint.last_update_id}
+
+
+class BotHost:
+    """
+    Кілька ботів (токенів) в одному процесі зі спільними dp, роутерами, пулами БД, кешами та
+    сховищем FSM (ключ FSM уже містить bot_id, тож розмови різних ботів не змішуються).
+
+    Кожен бот опитується своїм BotLifecycle з власною контрольною точкою offset. Сигнал
+    зупинки зупиняє всіх одразу; спільні черги запису (drains) дописуються після того,
+    як усі боти завершили обробку.
+    """
+
+    def __init__(self, dp: Dispatcher, bots: list[Bot], drains=(), drain_timeout: float = DRAIN_TIMEOUT,
+                 polling_timeout: int = POLLING_TIMEOUT):
+        self.dp = dp
+        self.bots = bots
+        self.drains = list(drains)
+        self.drain_timeout = drain_timeout
+        # Один бот зберігає контрольну точку у звичному файлі
+        self.lifecycles = [
+            BotLifecycle(dp, checkpoint=UpdateCheckpoint(UPDATE_CHECKPOINT if len(bots) == 1 else checkpoint_path(bot.id)),
+                         drain_timeout=drain_timeout, polling_timeout=polling_timeout, handle_signals=False)
+            for bot in bots
+        ]
+
+    def request_stop(self) -> None:
+        for lifecycle in self.lifecycles:
+            lifecycle.request_stop()
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        _handle_stop_signals(self.request_stop)
+        workflow_data = {"dispatcher": self.dp, "bots": self.bots}
+        await self.dp.emit_startup(bot=self.bots[-1], **workflow_data)
+        try:
+            await asyncio.gather(*(lifecycle.run(bot) for lifecycle, bot in zip(self.lifecycles, self.bots)))
+        finally:
+            _release_stop_signals()
+            # Дедлайн відраховується від моменту, коли всі боти перестали приймати апдейти
+            await _run_drains(self.drains, loop.time() + self.drain_timeout)
+            await self.dp.emit_shutdown(bot=self.bots[-1], **workflow_data)
+
+    @property
+    def in_flight(self) -> int:
+        return sum(len(lifecycle._in_flight) for lifecycle in self.lifecycles)
+
+    def counters(self) -> dict:
+        totals = {"bots": len(self.bots)}
+        for lifecycle in self.lifecycles:
+            for key, value in lifecycle.counters().items():
+                if key != "checkpoint":
+                    totals[key] = totals.get(key, 0) + value
+        return totals
@@ -0,0 +1,138 @@
+# utils/loop_monitor.py
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from utils import stats
+
+# Як часто вимірювати затримку event loop і скільки останніх вимірів тримати для перцентилів
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.1"))
+LOOP_LAG_WINDOW = 3000  # ~5 хвилин при інтервалі 0.1 с
+# Блокування loop довше за цей поріг записується разом зі стеком і хендлером
+SLOW_CALLBACK_MS = float(os.getenv("SLOW_CALLBACK_MS", "100"))
+SLOW_CALLBACKS_KEPT = 50
+
+_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Хендлери викликаються з CallableObject.call (aiogram), зокрема і через CallbackRouter
+_HANDLER_CALLER = os.path.join("aiogram", "dispatcher", "event", "handler.py")
+
+
+def _percentile(ordered: list[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _short(filename: str) -> str:
+    if filename.startswith(_PROJECT_DIR + os.sep):
+        return os.path.relpath(filename, _PROJECT_DIR)
+    return os.path.basename(filename)
+
+
+def _describe(frame) -> tuple[str | None, str]:
+    """
+    (хендлер, місце): найглибша функція, викликана aiogram як хендлер, і найглибший рядок стеку.
+    """
+    stack = traceback.extract_stack(frame)
+    handler = None
+    for caller, entry in zip(stack, stack[1:]):
+        if caller.filename.endswith(_HANDLER_CALLER) and not entry.filename.endswith(_HANDLER_CALLER):
+            handler = f"{_short(entry.filename)}:{entry.name}"
+    last = stack[-1]
+    return handler, f"{_short(last.filename)}:{last.lineno} {last.name}"
+
+
+class LoopMonitor:
+    """
+    Безперервний замір затримки event loop і пошук колбеків, що його блокують.
+
+    Задача-пульс у loop засинає на interval і записує, наскільки пізніше прокинулась
+    (це і є затримка loop). Окремий потік-сторож перевіряє час останнього пульсу: якщо
+    loop мовчить довше за поріг, сторож знімає стек потоку loop - так видно, який хендлер
+    і який рядок блокує. Коли loop відновлюється, блокування записується з його тривалістю.
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, slow_ms: float = SLOW_CALLBACK_MS,
+                 window: int = LOOP_LAG_WINDOW):
+        self.interval = interval
+        self.threshold = slow_ms / 1000
+        self.lags: deque[float] = deque(maxlen=window)
+        self.slow_callbacks: deque[dict] = deque(maxlen=SLOW_CALLBACKS_KEPT)
+        self.slow_total = 0
+        self._beat = time.monotonic()
+        self._stall: tuple[str | None, str] | None = None
+        self._loop_thread: int | None = None
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._pulse(), name="loop-monitor")
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+
+    async def _pulse(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._beat = now
+            self.lags.append(lag)
+            stall, self._stall = self._stall, None
+            if lag >= self.threshold:
+                self._record(lag, *(stall or (None, "стек не знято")))
+
+    def _watch(self) -> None:
+        # Стек знімається вже на половині порогу, поки блокування ще триває; якщо воно
+        # виявиться коротшим за поріг, пульс його просто відкине
+        deadline = self.interval + self.threshold / 2
+        while not self._stopped.wait(self.threshold / 4):
+            if self._stall is not None or time.monotonic() - self._beat < deadline:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                self._stall = _describe(frame)
+
+    def _record(self, lag: float, handler: str | None, where: str) -> None:
+        self.slow_total += 1
+        self.slow_callbacks.append({"lag_ms": round(lag * 1000, 1), "handler": handler, "where": where,
+                                    "at": time.strftime("%Y-%m-%d %H:%M:%S")})
+        logging.warning(f"Event loop заблоковано на {lag * 1000:.0f} мс: {handler or 'поза хендлерами'} ({where})")
+
+    def counters(self) -> dict:
+        ordered = sorted(self.lags)
+        return {
+            "lag_p50_ms": round(_percentile(ordered, 0.50) * 1000, 1),
+            "lag_p95_ms": round(_percentile(ordered, 0.95) * 1000, 1),
+            "lag_p99_ms": round(_percentile(ordered, 0.99) * 1000, 1),
+            "lag_max_ms": round(ordered[-1] * 1000, 1) if ordered else 0.0,
+            "slow_callbacks": self.slow_total,
+        }
+
+
+loop_monitor = LoopMonitor()
+stats.register("loop", loop_monitor.counters)
@@ -0,0 +1,185 @@
+# utils/maintenance.py
+# Обслуговування файлу БД: incremental vacuum короткими кроками, ANALYZE, перевірка цілісності
+# та звіт про розмір таблиць і індексів.
+# Запуск вручну: python -m utils.maintenance [--full-check] [--convert]
+import asyncio
+import argparse
+import logging
+import os
+
+from sqlalchemy import text
+
+from db import engine, read_engine
+
+# Скільки сторінок звільняти за один крок і пауза між кроками, щоб записувач бота
+# не чекав на блокування довше за один крок
+VACUUM_PAGES_PER_STEP = int(os.getenv("VACUUM_PAGES_PER_STEP", "256"))
+VACUUM_PAUSE = 0.05
+# Обмеження кількості рядків, які ANALYZE переглядає в кожному індексі
+ANALYSIS_LIMIT = 1000
+# Інтервал планового обслуговування у боті
+MAINTENANCE_INTERVAL = int(os.getenv("MAINTENANCE_INTERVAL", str(24 * 3600)))
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+async def _pragma(conn, name: str):
+    return (await conn.exec_driver_sql(f"PRAGMA {name}")).scalar()
+
+
+async def convert_to_incremental() -> None:
+    """
+    Вмикає auto_vacuum=INCREMENTAL для наявного файлу. Потрібен повний VACUUM, який тримає
+    блокування на весь час роботи, тож виконується лише вручну з CLI при зупиненому боті.
+    """
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        if await _pragma(conn, "auto_vacuum") == AUTO_VACUUM_INCREMENTAL:
+            logging.info("auto_vacuum уже INCREMENTAL.")
+            return
+        await conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        await conn.exec_driver_sql("VACUUM")
+        logging.info("Базу переведено в режим auto_vacuum=INCREMENTAL.")
+
+
+async def incremental_vacuum(pages_per_step: int = VACUUM_PAGES_PER_STEP, pause: float = VACUUM_PAUSE) -> int:
+    """
+    Повертає вільні сторінки файлу кроками по pages_per_step, кожен крок - окрема коротка
+    транзакція. Повертає кількість звільнених сторінок.
+    """
+    freed = 0
+    while True:
+        async with engine.connect() as conn:
+            if freed == 0 and await _pragma(conn, "auto_vacuum") != AUTO_VACUUM_INCREMENTAL:
+                logging.warning("auto_vacuum не INCREMENTAL - пропускаю vacuum (див. --convert).")
+                return 0
+            free_pages = await _pragma(conn, "freelist_count")
+            if not free_pages:
+                return freed
+            # execute() у sqlite3 робить лише один крок прагми (одна сторінка), executescript
+            # виконує її до кінця як окрему автокомміт-транзакцію
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.executescript(
+                f"PRAGMA incremental_vacuum({min(free_pages, pages_per_step)})"
+            )
+            step = free_pages - await _pragma(conn, "freelist_count")
+        if step <= 0:
+            return freed
+        freed += step
+        await asyncio.sleep(pause)
+
+
+async def analyze(pause: float = VACUUM_PAUSE) -> list[str]:
+    """
+    ANALYZE по одній таблиці за транзакцію з обмеженням analysis_limit, далі PRAGMA optimize.
+    """
+    async with read_engine.connect() as conn:
+        tables = (await conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        )).scalars().all()
+    for table in tables:
+        async with engine.begin() as conn:
+            await conn.exec_driver_sql(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+            await conn.exec_driver_sql(f'ANALYZE "{table}"')
+        await asyncio.sleep(pause)
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql("PRAGMA optimize")
+    return tables
+
+
+async def integrity_check(full: bool = False) -> list[str]:
+    """
+    quick_check (або повний integrity_check) через read-only з'єднання - у WAL не блокує запис.
+    Повертає ["ok"], якщо проблем немає.
+    """
+    pragma = "integrity_check" if full else "quick_check"
+    async with read_engine.connect() as conn:
+        return (await conn.exec_driver_sql(f"PRAGMA {pragma}")).scalars().all()
+
+
+async def size_report() -> dict:
+    """
+    Розмір файлу, вільні сторінки та розмір кожної таблиці й індексу (через dbstat, якщо доступна).
+    """
+    async with read_engine.connect() as conn:
+        page_size = await _pragma(conn, "page_size")
+        report = {
+            "page_size": page_size,
+            "pages": await _pragma(conn, "page_count"),
+            "free_pages": await _pragma(conn, "freelist_count"),
+            "objects": [],
+        }
+        try:
+            rows = await conn.execute(text(
+                "SELECT s.name, COALESCE(m.type, 'table'), SUM(s.pgsize), COUNT(*) "
+                "FROM dbstat AS s LEFT JOIN sqlite_master AS m ON m.name = s.name "
+                "GROUP BY s.name ORDER BY SUM(s.pgsize) DESC"
+            ))
+            report["objects"] = [
+                {"name": name, "type": kind, "bytes": size, "pages": pages}
+                for name, kind, size, pages in rows
+            ]
+        except Exception as e:
+            # SQLite без SQLITE_ENABLE_DBSTAT_VTAB - лише загальний розмір
+            logging.warning(f"dbstat недоступна: {e}")
+    return report
+
+
+async def checkpoint() -> None:
+    # PASSIVE не чекає на читачів і записувача; вільне місце у файлі повертається після чекпойнту
+    async with engine.connect() as conn:
+        await conn.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)")
+
+
+def format_report(freed: int, check: list[str], sizes: dict) -> str:
+    page_size = sizes["page_size"]
+    lines = [
+        f"Звільнено сторінок: {freed} ({freed * page_size / 1024:.1f} КБ)",
+        f"Перевірка цілісності: {'ok' if check == ['ok'] else '; '.join(check[:10])}",
+        f"Файл: {sizes['pages'] * page_size / 1024:.1f} КБ, вільних сторінок: {sizes['free_pages']}",
+    ]
+    for item in sizes["objects"]:
+        lines.append(f"  {item['type']:<5} {item['name']:<32} {item['bytes'] / 1024:10.1f} КБ")
+    return "\n".join(lines)
+
+
+async def run_maintenance(full_check: bool = False) -> str:
+    freed = await incremental_vacuum()
+    await analyze()
+    check = await integrity_check(full=full_check)
+    if check != ["ok"]:
+        logging.error(f"Перевірка цілісності БД: {check[:10]}")
+    await checkpoint()
+    return format_report(freed, check, await size_report())
+
+
+async def scheduled_maintenance(interval: float = MAINTENANCE_INTERVAL):
+    """
+    Плановий цикл у боті: архівація старих рахунків, потім обслуговування файлу.
+    """
+    from db import async_clear_old_bills
+    while True:
+        await async_clear_old_bills()
+        try:
+            logging.info("Обслуговування БД:\n" + await run_maintenance())
+        except Exception:
+            logging.exception("Помилка при обслуговуванні БД:")
+        await asyncio.sleep(interval)
+
+
+async def _main(args):
+    try:
+        if args.convert:
+            await convert_to_incremental()
+        print(await run_maintenance(full_check=args.full_check))
+    finally:
+        await engine.dispose()
+        await read_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Обслуговування бази даних Komunalka")
+    parser.add_argument("--full-check", action="store_true", help="повний integrity_check замість quick_check")
+    parser.add_argument("--convert", action="store_true",
+                        help="одноразово перевести наявну базу в auto_vacuum=INCREMENTAL (повний VACUUM)")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,131 @@
+# utils/meter_sim.py
+# "Що, якби": перерахунок історії споживання електроенергії адреси за всіма типами лічильників.
+import numpy as np
+from sqlalchemy import select
+from db import read_session
+from models import Bill
+from utils.bill_store import (
+    ELECTRICITY, TARIFF_ONE_ZONE, TARIFF_TWO_ZONE_DAY, TARIFF_TWO_ZONE_NIGHT,
+    TARIFF_THREE_ZONE_PEAK, TARIFF_THREE_ZONE_DAY, TARIFF_THREE_ZONE_NIGHT,
+)
+from utils.money import TARIFF_SCALE, KOPECKS_PER_UAH, format_uah
+
+# Зони споживання в масивах: стовпці 0 - пік, 1 - день (напівпік), 2 - ніч
+PEAK, DAY, NIGHT = 0, 1, 2
+
+# Тарифи кожного типу лічильника по зонах (1/10000 грн за кВт)
+METER_TARIFFS = {
+    "Однозонний": (TARIFF_ONE_ZONE, TARIFF_ONE_ZONE, TARIFF_ONE_ZONE),
+    "Двозонний": (TARIFF_TWO_ZONE_DAY, TARIFF_TWO_ZONE_DAY, TARIFF_TWO_ZONE_NIGHT),
+    "Трьохзонний": (TARIFF_THREE_ZONE_PEAK, TARIFF_THREE_ZONE_DAY, TARIFF_THREE_ZONE_NIGHT),
+}
+
+# Типовий розподіл побутового споживання по зонах, якщо у адреси немає зонних рахунків
+DEFAULT_ZONE_SHARES = (0.25, 0.45, 0.30)
+
+_UNITS_PER_KOPECK = TARIFF_SCALE // KOPECKS_PER_UAH
+
+_HISTORY_COLUMNS = (
+    Bill.consumption,
+    Bill.consumption_day_2, Bill.consumption_night_2,
+    Bill.consumption_peak, Bill.consumption_day_3, Bill.consumption_night_3,
+)
+
+
+async def load_history(address_id: int) -> np.ndarray:
+    """
+    Історія електроенергії адреси як масив (n, 6): one, day_2, night_2, peak, day_3, night_3
+    (NaN там, де у рахунку немає такої колонки).
+    """
+    stmt = (
+        select(*_HISTORY_COLUMNS)
+        .where(Bill.address_id == address_id, Bill.service == ELECTRICITY)
+        .order_by(Bill.created_at)
+    )
+    async with read_session() as session:
+        rows = (await session.execute(stmt)).all()
+    return np.array(rows, dtype=np.float64).reshape(-1, len(_HISTORY_COLUMNS))
+
+
+def estimate_zone_shares(history: np.ndarray) -> np.ndarray:
+    """
+    Частки пік/день/ніч: з трьохзонних рахунків адреси, інакше нічна частка з двозонних
+    і типовий поділ денного споживання на пік і день.
+    """
+    shares = np.array(DEFAULT_ZONE_SHARES)
+    three = history[:, 3:6]
+    three = three[~np.isnan(three).any(axis=1)]
+    if three.size and three.sum() > 0:
+        return three.sum(axis=0) / three.sum()
+    two = history[:, 1:3]
+    two = two[~np.isnan(two).any(axis=1)]
+    if two.size and two.sum() > 0:
+        night = two[:, 1].sum() / two.sum()
+        peak_of_day = shares[PEAK] / (shares[PEAK] + shares[DAY])
+        return np.array([(1 - night) * peak_of_day, (1 - night) * (1 - peak_of_day), night])
+    return shares
+
+
+def zone_matrix(history: np.ndarray, shares: np.ndarray) -> np.ndarray:
+    """
+    Споживання кожного рахунку по зонах (n, 3). Трьохзонні рахунки - як є, двозонні - денне
+    ділиться на пік і день за shares, однозонні - весь обсяг за shares.
+    """
+    one, day_2, night_2 = history[:, 0], history[:, 1], history[:, 2]
+    three = history[:, 3:6]
+    peak_of_day = shares[PEAK] / (shares[PEAK] + shares[DAY])
+    zones = np.nan_to_num(one)[:, None] * shares[None, :]
+    is_two = ~np.isnan(day_2) & ~np.isnan(night_2)
+    zones[is_two] = np.column_stack((
+        day_2[is_two] * peak_of_day, day_2[is_two] * (1 - peak_of_day), night_2[is_two],
+    ))
+    is_three = ~np.isnan(three).any(axis=1)
+    zones[is_three] = three[is_three]
+    return zones
+
+
+def _components(tariff_matrix: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Зони з однаковим тарифом - одна складова рахунку (у двозонного пік і день - це "День").
+    Повертає матрицю зона -> складова (лічильники, зони, складові) і тарифи складових.
+    """
+    meters, zones = tariff_matrix.shape
+    groups = np.zeros((meters, zones, zones))
+    component_tariffs = np.zeros((meters, zones))
+    for meter, row in enumerate(tariff_matrix):
+        values = list(dict.fromkeys(row))
+        for zone, value in enumerate(row):
+            groups[meter, zone, values.index(value)] = 1
+        component_tariffs[meter, :len(values)] = values
+    return groups, component_tariffs
+
+
+def simulate(history: np.ndarray, tariffs: dict = METER_TARIFFS) -> dict[str, int]:
+    """
+    Вартість усієї історії (копійки) для кожного набору тарифів одним векторним проходом:
+    (рахунки x зони) -> (рахунки x лічильники x складові), кожна складова округлюється
+    до копійки, як у справжньому рахунку.
+    """
+    zones = zone_matrix(history, estimate_zone_shares(history))
+    groups, component_tariffs = _components(np.array(list(tariffs.values()), dtype=np.float64))
+    consumption = np.einsum("nz,mzc->nmc", zones, groups)
+    exact = consumption * component_tariffs[None, :, :] / _UNITS_PER_KOPECK
+    # Половина копійки округлюється від нуля (див. utils/money.cost_kopecks)
+    kopecks = np.sign(exact) * np.floor(np.abs(exact) + 0.5)
+    totals = kopecks.sum(axis=(0, 2))
+    return {name: int(total) for name, total in zip(tariffs, totals)}
+
+
+def format_comparison(totals: dict[str, int], history: np.ndarray) -> str:
+    bills = len(history)
+    if not bills:
+        return "Рахунків за електроенергію для цієї адреси ще немає."
+    best = min(totals, key=totals.get)
+    worst = max(totals.values())
+    lines = [f"Порівняння лічильників за {bills} рахунків електроенергії:", ""]
+    for name, total in sorted(totals.items(), key=lambda item: item[1]):
+        lines.append(f"{name}: {format_uah(total)} грн (у середньому {format_uah(total // bills)} грн/рахунок)")
+    lines += ["", f"Найвигідніше: {best}, економія до {format_uah(worst - totals[best])} грн."]
+    if np.isnan(history[:, 3:6]).any():
+        lines.append("Розподіл по зонах для одно- та двозонних рахунків оцінено.")
+    return "\n".join(lines)
@@ -0,0 +1,50 @@
+# utils/money.py
+from decimal import Decimal
+
+# Гроші зберігаються цілими копійками, тарифи - цілими десятитисячними гривні
+# (4.32 грн -> 43200, 1.728 грн -> 17280). Уся арифметика цілочисельна.
+KOPECKS_PER_UAH = 100
+TARIFF_SCALE = 10_000
+_TARIFF_UNITS_PER_KOPECK = TARIFF_SCALE // KOPECKS_PER_UAH
+
+
+def tariff(value: str) -> int:
+    """
+    Перетворює тариф у гривнях (рядком, щоб уникнути похибки float) у цілі одиниці TARIFF_SCALE.
+    """
+    units = Decimal(value) * TARIFF_SCALE
+    if units != units.to_integral_value():
+        raise ValueError(f"Тариф {value} має більше знаків, ніж дозволяє TARIFF_SCALE")
+    return int(units)
+
+
+def cost_kopecks(quantity: int, tariff_units: int) -> int:
+    """
+    Вартість quantity одиниць за тарифом у копійках. Округлення - до найближчої копійки,
+    половина копійки округлюється від нуля.
+    """
+    exact = quantity * tariff_units
+    kopecks, remainder = divmod(abs(exact), _TARIFF_UNITS_PER_KOPECK)
+    if remainder * 2 >= _TARIFF_UNITS_PER_KOPECK:
+        kopecks += 1
+    return kopecks if exact >= 0 else -kopecks
+
+
+def format_uah(kopecks: int | None) -> str:
+    if kopecks is None:
+        return "0.00"
+    sign = "-" if kopecks < 0 else ""
+    hryvnias, kop = divmod(abs(kopecks), KOPECKS_PER_UAH)
+    return f"{sign}{hryvnias}.{kop:02d}"
+
+
+def format_tariff(tariff_units: int | None) -> str:
+    """
+    Тариф у гривнях: щонайменше два знаки після коми, більше - лише якщо вони значущі (1.728).
+    """
+    if tariff_units is None:
+        return "-"
+    value = (Decimal(tariff_units) / TARIFF_SCALE).normalize()
+    if value.as_tuple().exponent > -2:
+        value = value.quantize(Decimal("0.01"))
+    return f"{value:f}"
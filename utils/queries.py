@@ -0,0 +1,21 @@
+# utils/queries.py
+# Гарячі запити, що виконуються майже на кожен апдейт, побудовані один раз з bindparam.
+# Повторне використання того самого об'єкта оминає побудову конструкції і генерацію ключа кешу
+# на кожен виклик, SQLAlchemy бере скомпільований SQL зі свого кешу, а однаковий текст SQL
+# дозволяє sqlite3 повторно використати підготовлений statement (cached_statements з'єднання).
+# Значення передаються параметрами: session.execute(USER_BY_TELEGRAM_ID, {"telegram_id": ...}).
+from sqlalchemy import select, bindparam
+from models import User, Address, Bill
+
+USER_BY_TELEGRAM_ID = select(User).where(User.telegram_id == bindparam("telegram_id"))
+USER_ID_BY_TELEGRAM_ID = select(User.id).where(User.telegram_id == bindparam("telegram_id"))
+
+ADDRESS_BY_ID = select(Address).where(Address.id == bindparam("address_id"))
+ADDRESSES_BY_USER = select(Address).where(Address.user_id == bindparam("user_id"))
+
+BILL_BY_ID = select(Bill).where(Bill.id == bindparam("bill_id"))
+BILLS_BY_ADDRESS = (
+    select(Bill)
+    .where(Bill.address_id == bindparam("address_id"))
+    .order_by(Bill.created_at.desc())
+)
@@ -0,0 +1,149 @@
+# utils/receipts.py
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from utils.money import format_uah, format_tariff
+
+# Квитанції рендеряться у окремих процесах (Pillow), щоб не блокувати event loop.
+# Готові файли зберігаються у RECEIPTS_DIR і повторно не рендеряться.
+# Процеси стартують через forkserver, а не fork: fork копіює батьківський процес разом
+# з потоками aiosqlite, відкритими з'єднаннями і станом event loop.
+RECEIPTS_DIR = os.getenv("RECEIPTS_DIR", "receipts")
+RECEIPT_FONT = os.getenv("RECEIPT_FONT", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+RECEIPT_FORMATS = ("png", "pdf")
+
+
+class ReceiptQueueFull(Exception):
+    pass
+
+
+def bill_details_text(bill) -> str:
+    """
+    Текст детального рахунку (використовується і у повідомленні, і у квитанції).
+    """
+    created_at_str = bill.created_at.strftime("%d-%m-%Y %H:%M") if bill.created_at else "N/A"
+    details = f"Рахунок №{bill.id}\nДата: {created_at_str}\nПослуга: {bill.service}\n\n"
+    if bill.service == "Електроенергія":
+        if bill.total_cost is not None:
+            details += "Тип: Однозонний\n"
+            details += f"Поточні показники: {int(bill.current)}\n"
+            details += f"Попередні показники: {int(bill.previous)}\n"
+            details += f"Спожито: {int(bill.consumption)}\n"
+            details += f"Тариф: {format_tariff(bill.tariff)}\n"
+            details += f"Загальна вартість: {format_uah(bill.total_cost)} грн\n"
+        elif bill.total_cost_2 is not None:
+            details += "Тип: Двозонний\n"
+            details += f"Поточні показники (День): {int(bill.current_day_2)}\n"
+            details += f"Попередні показники (День): {int(bill.previous_day_2)}\n"
+            details += f"Поточні показники (Ніч): {int(bill.current_night_2)}\n"
+            details += f"Попередні показники (Ніч): {int(bill.previous_night_2)}\n"
+            details += f"Спожито (День): {int(bill.consumption_day_2)}\n"
+            details += f"Спожито (Ніч): {int(bill.consumption_night_2)}\n"
+            details += f"Тариф (День): {format_tariff(bill.tariff_day_2)}\n"
+            details += f"Тариф (Ніч): {format_tariff(bill.tariff_night_2)}\n"
+            details += f"Загальна вартість: {format_uah(bill.total_cost_2)} грн\n"
+        elif bill.total_cost_3 is not None:
+            details += "Тип: Трьохзонний\n"
+            details += f"Поточні показники (Пік): {int(bill.current_peak)}\n"
+            details += f"Попередні показники (Пік): {int(bill.previous_peak)}\n"
+            details += f"Поточні показники (День): {int(bill.current_day_3)}\n"
+            details += f"Попередні показники (День): {int(bill.previous_day_3)}\n"
+            details += f"Поточні показники (Ніч): {int(bill.current_night_3)}\n"
+            details += f"Попередні показники (Ніч): {int(bill.previous_night_3)}\n"
+            details += f"Загальна вартість: {format_uah(bill.total_cost_3)} грн\n"
+        else:
+            details += "Дані по електроенергії відсутні.\n"
+    elif bill.service == "Газ та Газопостачання":
+        details += f"Поточні показники: {int(bill.gas_current)}\n"
+        details += f"Попередні показники: {int(bill.gas_previous)}\n"
+        details += f"Спожито газу: {int(bill.gas_consumption)}\n"
+        details += f"Тариф газ: {format_tariff(bill.tariff_gas)}\n"
+        details += f"Тариф газопостачання: {format_tariff(bill.tariff_gas_supply)}\n"
+        details += f"Вартість газу: {format_uah(bill.cost_gas)} грн\n"
+        details += f"Вартість газопостачання: {format_uah(bill.cost_gas_supply)} грн\n"
+        details += f"Загальна вартість: {format_uah(bill.total_cost_gas)} грн\n"
+    elif bill.service == "Вивіз сміття":
+        details += f"Кількість відвантажень: {int(bill.unloads)}\n"
+        details += f"Кількість сміттєвих баків: {int(bill.bins)}\n"
+        details += f"Тариф: {format_tariff(bill.trash_tariff)}\n"
+        details += f"Загальна вартість: {format_uah(bill.total_cost_trash)} грн\n"
+    else:
+        details += "Додаткових даних немає.\n"
+    return details
+
+
+def _render_receipt(lines: list[str], path: str, fmt: str, font_path: str) -> str:
+    # Виконується у дочірньому процесі
+    from PIL import Image, ImageDraw, ImageFont
+    try:
+        font = ImageFont.truetype(font_path, 22)
+    except OSError:
+        font = ImageFont.load_default()
+    padding, line_height, width = 40, 32, 800
+    image = Image.new("RGB", (width, padding * 2 + line_height * len(lines)), "white")
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((padding, padding + i * line_height), line, fill="black", font=font)
+    tmp_path = f"{path}.tmp"
+    image.save(tmp_path, "PDF" if fmt == "pdf" else "PNG")
+    os.replace(tmp_path, path)
+    return path
+
+
+class ReceiptRenderer:
+    """
+    Рендеринг квитанцій у ProcessPoolExecutor з обмеженою чергою та кешем файлів за bill_id.
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 16, directory: str = RECEIPTS_DIR):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.directory = directory
+        self._executor: ProcessPoolExecutor | None = None
+        self._pending = 0
+        self._inflight: dict[tuple[int, str], asyncio.Future] = {}
+
+    def path(self, bill_id: int, fmt: str) -> str:
+        return os.path.join(self.directory, f"receipt-{bill_id}.{fmt}")
+
+    async def render(self, bill, fmt: str = "png") -> str:
+        """
+        Повертає шлях до квитанції рахунку; рендерить лише якщо файла ще немає.
+        Якщо черга рендерингу заповнена - ReceiptQueueFull.
+        """
+        if fmt not in RECEIPT_FORMATS:
+            raise ValueError(f"Невідомий формат квитанції: {fmt}")
+        path = self.path(bill.id, fmt)
+        if os.path.exists(path):
+            return path
+        key = (bill.id, fmt)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        if self._pending >= self.max_pending:
+            raise ReceiptQueueFull()
+
+        lines = bill_details_text(bill).splitlines()
+        if self._executor is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context("forkserver"))
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, _render_receipt, lines, path, fmt, RECEIPT_FONT)
+        self._inflight[key] = future
+        self._pending += 1
+        future.add_done_callback(lambda _: self._release(key))
+        return await asyncio.shield(future)
+
+    def _release(self, key) -> None:
+        self._pending -= 1
+        self._inflight.pop(key, None)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+receipt_renderer = ReceiptRenderer()
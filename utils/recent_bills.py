@@ -0,0 +1,134 @@
+# utils/recent_bills.py
+from collections import OrderedDict
+from sqlalchemy import select, func
+from aiogram.types import InlineQueryResultArticle, InputTextMessageContent
+from db import read_session
+from models import Bill
+from utils import stats
+from utils.bill_store import bill_total_cost, bill_saved_listeners
+from utils.helpers import get_address, format_address
+from utils.money import format_uah
+from utils.queries import USER_ID_BY_TELEGRAM_ID
+from utils.receipts import bill_details_text
+
+# Скільки користувачів тримати в кеші останніх рахунків
+RECENT_BILLS_CACHE_SIZE = 10_000
+# Скільки результатів повертати на inline-запит (ліміт Telegram - 50)
+INLINE_RESULTS_LIMIT = 50
+
+
+def _inline_result(bill, address) -> InlineQueryResultArticle:
+    address_text = format_address(address) if address else "невідома адреса"
+    created_at_str = bill.created_at.strftime("%d-%m-%Y") if bill.created_at else "N/A"
+    return InlineQueryResultArticle(
+        id=str(bill.id),
+        title=f"{bill.service}: {format_uah(bill_total_cost(bill))} грн",
+        description=f"{address_text}, {created_at_str}",
+        input_message_content=InputTextMessageContent(
+            message_text=f"Адреса: {address_text}\n\n{bill_details_text(bill)}",
+            parse_mode=None,
+        ),
+    )
+
+
+class RecentBillsCache:
+    """
+    Останній рахунок кожної послуги по кожній адресі користувача у вигляді готових
+    inline-результатів. Заповнюється одним запитом при першому зверненні і далі
+    оновлюється при збереженні рахунку (record), без звернень до БД.
+    """
+
+    def __init__(self, max_size: int = RECENT_BILLS_CACHE_SIZE):
+        self.max_size = max_size
+        # user_id -> {(address_id, service): (bill_id, result)}
+        self._entries: "OrderedDict[int, dict]" = OrderedDict()
+        # telegram_id -> user_id (id користувача не змінюється)
+        self._user_ids: "OrderedDict[int, int]" = OrderedDict()
+        # Рахунки, збережені поки кеш користувача завантажується з БД
+        self._pending: dict[int, list] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, cache: OrderedDict, key, value) -> None:
+        cache[key] = value
+        cache.move_to_end(key)
+        if len(cache) > self.max_size:
+            cache.popitem(last=False)
+
+    async def _user_id(self, telegram_id: int) -> int | None:
+        if telegram_id in self._user_ids:
+            self._user_ids.move_to_end(telegram_id)
+            return self._user_ids[telegram_id]
+        async with read_session() as session:
+            user_id = (await session.execute(USER_ID_BY_TELEGRAM_ID, {"telegram_id": telegram_id})).scalar()
+        # Незареєстрованого користувача не кешуємо - він може натиснути /start будь-якої миті
+        if user_id is not None:
+            self._remember(self._user_ids, telegram_id, user_id)
+        return user_id
+
+    async def _load(self, user_id: int) -> dict:
+        latest = (
+            select(func.max(Bill.id))
+            .where(Bill.user_id == user_id)
+            .group_by(Bill.address_id, Bill.service)
+        )
+        async with read_session() as session:
+            bills = (await session.execute(select(Bill).where(Bill.id.in_(latest)))).scalars().all()
+        entries = {}
+        for bill in bills:
+            address = await get_address(bill.address_id)
+            entries[(bill.address_id, bill.service)] = (bill.id, _inline_result(bill, address))
+        return entries
+
+    async def results(self, telegram_id: int, query: str = "") -> list[InlineQueryResultArticle]:
+        """
+        Inline-результати користувача, новіші першими; query фільтрує за послугою та адресою.
+        """
+        user_id = await self._user_id(telegram_id)
+        if user_id is None:
+            return []
+        entries = self._entries.get(user_id)
+        if entries is None:
+            self.misses += 1
+            pending = self._pending.setdefault(user_id, [])
+            try:
+                entries = await self._load(user_id)
+            finally:
+                self._pending.pop(user_id, None)
+            for bill, address in pending:
+                entries[(bill.address_id, bill.service)] = (bill.id, _inline_result(bill, address))
+            self._remember(self._entries, user_id, entries)
+        else:
+            self.hits += 1
+            self._entries.move_to_end(user_id)
+        query = query.strip().casefold()
+        results = [
+            result for _, result in sorted(entries.values(), key=lambda entry: entry[0], reverse=True)
+            if not query or query in result.title.casefold() or query in result.description.casefold()
+        ]
+        return results[:INLINE_RESULTS_LIMIT]
+
+    def record(self, bill, address) -> None:
+        """
+        Оновлює кеш після збереження рахунку (лише якщо користувач уже в кеші).
+        """
+        if bill.user_id in self._pending:
+            self._pending[bill.user_id].append((bill, address))
+            return
+        entries = self._entries.get(bill.user_id)
+        if entries is None:
+            return
+        try:
+            entries[(bill.address_id, bill.service)] = (bill.id, _inline_result(bill, address))
+        except Exception:
+            # Кеш не повинен ламати збереження рахунку - просто перечитаємо з БД
+            self._entries.pop(bill.user_id, None)
+            raise
+
+    def counters(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "users": len(self._entries)}
+
+
+recent_bills = RecentBillsCache()
+bill_saved_listeners.append(recent_bills.record)
+stats.register("recent_bills", recent_bills.counters)
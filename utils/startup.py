@@ -0,0 +1,37 @@
+# utils/startup.py
+import logging
+import time
+
+
+class StartupReport:
+    """
+    Замір часу етапів запуску бота та часу до першого обробленого апдейту.
+    """
+
+    def __init__(self, started_at: float = None):
+        self.started_at = time.perf_counter() if started_at is None else started_at
+        self.phases: list[tuple[str, float]] = []
+        self.first_update: float | None = None
+        self._last = self.started_at
+
+    def mark(self, phase: str) -> None:
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    @property
+    def total(self) -> float:
+        return self._last - self.started_at
+
+    def summary(self) -> str:
+        parts = ", ".join(f"{name} {seconds * 1000:.1f} мс" for name, seconds in self.phases)
+        return f"Startup: {parts}; разом {self.total * 1000:.1f} мс"
+
+    async def first_update_middleware(self, handler, event, data):
+        if self.first_update is not None:
+            return await handler(event, data)
+        self.first_update = time.perf_counter() - self.started_at
+        try:
+            return await handler(event, data)
+        finally:
+            logging.info(f"Перший апдейт отримано через {self.first_update * 1000:.1f} мс після старту.")
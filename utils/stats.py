@@ -0,0 +1,44 @@
+# utils/stats.py
+import asyncio
+import logging
+import os
+
+# Як часто записувати знімок лічильників у лог (затримка loop, повільні колбеки, throttling тощо)
+STATS_INTERVAL = float(os.getenv("STATS_INTERVAL", "60"))
+
+# Реєстр лічильників: назва -> функція, що повертає dict поточних значень
+_providers = {}
+
+
+def register(name: str, provider) -> None:
+    _providers[name] = provider
+
+
+def snapshot() -> dict:
+    """
+    Поточні значення всіх зареєстрованих лічильників.
+    """
+    result = {}
+    for name, provider in _providers.items():
+        try:
+            result[name] = provider()
+        except Exception:
+            logging.exception(f"Не вдалося зібрати лічильники {name}:")
+    return result
+
+
+def format_snapshot() -> str:
+    return "; ".join(
+        f"{name}: " + ", ".join(f"{key}={value}" for key, value in values.items())
+        for name, values in snapshot().items()
+    )
+
+
+async def log_periodically(interval: float = STATS_INTERVAL) -> None:
+    """
+    Фонова задача бота: раз на interval секунд пише знімок лічильників у лог,
+    щоб регресії було видно під час роботи, а не лише при зупинці.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        logging.info(f"Лічильники: {format_snapshot()}")
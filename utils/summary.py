@@ -0,0 +1,63 @@
+# utils/summary.py
+import html
+import datetime
+from sqlalchemy import select, func
+from db import read_session
+from models import Bill, Address, Building, Street, City
+from utils.bill_store import bill_total_cost_sql
+from utils.helpers import format_address
+from utils.money import format_uah
+
+SUMMARY_MONTHS = 12
+# Ліміт довжини повідомлення Telegram
+MAX_MESSAGE_LENGTH = 4096
+
+
+async def load_household_summary(user_id: int, months: int = SUMMARY_MONTHS):
+    """
+    Суми рахунків користувача по адресах, послугах і місяцях за останні months місяців -
+    одним GROUP BY-запитом по індексу bills(user_id, created_at).
+    """
+    since = datetime.datetime.now() - datetime.timedelta(days=months * 31)
+    month = func.strftime("%Y-%m", Bill.created_at).label("month")
+    stmt = (
+        select(
+            Address.id, City.name.label("city"), Street.name.label("street"), Building.house, Address.apartment,
+            month, Bill.service,
+            func.sum(bill_total_cost_sql).label("total"),
+            func.count().label("bills"),
+        )
+        .join(Address, Address.id == Bill.address_id)
+        .join(Building, Building.id == Address.building_id)
+        .join(Street, Street.id == Building.street_id)
+        .join(City, City.id == Street.city_id)
+        .where(Bill.user_id == user_id, Bill.created_at >= since)
+        .group_by(Address.id, month, Bill.service)
+        .order_by(Address.id, month.desc(), Bill.service)
+    )
+    async with read_session() as session:
+        result = await session.execute(stmt)
+        return result.all()
+
+
+def format_household_summary(rows, months: int = SUMMARY_MONTHS) -> str:
+    if not rows:
+        return f"Рахунків за останні {months} міс. не знайдено."
+    addresses: dict[int, dict] = {}
+    for row in rows:
+        address = addresses.setdefault(row.id, {"title": html.escape(format_address(row)), "total": 0, "months": {}})
+        address["total"] += row.total
+        address["months"].setdefault(row.month, []).append(f"{row.service} {format_uah(row.total)}")
+    grand_total = sum(address["total"] for address in addresses.values())
+
+    lines = [f"Зведення за останні {months} міс.:", ""]
+    for address in addresses.values():
+        lines.append(f"{address['title']} - {format_uah(address['total'])} грн")
+        for month, services in address["months"].items():
+            lines.append(f"  {month}: " + ", ".join(services))
+        lines.append("")
+    footer = f"Разом по всіх адресах: {format_uah(grand_total)} грн"
+    text = "\n".join(lines)
+    if len(text) + len(footer) > MAX_MESSAGE_LENGTH:
+        text = text[:MAX_MESSAGE_LENGTH - len(footer) - 5].rsplit("\n", 1)[0] + "\n...\n"
+    return text + footer
@@ -0,0 +1,113 @@
+# utils/throttling.py
+import os
+import time
+import logging
+
+from utils import stats
+
+# Ліміти: швидкість поповнення (апдейтів/с) і розмір "сплеску" для одного користувача та для кожного бота
+USER_RATE = float(os.getenv("THROTTLE_USER_RATE", "2"))
+USER_BURST = int(os.getenv("THROTTLE_USER_BURST", "5"))
+GLOBAL_RATE = float(os.getenv("THROTTLE_GLOBAL_RATE", "100"))
+GLOBAL_BURST = int(os.getenv("THROTTLE_GLOBAL_BURST", "200"))
+# Як часто (в апдейтах) викидати записи користувачів, чий бакет уже знову повний
+SWEEP_EVERY = 10000
+
+THROTTLED_TEXT = "Забагато запитів. Зачекайте кілька секунд."
+
+
+class ThrottlingMiddleware:
+    """
+    Outer middleware для dp.update: токен-бакети на користувача (спільний для всіх ботів процесу)
+    і глобальний - окремий для кожного бота, як і ліміти Telegram на токен.
+
+    Бакет зберігається як один float - "теоретичний час прибуття" (GCRA), що еквівалентно
+    token bucket зі швидкістю rate і місткістю burst. Запис з часом у минулому означає
+    повний бакет, тож його можна викинути - у пам'яті лишаються лише активні користувачі.
+    Апдейт понад ліміт не доходить до хендлера; користувач один раз отримує коротку відповідь.
+    """
+
+    def __init__(self, user_rate: float = USER_RATE, user_burst: int = USER_BURST,
+                 global_rate: float = GLOBAL_RATE, global_burst: int = GLOBAL_BURST,
+                 clock=time.monotonic):
+        self.user_interval = 1.0 / user_rate
+        self.user_tolerance = self.user_interval * (user_burst - 1)
+        self.global_interval = 1.0 / global_rate
+        self.global_tolerance = self.global_interval * (global_burst - 1)
+        self.clock = clock
+        self._users: dict[int, float] = {}
+        # bot_id -> TAT глобального бакета бота
+        self._global: dict[int | None, float] = {}
+        # Кому вже відповіли про ліміт - до першого пропущеного апдейту
+        self._notified: set[int] = set()
+        self._since_sweep = 0
+        self.passed = 0
+        self.limited_user = 0
+        self.limited_global = 0
+        self.replies = 0
+
+    def allow(self, user_id: int | None, bot_id: int | None = None) -> bool:
+        now = self.clock()
+        self._since_sweep += 1
+        if self._since_sweep >= SWEEP_EVERY:
+            self.sweep(now)
+        if user_id is not None:
+            tat = max(self._users.get(user_id, now), now)
+            if tat - now > self.user_tolerance:
+                self.limited_user += 1
+                return False
+        global_tat = max(self._global.get(bot_id, now), now)
+        if global_tat - now > self.global_tolerance:
+            self.limited_global += 1
+            return False
+        self._global[bot_id] = global_tat + self.global_interval
+        if user_id is not None:
+            self._users[user_id] = tat + self.user_interval
+            self._notified.discard(user_id)
+        self.passed += 1
+        return True
+
+    def sweep(self, now: float = None) -> None:
+        """
+        Видаляє користувачів з повним бакетом.
+        """
+        now = self.clock() if now is None else now
+        self._users = {user_id: tat for user_id, tat in self._users.items() if tat > now}
+        self._notified &= self._users.keys()
+        self._since_sweep = 0
+
+    def counters(self) -> dict:
+        return {
+            "passed": self.passed,
+            "limited_user": self.limited_user,
+            "limited_global": self.limited_global,
+            "replies": self.replies,
+            "tracked_users": len(self._users),
+        }
+
+    async def _reply(self, event) -> None:
+        try:
+            if event.callback_query is not None:
+                await event.callback_query.answer(THROTTLED_TEXT)
+            elif event.message is not None:
+                await event.message.answer(THROTTLED_TEXT)
+            else:
+                return
+            self.replies += 1
+        except Exception:
+            logging.exception("Не вдалося відповісти про перевищення ліміту:")
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        user_id = user.id if user else None
+        bot = data.get("bot")
+        if self.allow(user_id, bot.id if bot else None):
+            return await handler(event, data)
+        if user_id is not None and user_id not in self._notified:
+            self._notified.add(user_id)
+            await self._reply(event)
+        return None
+
+
+throttling = ThrottlingMiddleware()
+stats.register("throttling", throttling.counters)
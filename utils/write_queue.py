@@ -0,0 +1,164 @@
+# utils/write_queue.py
+import asyncio
+import logging
+from sqlalchemy import insert, select
+from db import write_session
+from models import Bill
+
+
+class DuplicateBill(Exception):
+    """
+    Рахунок з таким idempotency_key уже записано (повтор останнього кроку сценарію).
+    """
+
+    def __init__(self, bill_id: int):
+        super().__init__(f"Рахунок уже збережено (id={bill_id})")
+        self.bill_id = bill_id
+
+
+class BillWriteQueue:
+    """
+    Групова фіксація вставок рахунків (group commit).
+
+    Хендлери передають значення колонок рахунку у submit() і чекають на його id. Одна
+    фонова задача збирає вставки, що надійшли протягом max_delay секунд (але не більше
+    max_batch), і записує їх однією транзакцією - один commit/fsync на пакет замість
+    одного на рахунок. Рахунки з однаковим набором колонок вставляються одним
+    INSERT ... RETURNING id.
+
+    Рахунок з idempotency_key, який уже є в таблиці (або повторюється в пакеті),
+    не вставляється - submit() кидає DuplicateBill з id збереженого рахунку.
+
+    Після кожного commit слухачі commit_listeners отримують список записаних рахунків
+    (значення колонок разом з id) - так журнал змін (utils/cdc.py) бачить кожну вставку.
+    """
+
+    def __init__(self, session_factory=None, max_batch: int = 100, max_delay: float = 0.01):
+        self.session_factory = session_factory or write_session
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self.commit_listeners: list = []
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._queue = self._queue or asyncio.Queue()
+            self._task = asyncio.create_task(self._run(), name="bill-writer")
+
+    async def submit(self, values: dict) -> int:
+        """
+        Ставить рахунок (словник колонок Bill) у чергу на запис і повертає присвоєний йому id.
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((values, future))
+        return await future
+
+    async def drain(self) -> None:
+        """
+        Чекає, доки всі поставлені в чергу рахунки будуть записані.
+        """
+        if self._queue is not None and self._task is not None and not self._task.done():
+            await self._queue.join()
+
+    async def stop(self) -> None:
+        await self.drain()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Черга вже порожня; нова створюється при наступному start() у його event loop
+        self._queue = None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch) -> None:
+        try:
+            await self._commit(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                _, future = batch[0]
+                if not future.done():
+                    future.set_exception(e)
+                return
+            # Один некоректний рахунок не повинен скасовувати весь пакет - записуємо поштучно
+            logging.warning(f"Пакетний запис рахунків не вдався ({e}), повтор поштучно.")
+            for item in batch:
+                await self._flush([item])
+
+    async def _commit(self, batch) -> None:
+        results = []
+        duplicates = []
+        async with self.session_factory() as session:
+            # Записувач один, тож перевірка ключів і вставка в одній транзакції не мають гонок
+            keys = [values["idempotency_key"] for values, _ in batch if values.get("idempotency_key")]
+            existing = {}
+            if keys:
+                stmt = select(Bill.idempotency_key, Bill.id).where(Bill.idempotency_key.in_(keys))
+                existing = dict((await session.execute(stmt)).all())
+            groups: dict[tuple, list] = {}
+            first_by_key = {}
+            for values, future in batch:
+                key = values.get("idempotency_key")
+                if key in existing:
+                    duplicates.append((existing[key], future))
+                elif key and key in first_by_key:
+                    duplicates.append((first_by_key[key], future))
+                else:
+                    if key:
+                        first_by_key[key] = future
+                    groups.setdefault(tuple(values), []).append((values, future))
+            for items in groups.values():
+                # Багаторядковий INSERT у SQLite видає rowid за зростанням у порядку VALUES, а записувач
+                # лише один, тож відсортовані id відповідають порядку параметрів. sort_by_parameter_order
+                # тут не підходить - для SQLite він вимикає пакетну вставку.
+                result = await session.execute(insert(Bill).returning(Bill.id), [values for values, _ in items])
+                results.extend(zip(sorted(result.scalars().all()), items))
+            await session.commit()
+        if self.commit_listeners and results:
+            rows = [{**values, "id": bill_id} for bill_id, (values, _) in results]
+            for listener in self.commit_listeners:
+                try:
+                    listener(rows)
+                except Exception:
+                    logging.exception("Помилка у слухачі запису рахунків:")
+        ids = {}
+        for bill_id, (_, future) in results:
+            ids[future] = bill_id
+            if not future.done():
+                future.set_result(bill_id)
+        for original, future in duplicates:
+            bill_id = ids.get(original, original)
+            if not future.done():
+                future.set_exception(DuplicateBill(bill_id))
+
+
+bill_writer = BillWriteQueue()